@@ -0,0 +1,109 @@
+# render a directory (or glob) of captures to WAVs in parallel
+# python batch_render.py ../test/ out/ [freq_response.csv] [max_mem_mb]
+# python batch_render.py "runs/*/pwm_edges.log" out/
+#
+# Every pwm_edges.log / pwm_duty.bin found is rendered with the duty-domain filter from
+# filter_pwm.py. The measured response is loaded once per worker process, and the number
+# of workers is capped so the largest captures in flight stay under max_mem_mb. Output
+# names follow the capture's path below the search root (a/b/pwm_edges.log -> a_b_pwm_edges.wav),
+# and out/summary.csv lists duration, peak level and render time for each capture.
+
+import sys
+import os
+import glob
+import time
+import csv
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from duty_stream import is_duty_stream, load_capture, HEADER
+from filter_pwm import duty_filter, load_freq_response, write_wav
+
+CAPTURE_NAMES = ("pwm_edges.log", "pwm_duty.bin")
+MAX_MEM_MB = 4096
+
+# rough peak memory of one render, per PWM period of capture: text parsing of the edge
+# log, the moment sequences and their spectra, and the resampler
+BYTES_PER_PERIOD = 1024
+EDGE_LOG_BYTES_PER_PERIOD = 40 # two "time_ns,value" lines
+
+_response = None # (freq, gain, phase), set in each worker by _init_worker
+
+def find_captures(pattern):
+    """Capture files under a directory (searched recursively) or matching a glob."""
+    if os.path.isdir(pattern):
+        root = pattern
+        paths = [os.path.join(d, f) for d, _, files in os.walk(pattern) for f in files if f in CAPTURE_NAMES]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+        root = os.path.commonpath([os.path.dirname(p) for p in paths]) if paths else "."
+    return root, sorted(paths)
+
+def output_name(root, path, out_dir):
+    rel = os.path.splitext(os.path.relpath(path, root))[0]
+    return os.path.join(out_dir, rel.replace(os.sep, "_") + ".wav")
+
+def estimate_periods(path):
+    size = os.path.getsize(path)
+    if is_duty_stream(path):
+        return size - HEADER.size
+    return size // EDGE_LOG_BYTES_PER_PERIOD
+
+def _init_worker(freq_data):
+    global _response
+    _response = load_freq_response(freq_data)
+
+def _render(path, wav_name):
+    start = time.perf_counter()
+    stream = load_capture(path)
+    y = duty_filter(stream, *_response)
+    write_wav(wav_name, y)
+    duration = len(stream.duty) * stream.period * stream.clk_period_ps * 1e-12
+    peak = float(np.max(np.abs(y))) if len(y) else 0.0
+    return duration, peak, time.perf_counter() - start
+
+def batch_render(pattern, out_dir, freq_data, max_mem_mb=MAX_MEM_MB):
+    root, paths = find_captures(pattern)
+    if not paths:
+        raise ValueError(f"no captures found in {pattern}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    # biggest first, so the long renders don't end up trailing on one worker
+    jobs = sorted(((estimate_periods(p), p) for p in paths), reverse=True)
+    job_mb = jobs[0][0] * BYTES_PER_PERIOD / 2 ** 20
+    workers = max(1, min(os.cpu_count() or 1, len(jobs), int(max_mem_mb // max(job_mb, 1))))
+    print(f"rendering {len(jobs)} captures with {workers} workers")
+
+    rows = []
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(freq_data,)) as pool:
+        futures = {pool.submit(_render, p, output_name(root, p, out_dir)): p for _, p in jobs}
+        for future in as_completed(futures):
+            path = futures[future]
+            wav_name = output_name(root, path, out_dir)
+            try:
+                duration, peak, render_s = future.result()
+            except Exception as e: # keep going, a bad capture shouldn't sink the whole night
+                print(f"FAIL {path}: {e}")
+                rows.append([path, "", "", "", "", f"error: {e}"])
+                continue
+            print(f"{path}: {duration:.3f} s audio, peak {peak:.4f}, {render_s:.2f} s")
+            rows.append([path, wav_name, f"{duration:.6f}", f"{peak:.6f}", f"{render_s:.3f}", "ok"])
+
+    rows.sort()
+    with open(os.path.join(out_dir, "summary.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["capture", "wav", "duration_s", "peak", "render_s", "status"])
+        w.writerows(rows)
+    return rows
+
+if __name__ == "__main__":
+    pattern = sys.argv[1]
+    out_dir = sys.argv[2]
+    freq_data = sys.argv[3] if len(sys.argv) > 3 else os.path.join(os.path.dirname(__file__), "freq_response.csv")
+    max_mem_mb = float(sys.argv[4]) if len(sys.argv) > 4 else MAX_MEM_MB
+
+    rows = batch_render(pattern, out_dir, freq_data, max_mem_mb)
+    failed = sum(r[-1] != "ok" for r in rows)
+    if failed:
+        sys.exit(f"{failed} of {len(rows)} captures failed")
@@ -0,0 +1,316 @@
+# performance baselines for the pmod-sim tools on synthetic inputs of increasing length
+# python bench_suite.py run [results.json] [0.001,0.01,0.1,1,10] [filter_pwm.duty,csv_to_wav,...]
+# python bench_suite.py compare results.json [bench_baseline.json] [tolerance]
+# python bench_suite.py baseline results.json        store results as the new baseline
+#
+# For every duration (seconds of sim time at the testbench clock) run generates a
+# pwm_edges.log from the chip model with a note change every 100 ms, a SPICE transient
+# CSV and a VCD of pwm_out, then runs each tool on them. The filter_pwm modes are timed
+# stage by stage in a worker process (peak memory per stage from tracemalloc, which sees
+# the numpy buffers); the old flat scripts run whole, with the peak RSS of their process.
+# nbit_sine.py takes no input, so it runs once. Every case gets its own worker, limited to
+# MAX_MEM_MB of address space and CASE_TIMEOUT seconds, so a case that runs out of either
+# is recorded as such and the rest carry on.
+#
+# run compares against bench_baseline.json when it exists. A stage regresses when it
+# is more than tolerance (default 25%) slower or bigger than the baseline, ignoring
+# stages under NOISE_S / NOISE_MB; compare then exits non-zero. The committed
+# bench_baseline.json is a reference run from the host in its "host" entry; on other
+# hardware store your own with `baseline` first.
+
+import sys
+import importlib
+import os
+import json
+import time
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from chip_model import ChipModel, SAMPLE_PERIOD
+from duty_stream import DutyStream, duty_to_edges, write_edge_log, CLK_PERIOD_PS, PWM_PERIOD
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "bench_baseline.json")
+FREQ_DATA = os.path.join(HERE, "freq_response.csv")
+
+DURATIONS = (0.001, 0.01, 0.1, 1.0, 10.0)
+TOOLS = ("filter_pwm.fft", "filter_pwm.iir", "filter_pwm.duty", "csv_to_wav", "vcd_extract", "nbit_sine")
+SCRIPTS = {
+    "csv_to_wav": os.path.join(HERE, "old_test_scripts", "csv_to_wav.py"),
+    "vcd_extract": os.path.join(HERE, "old_test_scripts", "vcd_extract.py"),
+    "nbit_sine": os.path.join(HERE, "nbit_sine.py"),
+}
+
+MAX_MEM_MB = 4096 # per case, same budget as batch_render.py
+CASE_TIMEOUT = 1800
+NOTE_S = 0.1
+SPICE_STEP_S = 1e-6 # .tran step of the synthetic SPICE output
+VCD_STEP_NS = CLK_PERIOD_PS // 1000 # vcd_extract.py edge ramp
+TOLERANCE = 0.25
+NOISE_S = 0.05
+NOISE_MB = 8
+
+def make_inputs(duration, out_dir):
+    """pwm_edges.log, spice.csv and test/tb.vcd for duration seconds of sim time."""
+    os.makedirs(os.path.join(out_dir, "test"), exist_ok=True)
+    frame_s = SAMPLE_PERIOD * CLK_PERIOD_PS * 1e-12
+    frames = int(np.ceil(duration / frame_s))
+    note_frames = max(1, int(NOTE_S / frame_s))
+
+    chip = ChipModel()
+    rng = np.random.default_rng(0)
+    duty = []
+    for start in range(0, frames, note_frames):
+        chip.write(0, int(rng.integers(76, 1024)))
+        chip.write(1, int(rng.integers(38, 512)))
+        duty.append(chip.render(min(note_frames, frames - start)))
+    times_ns, values = duty_to_edges(DutyStream(np.concatenate(duty), CLK_PERIOD_PS, 0, PWM_PERIOD, 0))
+    write_edge_log(os.path.join(out_dir, "pwm_edges.log"), times_ns, values)
+
+    t = np.arange(1, int(duration / SPICE_STEP_S) + 1) * SPICE_STEP_S
+    v = 1.65 + 0.8 * np.sin(2 * np.pi * 440 * t) + 0.4 * np.sin(2 * np.pi * 1320 * t)
+    with open(os.path.join(out_dir, "spice.csv"), "w") as f:
+        f.write("time;V(/Vout)\n")
+        np.savetxt(f, np.column_stack((t, v)), fmt="%.9e", delimiter=";")
+
+    with open(os.path.join(out_dir, "test", "tb.vcd"), "w") as f:
+        f.write("$timescale 1ps $end\n$scope module tb $end\n$var wire 1 ! pwm_out $end\n"
+                "$upscope $end\n$enddefinitions $end\n#0\n$dumpvars\n0!\n$end\n")
+        times_ps = np.rint(times_ns * 1000).astype(np.int64)
+        f.writelines(f"#{t}\n{v}!\n" for t, v in zip(times_ps.tolist(), values.tolist()))
+    return len(values)
+
+class Stages:
+    """Wall time and tracemalloc peak of each stage of a case."""
+
+    def __init__(self):
+        self.stages = []
+
+    def run(self, name, fn, *args):
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = fn(*args)
+        seconds = time.perf_counter() - start
+        self.stages.append({"name": name, "seconds": seconds, "peak_mb": tracemalloc.get_traced_memory()[1] / 2 ** 20})
+        return result
+
+def run_case(tool, in_dir):
+    """Stages of one tool on the inputs in in_dir (runs inside the worker)."""
+    import filter_pwm
+    from duty_stream import load_capture
+    # filter_pwm imports SciPy when a filter first runs; keep that out of the timed stages
+    importlib.import_module("scipy.signal")
+
+    edges = os.path.join(in_dir, "pwm_edges.log")
+    out_wav = os.path.join(in_dir, tool + ".wav")
+    s = Stages()
+    tracemalloc.start()
+    if tool == "filter_pwm.fft":
+        pwm = s.run("load_pwm", filter_pwm.load_pwm, edges)
+        response = s.run("load_freq_response", filter_pwm.load_freq_response, FREQ_DATA)
+        y = s.run("fft_filter", filter_pwm.fft_filter, *pwm, *response)
+    elif tool == "filter_pwm.iir":
+        from fit_iir import load_sos
+        pwm = s.run("load_pwm", filter_pwm.load_pwm, edges)
+        sos = s.run("load_sos", load_sos, FREQ_DATA, filter_pwm.PWM_SAMPLE_RATE)
+        y = s.run("iir_filter", filter_pwm.iir_filter, *pwm, sos)
+    elif tool == "filter_pwm.duty":
+        stream = s.run("load_capture", load_capture, edges)
+        response = s.run("load_freq_response", filter_pwm.load_freq_response, FREQ_DATA)
+        y = s.run("duty_filter", filter_pwm.duty_filter, stream, *response)
+    else:
+        tracemalloc.stop()
+        args = {
+            "csv_to_wav": [os.path.join(in_dir, "spice.csv")],
+            "vcd_extract": [str(VCD_STEP_NS)],
+            "nbit_sine": [],
+        }[tool]
+        # vcd_extract.py reads ../test/tb.vcd, nbit_sine.py writes test.wav to the cwd
+        cwd = os.path.join(in_dir, "run")
+        os.makedirs(cwd, exist_ok=True)
+        s.stages.append(_run_script(tool, args, cwd))
+        return s.stages
+    s.run("write_wav", filter_pwm.write_wav, out_wav, y)
+    tracemalloc.stop()
+    return s.stages
+
+# runs a script as __main__ and reports its own peak RSS: VmHWM restarts at exec, unlike
+# ru_maxrss, which would include the numpy-sized worker it was forked from
+SCRIPT_WRAPPER = """
+import sys, runpy
+script, out = sys.argv[1], sys.argv[2]
+sys.argv = [script] + sys.argv[3:]
+try:
+    runpy.run_path(script, run_name="__main__")
+finally:
+    with open("/proc/self/status") as f:
+        kb = next(int(l.split()[1]) for l in f if l.startswith("VmHWM:"))
+    with open(out, "w") as f:
+        f.write(str(kb))
+"""
+
+def _run_script(tool, args, cwd):
+    rss_file = os.path.join(cwd, "rss_kb")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", SCRIPT_WRAPPER, SCRIPTS[tool], rss_file] + args,
+                   cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+    seconds = time.perf_counter() - start
+    with open(rss_file, "r") as f:
+        rss_mb = int(f.read()) / 1024
+    return {"name": "script", "seconds": seconds, "peak_mb": rss_mb}
+
+def peak_rss_mb():
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("VmHWM:")) / 1024
+
+def _limit_memory(max_mem_mb):
+    def limit():
+        size = int(max_mem_mb * 2 ** 20)
+        resource.setrlimit(resource.RLIMIT_AS, (size, size))
+    return limit
+
+def bench_case(tool, duration, in_dir, max_mem_mb=MAX_MEM_MB, timeout=CASE_TIMEOUT):
+    """Run one case in a fresh worker process and return its result record."""
+    record = {"tool": tool, "duration_s": duration, "status": "ok", "stages": []}
+    if tool == "vcd_extract":
+        try:
+            importlib.import_module("vcd") # the script needs pyvcd
+        except ImportError:
+            record["status"] = "skipped: pyvcd not installed"
+            return record
+
+    out_json = os.path.join(in_dir, tool + ".json")
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run([sys.executable, __file__, "case", tool, in_dir, out_json],
+                              capture_output=True, text=True, timeout=timeout,
+                              preexec_fn=_limit_memory(max_mem_mb))
+    except subprocess.TimeoutExpired:
+        record["status"] = f"timeout after {timeout} s"
+        return record
+    record["total_s"] = time.perf_counter() - start
+    if proc.returncode != 0:
+        err = proc.stderr.strip().splitlines()
+        err = err[-1] if err else f"exit code {proc.returncode}"
+        record["status"] = "out of memory" if "MemoryError" in err else f"error: {err}"
+        return record
+    with open(out_json, "r") as f:
+        record.update(json.load(f))
+    return record
+
+def host_info():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+    }
+
+def run(durations=DURATIONS, tools=TOOLS, max_mem_mb=MAX_MEM_MB):
+    results = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": host_info(),
+               "max_mem_mb": max_mem_mb, "cases": []}
+    work = tempfile.mkdtemp(prefix="pmodsim-bench-")
+    try:
+        for duration in durations:
+            in_dir = os.path.join(work, f"{duration:g}s")
+            start = time.perf_counter()
+            edges = make_inputs(duration, in_dir)
+            print(f"{duration:g} s: {edges} edges, inputs in {time.perf_counter() - start:.1f} s")
+            for tool in tools:
+                if tool == "nbit_sine" and duration != durations[0]:
+                    continue # fixed size
+                record = bench_case(tool, duration, in_dir, max_mem_mb)
+                if tool == "nbit_sine":
+                    record["duration_s"] = None
+                results["cases"].append(record)
+                print("  " + format_case(record))
+            shutil.rmtree(in_dir)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return results
+
+def format_case(record):
+    name = record["tool"]
+    if record["status"] != "ok":
+        return f"{name}: {record['status']}"
+    stages = ", ".join(f"{s['name']} {s['seconds']:.3f} s / {s['peak_mb']:.0f} MB" for s in record["stages"])
+    return f"{name}: {stages}"
+
+def case_key(record):
+    duration = record["duration_s"]
+    return f"{record['tool']} @ {'fixed' if duration is None else f'{duration:g} s'}"
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Per stage time/memory ratios against the baseline; returns the list of regressions."""
+    base = {(case_key(c), s["name"]): s for c in baseline["cases"] for s in c["stages"]}
+    regressions = []
+    print(f"{'case':30s} {'stage':20s} {'base s':>9s} {'now s':>9s} {'x':>6s} {'base MB':>8s} {'now MB':>8s} {'x':>6s}")
+    for case in results["cases"]:
+        if case["status"] != "ok":
+            print(f"{case_key(case):30s} {case['status']}")
+            continue
+        for stage in case["stages"]:
+            ref = base.get((case_key(case), stage["name"]))
+            if ref is None:
+                print(f"{case_key(case):30s} {stage['name']:20s} {'-':>9s} {stage['seconds']:9.3f}")
+                continue
+            t_ratio = stage["seconds"] / max(ref["seconds"], 1e-9)
+            m_ratio = stage["peak_mb"] / max(ref["peak_mb"], 1e-9)
+            slow = t_ratio > 1 + tolerance and stage["seconds"] > NOISE_S
+            big = m_ratio > 1 + tolerance and stage["peak_mb"] > NOISE_MB
+            flag = "  SLOWER" * slow + "  BIGGER" * big
+            print(f"{case_key(case):30s} {stage['name']:20s} {ref['seconds']:9.3f} {stage['seconds']:9.3f} {t_ratio:6.2f} "
+                  f"{ref['peak_mb']:8.1f} {stage['peak_mb']:8.1f} {m_ratio:6.2f}{flag}")
+            if slow or big:
+                regressions.append((case_key(case), stage["name"], t_ratio, m_ratio))
+    if results["host"] != baseline["host"]:
+        print("note: baseline was recorded on a different host or python/numpy version")
+    return regressions
+
+def load_results(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_results(path, results):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1)
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "case":
+        # worker: python bench_suite.py case <tool> <in_dir> <out.json>
+        stages = run_case(sys.argv[2], sys.argv[3])
+        save_results(sys.argv[4], {"stages": stages,
+                                   "max_rss_mb": peak_rss_mb()})
+    elif cmd == "run":
+        out = sys.argv[2] if len(sys.argv) > 2 else "bench_results.json"
+        durations = [float(d) for d in sys.argv[3].split(",")] if len(sys.argv) > 3 else DURATIONS
+        tools = sys.argv[4].split(",") if len(sys.argv) > 4 else TOOLS
+        unknown = [t for t in tools if t not in TOOLS]
+        if unknown:
+            sys.exit(f"unknown tools {unknown}, expected some of {list(TOOLS)}")
+        results = run(durations, tools)
+        save_results(out, results)
+        print(f"results written to {out}")
+        if os.path.exists(BASELINE):
+            if compare(results, load_results(BASELINE)):
+                sys.exit("performance regressions against bench_baseline.json")
+    elif cmd == "compare":
+        baseline = sys.argv[3] if len(sys.argv) > 3 else BASELINE
+        tolerance = float(sys.argv[4]) if len(sys.argv) > 4 else TOLERANCE
+        regressions = compare(load_results(sys.argv[2]), load_results(baseline), tolerance)
+        if regressions:
+            sys.exit(f"{len(regressions)} stages regressed by more than {tolerance:.0%}")
+    elif cmd == "baseline":
+        shutil.copyfile(sys.argv[2], BASELINE)
+        print(f"{sys.argv[2]} stored as {BASELINE}")
+    else:
+        sys.exit("usage: bench_suite.py run [results.json] [durations] [tools] | "
+                 "compare results.json [baseline.json] [tolerance] | baseline results.json")
@@ -0,0 +1,236 @@
+# bit-exact numpy model of the sine (CORDIC) and triangle channels
+# python chip_model.py check
+#
+# Both channels advance a 14-bit accumulator by freq_increment once per 1024-clock
+# frame (on subsample_phase == 8). The 7-bit outputs only depend on the accumulator,
+# so each channel is a lookup on it:
+#   sine.v:     CORDIC on acc[12:5] (inverted in quadrants 01/10), out = y + 64
+#   triangle.v: acc[12:6], inverted when acc[13] is set
+# check runs the vectorized model against a literal clock-by-clock transcription of
+# sine.v for every accumulator value, and ChipSchedule against ChipModel.
+#
+# ChipModel strings the channels together with pwm.v into the per-period duty stream
+# (see duty_stream.py). With frame m starting at subsample_phase 0 and A[m] the
+# accumulators going into frame m (A[0] = 0 after reset, A[m+1] = A[m] + inc on
+# phase 8 of frame m):
+#   sine out from phase 9 of frame m:     S(A_sine[m]) for m >= 1, 64 before that
+#   triangle out from phase 9 of frame m: T(A_tri[m+1]), before it T(A_tri[m])
+#   the PWM latches ch1 + ch2 on phases 0, 256, 512, 768, so period 4m + q gets
+#     q == 0: sine out of frame m-1 + T(A_tri[m])
+#     q >= 1: sine out of frame m   + T(A_tri[m+1])
+#
+# Between writes A[m] = (A[m0] + (m - m0) * inc) mod 2^14, so ChipSchedule evaluates any
+# frame or period of a fixed write schedule directly, without rendering up to it.
+
+import sys
+import numpy as np
+
+ACC_BITS = 14
+ACC_MASK = (1 << ACC_BITS) - 1
+INC_BITS = ACC_BITS - 2 # freq_increment width
+SAMPLE_RATE = 28160 # frames per second at the 28835840 Hz chip clock
+SAMPLE_PERIOD = 1024 # clocks per frame
+CLOCK_HZ = SAMPLE_RATE * SAMPLE_PERIOD
+
+ATAN_TABLE = (64, 38, 20, 10, 5, 3, 1, 1)
+X_INIT = 38
+SINE_RESET = 64 # sine out before the first CORDIC result
+TRIANGLE_RESET = 0
+PERIODS_PER_FRAME = 4 # PWM periods (256 clocks) per frame
+PWM_PERIOD = SAMPLE_PERIOD // PERIODS_PER_FRAME
+
+def _wrap(v, bits):
+    """Two's complement wrap to a signed bits-wide register."""
+    half = 1 << (bits - 1)
+    return ((v + half) & ((1 << bits) - 1)) - half
+
+def cordic_sine(acc):
+    """sine.v out for accumulator value(s) acc, vectorized."""
+    acc = np.asarray(acc, dtype=np.int64) & ACC_MASK
+    acc_slice = (acc >> (ACC_BITS - 9)) & 0xFF
+    quadrant = acc >> (ACC_BITS - 2)
+    t = np.where((quadrant == 1) | (quadrant == 2), ~acc_slice & 0xFF, acc_slice)
+    t = _wrap(t, 8)
+    x = np.full_like(t, X_INIT)
+    y = np.zeros_like(t)
+    for i, a in enumerate(ATAN_TABLE):
+        # >>> on the 7-bit signed registers is numpy's arithmetic right shift
+        pos = t >= 0
+        dx = y >> i
+        dy = x >> i
+        x, y = _wrap(np.where(pos, x - dx, x + dx), 7), _wrap(np.where(pos, y + dy, y - dy), 7)
+        t = _wrap(np.where(pos, t - a, t + a), 8)
+    return (y + 64) & 0x7F
+
+# sine out only depends on acc[13:5]
+SINE_TABLE = cordic_sine(np.arange(1 << 9) << (ACC_BITS - 9)).astype(np.uint8)
+
+def sine_out(acc):
+    return SINE_TABLE[(np.asarray(acc, dtype=np.int64) & ACC_MASK) >> (ACC_BITS - 9)]
+
+def triangle_out(acc):
+    acc = np.asarray(acc, dtype=np.int64) & ACC_MASK
+    ramp = (acc >> (ACC_BITS - 8)) & 0x7F
+    return np.where(acc >> (ACC_BITS - 1), ~ramp & 0x7F, ramp).astype(np.uint8)
+
+def accumulator(freq_increment, frames, start=0):
+    """Accumulator value during each of the next frames, for one or many increments.
+
+    freq_increment may be an array; the result then has one row per increment.
+    """
+    inc = np.asarray(freq_increment, dtype=np.int64)[..., None] & ((1 << INC_BITS) - 1)
+    return (start + inc * np.arange(frames)) & ACC_MASK
+
+def increment_freq(freq_increment, sample_rate=SAMPLE_RATE):
+    """Exact output frequency of a freq_increment."""
+    return np.asarray(freq_increment) * sample_rate / (1 << ACC_BITS)
+
+class ChipModel:
+    """Duty stream of the whole chip, frame by frame, out of reset.
+
+    Register writes take effect from the next frame rendered, i.e. as if they landed
+    before phase 8 of that frame. freq_increment is the low 12 bits of each register.
+    """
+
+    def __init__(self):
+        self.inc = [0, 0] # sine (register 0), triangle (register 1)
+        self.frame = 0
+        self.acc_sine = 0
+        self.acc_tri = 0
+        self.sine_prev = SINE_RESET # sine out at the end of the previous frame
+
+    def write(self, address, value):
+        if address < 2: # register_interface ignores out-of-range addresses
+            self.inc[address] = value & ((1 << INC_BITS) - 1)
+
+    def render(self, frames):
+        """Duty (uint8) of the next frames * 4 PWM periods."""
+        if frames <= 0:
+            return np.zeros(0, dtype=np.uint8)
+        acc_sine = accumulator(self.inc[0], frames, self.acc_sine)
+        acc_tri = accumulator(self.inc[1], frames + 1, self.acc_tri)
+
+        sine_now = sine_out(acc_sine).astype(np.int64)
+        if self.frame == 0:
+            sine_now[0] = SINE_RESET # the first CORDIC result appears in frame 1
+        sine_prev = np.concatenate(([self.sine_prev], sine_now[:-1]))
+
+        duty = np.empty((frames, PERIODS_PER_FRAME), dtype=np.int64)
+        duty[:, 0] = sine_prev + triangle_out(acc_tri[:-1])
+        duty[:, 1:] = (sine_now + triangle_out(acc_tri[1:]))[:, None]
+
+        self.frame += frames
+        self.acc_sine = int(acc_sine[-1] + self.inc[0]) & ACC_MASK
+        self.acc_tri = int(acc_tri[-1])
+        self.sine_prev = int(sine_now[-1])
+        return duty.reshape(-1).astype(np.uint8)
+
+class ChipSchedule:
+    """Chip output for a fixed write schedule, at any frame or period, in O(log writes).
+
+    writes are (frame, address, value): the value is used from the accumulator increment
+    of that frame on, the same as ChipModel.write() just before rendering the frame.
+    All lookups take arrays of indices.
+    """
+
+    def __init__(self, writes=()):
+        writes = sorted(writes, key=lambda w: w[0]) # stable, so the last write to a frame wins
+        self.channels = [self._segments(writes, address) for address in range(2)]
+
+    @staticmethod
+    def _segments(writes, address):
+        starts, incs = [0], [0]
+        for frame, a, value in writes:
+            if a != address:
+                continue
+            frame = max(0, int(frame))
+            if frame == starts[-1]:
+                incs[-1] = value & ((1 << INC_BITS) - 1)
+            else:
+                starts.append(frame)
+                incs.append(value & ((1 << INC_BITS) - 1))
+        starts = np.array(starts, dtype=np.int64)
+        incs = np.array(incs, dtype=np.int64)
+        # accumulator going into the first frame of each segment
+        acc0 = np.zeros(len(starts), dtype=np.int64)
+        acc0[1:] = np.cumsum((np.diff(starts) & ACC_MASK) * incs[:-1]) & ACC_MASK
+        return starts, incs, acc0
+
+    def accumulator(self, address, frames):
+        """A[frame]: the accumulator going into each frame (frames >= 0)."""
+        starts, incs, acc0 = self.channels[address]
+        frames = np.asarray(frames, dtype=np.int64)
+        i = np.searchsorted(starts, frames, side="right") - 1
+        return (acc0[i] + ((frames - starts[i]) & ACC_MASK) * incs[i]) & ACC_MASK
+
+    def sine(self, frames):
+        """Sine out from phase 9 of each frame (frame -1 is the reset value)."""
+        frames = np.asarray(frames, dtype=np.int64)
+        out = sine_out(self.accumulator(0, np.maximum(frames, 0))).astype(np.int64)
+        return np.where(frames >= 1, out, SINE_RESET)
+
+    def triangle(self, frames):
+        """Triangle out from phase 9 of each frame."""
+        return triangle_out(self.accumulator(1, np.asarray(frames, dtype=np.int64) + 1)).astype(np.int64)
+
+    def duty(self, periods):
+        """PWM duty (ch1 + ch2 latched at the start) of each period."""
+        periods = np.asarray(periods, dtype=np.int64)
+        m, q = periods // PERIODS_PER_FRAME, periods % PERIODS_PER_FRAME
+        sine = self.sine(np.where(q == 0, m - 1, m))
+        triangle = triangle_out(self.accumulator(1, np.where(q == 0, m, m + 1)))
+        return (sine + triangle).astype(np.uint8)
+
+    def duty_range(self, start, stop):
+        return self.duty(np.arange(start, stop))
+
+    def duty_between(self, start_s, stop_s, clock_hz=CLOCK_HZ):
+        """(first period, duty) of the periods starting in [start_s, stop_s) after reset."""
+        period_s = PWM_PERIOD / clock_hz
+        first = int(np.ceil(start_s / period_s - 1e-9))
+        last = int(np.ceil(stop_s / period_s - 1e-9))
+        return first, self.duty_range(first, max(first, last))
+
+def _sine_reference(acc):
+    """Clock-by-clock transcription of the sine.v CORDIC (phases 1023, 0..7, 8)."""
+    top = (acc >> (ACC_BITS - 2)) & 3
+    acc_slice = (acc >> (ACC_BITS - 9)) & 0xFF
+    t = _wrap(acc_slice if top in (0, 3) else ~acc_slice & 0xFF, 8)
+    x, y = X_INIT, 0
+    for phase in range(8):
+        if t >= 0:
+            x, y, t = x - (y >> phase), y + (x >> phase), t - ATAN_TABLE[phase]
+        else:
+            x, y, t = x + (y >> phase), y - (x >> phase), t + ATAN_TABLE[phase]
+        x, y, t = _wrap(x, 7), _wrap(y, 7), _wrap(t, 8)
+    return (y + 64) & 0x7F
+
+def _check_schedule(frames=1 << 16, seed=0):
+    """Largest ChipSchedule vs ChipModel duty difference over a random write schedule."""
+    rng = np.random.default_rng(seed)
+    writes = sorted((int(f), int(a), int(v)) for f, a, v in
+                    zip(rng.integers(0, frames, 64), rng.integers(0, 3, 64), rng.integers(0, 1 << 16, 64)))
+    chip = ChipModel()
+    duty = []
+    for frame, address, value in writes:
+        duty.append(chip.render(frame - chip.frame))
+        chip.write(address, value)
+    duty.append(chip.render(frames - chip.frame))
+    duty = np.concatenate(duty)
+    schedule = ChipSchedule(writes)
+    return np.nonzero(schedule.duty_range(0, len(duty)) != duty)[0]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "check":
+        sys.exit("usage: chip_model.py check")
+    acc = np.arange(1 << ACC_BITS)
+    ref = np.array([_sine_reference(int(a)) for a in acc])
+    bad = np.nonzero(ref != sine_out(acc))[0]
+    if len(bad):
+        sys.exit(f"sine model mismatch at {len(bad)} accumulator values, first {bad[0]}")
+    ideal = 64 + 63 * np.sin(2 * np.pi * acc / (1 << ACC_BITS))
+    print(f"sine: table matches reference, max error vs 64 + 63 sin: {np.max(np.abs(ref - ideal)):.2f} LSB")
+    bad = _check_schedule()
+    if len(bad):
+        sys.exit(f"ChipSchedule differs from ChipModel at {len(bad)} periods, first {bad[0]}")
+    print("schedule: closed form matches the frame-by-frame model")
@@ -0,0 +1,190 @@
+# per-period duty stream capture format, plus exact conversion to/from pwm edge logs
+# python duty_stream.py to-edges ../test/pwm_duty.bin pwm_edges.log
+# python duty_stream.py from-edges ../test/pwm_edges.log pwm_duty.bin [clk_period_ns] [offset_ns]
+#
+# pwm.v latches bitstream_ch1 + bitstream_ch2 into current_sample once every 256 clocks,
+# so one byte per PWM period fully describes pwm_out. File layout (little endian):
+#   magic      4s   b"PWMD"
+#   version    u16
+#   period     u16  clocks per PWM period (256)
+#   clk_ps     u32  clock period in ps
+#   offset_ps  u64  sim time of the first latch edge (subsample_phase[7:0] == 0) in ps
+#   initial    u8   sample latched before the first period (0 out of reset)
+#   (3 pad bytes)
+#   count      u64  number of periods that follow
+#   duty       count x u8
+#
+# Pulse shape: pwm_out is registered and compares against current_sample *before* the
+# latch edge on phase 0, so in period k (latch edge at t_k) the output is high on
+#   clock 0            if the previous sample was non-zero
+#   clocks 1..d_k-1    for the newly latched sample d_k
+# i.e. rise at t_k (or t_k + 1 clk), fall at t_k + max(d_k, 1) clk.
+
+import struct
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+MAGIC = b"PWMD"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQB3xQ")
+
+PWM_PERIOD = 256     # clocks per PWM period
+CLK_PERIOD_PS = 35000 # PERIOD_NS used by the testbenches
+
+DutyStream = namedtuple("DutyStream", ["duty", "clk_period_ps", "offset_ps", "period", "initial"])
+
+def write_duty_stream(path, duty, clk_period_ps=CLK_PERIOD_PS, offset_ps=0, initial=0, period=PWM_PERIOD):
+    data = np.asarray(duty, dtype=np.uint8)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, period, clk_period_ps, offset_ps, initial, len(data)))
+        f.write(data.tobytes())
+
+def read_duty_stream(path):
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) != HEADER.size or header[:4] != MAGIC:
+            raise ValueError(f"{path}: not a duty stream")
+        _, version, period, clk_period_ps, offset_ps, initial, count = HEADER.unpack(header)
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported duty stream version {version}")
+        duty = np.fromfile(f, dtype=np.uint8, count=count)
+    if len(duty) != count:
+        raise ValueError(f"{path}: truncated, expected {count} periods, got {len(duty)}")
+    return DutyStream(duty, clk_period_ps, offset_ps, period, initial)
+
+def is_duty_stream(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def read_edge_log(path):
+    """Load a time_ns,value edge log (as written by audio_test.py) into numpy arrays."""
+    data = np.loadtxt(path, delimiter=",", ndmin=2)
+    if len(data) == 0:
+        return np.zeros(0), np.zeros(0, dtype=np.uint8)
+    return data[:, 0], data[:, 1].astype(np.uint8)
+
+def write_edge_log(path, times_ns, values):
+    np.savetxt(path, np.column_stack((times_ns, values)), fmt=["%.3f", "%d"], delimiter=",")
+
+def pulse_bounds(duty, initial=0):
+    """Rise/fall clock offsets of the pulse in each period. Empty periods have rise == fall."""
+    duty = np.asarray(duty, dtype=np.int64)
+    prev = np.concatenate(([initial], duty[:-1]))
+    rise = np.where(prev > 0, 0, 1)
+    fall = np.maximum(duty, 1)
+    return rise, fall
+
+def pulse_moments(duty, initial=0, period=PWM_PERIOD, order=4):
+    """Moments of each period's pulse about the period centre, in units of the period.
+
+    Row m holds integral of ((t - 1/2)^m dt) over the pulse, so row 0 is the duty cycle
+    and the higher rows describe where in the period the pulse sits. A pulse train with
+    these moments has the spectrum sum_m (-j w)^m / m! * DTFT(row m) (w in rad/period),
+    which converges quickly below the PWM rate since |t - 1/2| <= 1/2.
+    """
+    rise, fall = pulse_bounds(duty, initial)
+    a = rise / period - 0.5
+    b = fall / period - 0.5
+    return np.array([(b ** (m + 1) - a ** (m + 1)) / (m + 1) for m in range(order + 1)])
+
+def duty_to_edges(stream):
+    """Exact pwm_out edge list (times in ns, values 0/1) for a duty stream."""
+    rise, fall = pulse_bounds(stream.duty, stream.initial)
+    k = np.nonzero(fall > rise)[0]
+    start = stream.offset_ps + k * stream.period * stream.clk_period_ps
+    times_ps = np.empty(2 * len(k), dtype=np.int64)
+    times_ps[0::2] = start + rise[k] * stream.clk_period_ps
+    times_ps[1::2] = start + fall[k] * stream.clk_period_ps
+    values = np.tile(np.array([1, 0], dtype=np.uint8), len(k))
+    return times_ps / 1000.0, values
+
+def infer_offset_ps(times_ns, values, clk_period_ps=CLK_PERIOD_PS, period=PWM_PERIOD):
+    """Guess the first latch edge from where the pulses rise.
+
+    Rises land on clock 0 of a period (previous sample non-zero) or clock 1 (previous
+    sample zero). If every rise lands on the same clock this assumes clock 0, so pass
+    the offset explicitly for captures that start with a run of zero samples.
+    """
+    times_ps = np.rint(np.asarray(times_ns) * 1000).astype(np.int64)
+    rises = times_ps[np.asarray(values) == 1]
+    if len(rises) == 0:
+        raise ValueError("no rising edges to infer the PWM phase from")
+    base = rises[0]
+    phases = np.unique(np.rint((rises - base) / clk_period_ps).astype(np.int64) % period)
+    if len(phases) == 1:
+        o = phases[0]
+    elif len(phases) == 2 and (phases[1] - phases[0]) % period == 1:
+        o = phases[0]
+    elif len(phases) == 2 and (phases[0] - phases[1]) % period == 1:
+        o = phases[1]
+    else:
+        raise ValueError(f"rising edges land on {len(phases)} different clocks of the PWM period")
+    if o > 0:
+        o -= period
+    return int(base + o * clk_period_ps)
+
+def edges_to_duty(times_ns, values, clk_period_ps=CLK_PERIOD_PS, offset_ps=None, period=PWM_PERIOD, count=None):
+    """Recover the duty stream from a pwm_out edge log.
+
+    A falling edge one clock after the latch means the new sample was 0 or 1; the two
+    are told apart by whether the next period's pulse starts on clock 0. Without count
+    that is not known for the last period of a capture, which is taken as 0 if
+    ambiguous. With count, the stream stops after count periods and a rise on clock 0 of
+    period count still settles the last one.
+    """
+    if offset_ps is None:
+        offset_ps = infer_offset_ps(times_ns, values, clk_period_ps, period)
+    clocks = np.rint((np.asarray(times_ns) * 1000 - offset_ps) / clk_period_ps).astype(np.int64)
+    values = np.asarray(values)
+    rises = clocks[values == 1]
+    falls = clocks[values == 0]
+    if len(falls) and len(rises) and falls[0] < rises[0]:
+        falls = falls[1:] # capture started in the middle of a pulse
+    rises = rises[:len(falls)] # capture stopped in the middle of a pulse
+    if len(rises) and rises[0] < 0:
+        raise ValueError("edges before the first latch edge; wrong offset?")
+
+    k = rises // period
+    if np.any(falls // period != k):
+        raise ValueError("pulse crosses a PWM period boundary; wrong clock period or offset?")
+    r = rises - k * period
+    f = falls - k * period
+    if np.any(r > 1):
+        raise ValueError("pulse rises later than clock 1 of its period; wrong clock period or offset?")
+
+    if count is None:
+        count = int(k[-1]) + 1 if len(k) else 0
+    seen = k <= count
+    prev_nonzero = np.zeros(count + 1, dtype=bool)
+    prev_nonzero[k[seen]] = r[seen] == 0
+    keep = k < count
+    fall = np.zeros(count, dtype=np.int64)
+    fall[k[keep]] = f[keep]
+
+    duty = np.where(fall >= 2, fall, prev_nonzero[1:]).astype(np.uint8)
+    return DutyStream(duty, clk_period_ps, offset_ps, period, int(prev_nonzero[0]))
+
+def load_capture(path):
+    """A duty stream from either capture format."""
+    if is_duty_stream(path):
+        return read_duty_stream(path)
+    return edges_to_duty(*read_edge_log(path))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] not in ("to-edges", "from-edges"):
+        sys.exit("usage: duty_stream.py to-edges|from-edges <in> <out> [clk_period_ns] [offset_ns]")
+
+    cmd, in_name, out_name = sys.argv[1:4]
+    if cmd == "to-edges":
+        t, v = duty_to_edges(read_duty_stream(in_name))
+        write_edge_log(out_name, t, v)
+        print(f"{len(t)} edges written to {out_name}")
+    else:
+        clk_period_ps = round(float(sys.argv[4]) * 1000) if len(sys.argv) > 4 else CLK_PERIOD_PS
+        offset_ps = round(float(sys.argv[5]) * 1000) if len(sys.argv) > 5 else None
+        t, v = read_edge_log(in_name)
+        stream = edges_to_duty(t, v, clk_period_ps, offset_ps)
+        write_duty_stream(out_name, stream.duty, stream.clk_period_ps, stream.offset_ps, stream.initial, stream.period)
+        print(f"{len(stream.duty)} periods written to {out_name} (offset {stream.offset_ps / 1000} ns)")
@@ -0,0 +1,238 @@
+# min/max envelope pyramids of long captures, cached on disk, for fast plotting
+# python envelope.py plot ../test/pwm_duty.bin [start_s] [stop_s] [out.png]
+# python envelope.py plot output.wav 0.30 0.31 zoom.png
+# python envelope.py build ../test/pwm_edges.log output.wav ...
+#
+# A source becomes one uniformly sampled level. For a WAV that is its samples scaled to
+# +-1. For a pwm capture (edge log or duty stream) it is the duty cycle of each PWM
+# period, which is the pin's average level. Pyramid level k holds the min, max and sum
+# of blocks of FANOUT^k samples. The levels sit back to back in three .npy files under
+# <source>.envelope/ and are memory-mapped. A view of any span reads at most
+# FANOUT * width blocks of the coarsest level that still resolves its pixels, plus the
+# level-0 samples of the partial blocks at its two ends (less than a pixel each), then
+# reduces them to one min/max/mean per pixel column. The cache is rebuilt when the
+# source's size or mtime changes.
+#
+# Zoomed in to fewer PWM periods than pixels, a pwm view shows the exact pin waveform of
+# just those periods (duty_stream.duty_to_edges) instead of the envelope.
+#
+# plot without an output file opens a window that recomputes the view on every pan and
+# zoom, so inspecting second-long captures stays instant. Needs matplotlib.
+
+import json
+import os
+import sys
+import time
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+from duty_stream import DutyStream, duty_to_edges, load_capture
+
+FANOUT = 4
+CACHE_VERSION = 1
+WIDTH = 1600 # pixel columns of a view
+
+# t_s, lo, hi, mean: one entry per pixel column that has samples
+View = namedtuple("View", ["t_s", "lo", "hi", "mean"])
+
+class Envelope:
+    """The memory-mapped pyramid of one source."""
+
+    def __init__(self, cache_dir, meta):
+        self.meta = meta
+        self.kind = meta["kind"]
+        self.count = meta["count"]
+        self.t0_s = meta["t0_s"]
+        self.dt_s = meta["dt_s"]
+        self.offsets = meta["offsets"] # start of each level in the flat arrays
+        self.lo = np.load(os.path.join(cache_dir, "min.npy"), mmap_mode="r")
+        self.hi = np.load(os.path.join(cache_dir, "max.npy"), mmap_mode="r")
+        self.sum = np.load(os.path.join(cache_dir, "sum.npy"), mmap_mode="r")
+
+    @property
+    def duration_s(self):
+        return self.count * self.dt_s
+
+    def level(self, k):
+        """(min, max, sum) of level k."""
+        a, b = self.offsets[k], self.offsets[k + 1]
+        return self.lo[a:b], self.hi[a:b], self.sum[a:b]
+
+    def samples(self, start, stop):
+        """Level-0 samples start..stop."""
+        return np.asarray(self.lo[start:stop], dtype=np.float64)
+
+    def index_range(self, start_s, stop_s):
+        start = int(np.floor((start_s - self.t0_s) / self.dt_s))
+        stop = int(np.ceil((stop_s - self.t0_s) / self.dt_s))
+        return max(0, start), min(self.count, max(stop, start + 1))
+
+    def view(self, start_s, stop_s, width=WIDTH):
+        """Min, max and mean of each of width pixel columns across [start_s, stop_s)."""
+        start, stop = self.index_range(start_s, stop_s)
+        if stop <= start:
+            return View(*(np.zeros(0),) * 4)
+        per_pixel = (stop - start) / width
+        k = min(len(self.offsets) - 2, max(0, int(np.log(max(per_pixel, 1)) / np.log(FANOUT) + 1e-9)))
+        block = FANOUT ** k
+        lo, hi, total = self.level(k)
+        # the level-k blocks wholly inside the view, and level-0 samples for the rest
+        first = -(-start // block)
+        last = max(first, stop // block)
+        head, tail = (start, min(stop, first * block)), (max(start, last * block), stop)
+        x = [self.samples(*head), self.samples(*tail)]
+        centre = np.concatenate((np.arange(*head) + 0.5, np.arange(first, last) * block + block / 2,
+                                 np.arange(*tail) + 0.5))
+        n = np.concatenate((np.ones(len(x[0])), np.full(last - first, block), np.ones(len(x[1]))))
+        lo = np.concatenate((x[0], lo[first:last], x[1]))
+        hi = np.concatenate((x[0], hi[first:last], x[1]))
+        total = np.concatenate((x[0], total[first:last], x[1]))
+        # column of each block's centre
+        column = np.minimum(((centre - start) * width // (stop - start)).astype(np.int64), width - 1)
+        cuts = np.flatnonzero(np.diff(column, prepend=-1))
+        t = self.t0_s + (start + (column[cuts] + 0.5) * (stop - start) / width) * self.dt_s
+        return View(t, np.minimum.reduceat(lo, cuts), np.maximum.reduceat(hi, cuts),
+                    np.add.reduceat(total, cuts) / np.add.reduceat(n, cuts))
+
+    def pin(self, start_s, stop_s):
+        """Exact pwm pin edges (times in s, values) of the periods overlapping [start_s, stop_s)."""
+        if self.kind != "pwm":
+            raise ValueError("only pwm captures have a pin waveform")
+        start, stop = self.index_range(start_s, stop_s)
+        period = self.meta["period"]
+        duty = np.rint(self.samples(start, stop) * period).astype(np.uint8)
+        initial = int(round(self.lo[start - 1] * period)) if start > 0 else self.meta["initial"]
+        offset_ps = round((self.t0_s + start * self.dt_s) * 1e12)
+        times_ns, values = duty_to_edges(DutyStream(duty, self.meta["clk_period_ps"], offset_ps, period, initial))
+        return times_ns * 1e-9, values
+
+def _read_wav(path):
+    with wave.open(path, "rb") as f:
+        width, channels, rate = f.getsampwidth(), f.getnchannels(), f.getframerate()
+        raw = f.readframes(f.getnframes())
+    if width == 1:
+        pcm = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        pcm = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    else:
+        raise ValueError(f"{path}: {8 * width}-bit WAVs are not supported")
+    return pcm[::channels], 0.0, 1.0 / rate # first channel
+
+def load_source(path):
+    """(level samples, t0_s, dt_s, extra meta) of a WAV or pwm capture."""
+    if path.lower().endswith(".wav"):
+        return (*_read_wav(path), {"kind": "wav"})
+    stream = load_capture(path)
+    return (stream.duty.astype(np.float32) / stream.period, stream.offset_ps * 1e-12,
+            stream.period * stream.clk_period_ps * 1e-12,
+            {"kind": "pwm", "period": stream.period, "clk_period_ps": stream.clk_period_ps,
+             "initial": stream.initial})
+
+def pyramid(x):
+    """Flat min, max and sum arrays of every level, and the level offsets."""
+    lo, hi, total = [x], [x], [x.astype(np.float64)]
+    while len(lo[-1]) > 1:
+        n = len(lo[-1])
+        pad = -n % FANOUT
+        blocks = lambda a, fill: np.concatenate((a, np.full(pad, fill, a.dtype))).reshape(-1, FANOUT)
+        lo.append(blocks(lo[-1], lo[-1][-1]).min(axis=1))
+        hi.append(blocks(hi[-1], hi[-1][-1]).max(axis=1))
+        total.append(blocks(total[-1], 0).sum(axis=1))
+    offsets = np.cumsum([0] + [len(a) for a in lo]).tolist()
+    return np.concatenate(lo), np.concatenate(hi), np.concatenate(total), offsets
+
+def cache_dir_for(path):
+    return path + ".envelope"
+
+def _source_key(path):
+    st = os.stat(path)
+    return {"version": CACHE_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def build(path, cache_dir=None, force=False):
+    """The Envelope of a source, from its cache if that is up to date."""
+    cache_dir = cache_dir or cache_dir_for(path)
+    meta_path = os.path.join(cache_dir, "meta.json")
+    key = _source_key(path)
+    if not force and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("source") == key:
+            return Envelope(cache_dir, meta)
+
+    x, t0_s, dt_s, extra = load_source(path)
+    if len(x) == 0:
+        raise ValueError(f"{path}: no samples")
+    lo, hi, total, offsets = pyramid(x)
+    os.makedirs(cache_dir, exist_ok=True)
+    if os.path.exists(meta_path):
+        os.remove(meta_path) # invalid until the arrays are all written
+    for name, a in (("min", lo), ("max", hi), ("sum", total)):
+        np.save(os.path.join(cache_dir, f"{name}.npy"), a)
+    meta = {"source": key, "count": len(x), "t0_s": t0_s, "dt_s": dt_s, "offsets": offsets, **extra}
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    return Envelope(cache_dir, meta)
+
+# ---- plotting ----
+
+def _draw(ax, env, start_s, stop_s, width):
+    """Draw the view of [start_s, stop_s) on ax, returning the artists."""
+    start, stop = env.index_range(start_s, stop_s)
+    if env.kind == "pwm" and stop - start <= width // 4:
+        t, v = env.pin(start_s, stop_s)
+        t0 = env.t0_s + start * env.dt_s
+        t = np.concatenate(([t0], t, [env.t0_s + stop * env.dt_s]))
+        v = np.concatenate(([0], v, [0]))
+        return ax.step(t, v, where="post", color="C0", linewidth=0.8)
+    view = env.view(start_s, stop_s, width)
+    return [ax.fill_between(view.t_s, view.lo, view.hi, step="mid", color="C0", alpha=0.4, linewidth=0),
+            *ax.plot(view.t_s, view.mean, color="C0", linewidth=0.6)]
+
+def plot(path, start_s=None, stop_s=None, out_name=None, width=WIDTH):
+    """Plot a capture; with out_name None, an interactive window that re-renders on zoom."""
+    import matplotlib
+    if out_name:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    env = build(path)
+    start_s = env.t0_s if start_s is None else start_s
+    stop_s = env.t0_s + env.duration_s if stop_s is None else stop_s
+    fig, ax = plt.subplots(figsize=(width / 100, 4), dpi=100)
+    ax.set_title(os.path.basename(path))
+    ax.set_xlabel("time (s)")
+    ax.set_ylabel("duty cycle" if env.kind == "pwm" else "level")
+    artists = _draw(ax, env, start_s, stop_s, width)
+    ax.set_xlim(start_s, stop_s)
+
+    if out_name:
+        fig.savefig(out_name, bbox_inches="tight")
+        plt.close(fig)
+        return
+
+    def redraw(ax):
+        nonlocal artists
+        for a in artists:
+            a.remove()
+        artists = _draw(ax, env, *ax.get_xlim(), width)
+        fig.canvas.draw_idle()
+    ax.callbacks.connect("xlim_changed", redraw)
+    plt.show()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("plot", "build"):
+        sys.exit("usage: envelope.py plot <capture> [start_s] [stop_s] [out.png] | build <capture>...")
+
+    if sys.argv[1] == "build":
+        for path in sys.argv[2:]:
+            start = time.perf_counter()
+            env = build(path, force=True)
+            print(f"{path}: {env.count} samples of {env.dt_s * 1e6:.3f} us, {len(env.offsets) - 1} levels "
+                  f"in {time.perf_counter() - start:.2f} s -> {cache_dir_for(path)}")
+    else:
+        args = sys.argv[2:]
+        start_s = float(args[1]) if len(args) > 1 else None
+        stop_s = float(args[2]) if len(args) > 2 else None
+        plot(args[0], start_s, stop_s, args[3] if len(args) > 3 else None)
@@ -0,0 +1,210 @@
+# search PMOD output filter component values against what the chip really plays
+# python filter_opt.py [candidates] [jobs] [capture ...]
+# python filter_opt.py 400 8 ../test/pwm_duty.bin
+#
+# Candidates are pmod_filter.py overrides of the schematic. Each R and C except the load
+# (FIXED) is picked from the E12 values within SPAN of its schematic value. Half the
+# budget goes on random picks. The rest refines the best TOP candidates one component
+# step at a time, until the budget is spent or no untried neighbour is left. Every
+# candidate is scored on:
+#   snr_db      the tune through the filter (pmod_filter.simulate_duty), sampled at
+#               SAMPLE_OFFSETS clocks of every PWM period so the carrier and the frame-rate
+#               images are seen. Audio band power over the power above AUDIO_BAND_HZ,
+#               worst over the streams
+#   carrier_db  attenuation at the 112.64 kHz PWM rate relative to REF_HZ
+#   ripple_db   max - min of |H| over PASSBAND_HZ
+#   gain_db     |H| at REF_HZ
+# and ranked by score() (weights below). The streams are play_a_tune's tune from the
+# closed-form chip model, plus any captures given. Candidates run across a process pool.
+# Metrics are cached per candidate in filter_opt_cache.json, keyed by the schematic,
+# the streams and METRICS_VERSION, so reruns and refinement rounds skip what is known.
+
+import sys
+import os
+import json
+import math
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from chip_model import ChipSchedule, SAMPLE_RATE, PERIODS_PER_FRAME, CLOCK_HZ
+from duty_stream import DutyStream, PWM_PERIOD, load_capture
+from pmod_filter import load_schematic, build_state_space, freq_response, simulate_duty
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCHEMATIC = os.path.join(HERE, "tt-audio-pmod.kicad_sch")
+CACHE = "filter_opt_cache.json"
+METRICS_VERSION = 1
+
+FIXED = ("R3",) # R3 across Vout stands in for the load
+E12 = (1.0, 1.2, 1.5, 1.8, 2.2, 2.7, 3.3, 3.9, 4.7, 5.6, 6.8, 8.2)
+SPAN = 10 # values from schematic / SPAN to schematic * SPAN
+CANDIDATES = 200
+TOP = 8
+
+CARRIER_HZ = CLOCK_HZ / PWM_PERIOD
+REF_HZ = 1000
+AUDIO_BAND_HZ = (20, 20000)
+PASSBAND_HZ = (50, 8000)
+SAMPLE_OFFSETS = tuple(range(0, PWM_PERIOD, PWM_PERIOD // 8))
+CARRIER_TARGET_DB = 60 # attenuation beyond this earns nothing
+CARRIER_WEIGHT = 0.5
+RIPPLE_WEIGHT = 4.0
+
+def score(m):
+    return m["snr_db"] + CARRIER_WEIGHT * min(m["carrier_db"], CARRIER_TARGET_DB) \
+        - RIPPLE_WEIGHT * m["ripple_db"] + m["gain_db"]
+
+def tune_stream():
+    """play_a_tune's duty stream (test/audio_util.TUNE) at the real chip clock, from the model."""
+    sys.path.insert(0, os.path.join(HERE, "..", "test"))
+    from audio_util import TUNE, TUNE_END_S, tostep
+
+    writes = []
+    for start_s, sine_note, triangle_note in TUNE:
+        frame = round(start_s * SAMPLE_RATE)
+        writes += [(frame, 0, tostep(sine_note)), (frame, 1, tostep(triangle_note))]
+    periods = round(TUNE_END_S * SAMPLE_RATE) * PERIODS_PER_FRAME
+    return DutyStream(ChipSchedule(writes).duty_range(0, periods), round(1e12 / CLOCK_HZ), 0, PWM_PERIOD, 0)
+
+def _round(value):
+    return float(f"{value:.6g}")
+
+def e12_values(value, span=SPAN):
+    """E12 values within span of value, plus value itself."""
+    value = _round(value)
+    low, high = value / span, value * span
+    decades = range(math.floor(math.log10(low)), math.ceil(math.log10(high)) + 1)
+    values = {float(f"{m * 10.0 ** d:.3g}") for d in decades for m in E12}
+    return sorted(v for v in values | {value} if low * (1 - 1e-9) <= v <= high * (1 + 1e-9))
+
+def format_value(value):
+    """Component value as pmod_filter.py overrides take it: 120, 4.7k, 47n."""
+    for prefix, scale in (("M", 1e6), ("k", 1e3), ("", 1), ("m", 1e-3), ("u", 1e-6), ("n", 1e-9), ("p", 1e-12)):
+        if value >= scale * (1 - 1e-9):
+            return f"{value / scale:.3g}{prefix}"
+    return f"{value:g}"
+
+def candidate_key(overrides):
+    return " ".join(f"{ref}={format_value(v)}" for ref, v in sorted(overrides.items()))
+
+def stream_snr_db(ss, stream):
+    """Audio band power over ultrasonic power of the filter output, sampled within each period."""
+    y = simulate_duty(ss, stream, offsets=SAMPLE_OFFSETS).reshape(-1)
+    fs = len(SAMPLE_OFFSETS) / (stream.period * stream.clk_period_ps * 1e-12)
+    power = np.abs(np.fft.rfft((y - y.mean()) * np.hanning(len(y)))) ** 2
+    freq = np.fft.rfftfreq(len(y), 1 / fs)
+    band = (freq >= AUDIO_BAND_HZ[0]) & (freq <= AUDIO_BAND_HZ[1])
+    return float(10 * np.log10(power[band].sum() / power[freq > AUDIO_BAND_HZ[1]].sum()))
+
+_netlist = None # (components, source), set in each worker by _init_worker
+_streams = None
+
+def _init_worker(sch_file, streams):
+    global _netlist, _streams
+    _netlist = load_schematic(sch_file)
+    _streams = streams
+
+def _metrics(overrides):
+    ss = build_state_space(*_netlist, overrides=overrides)
+    passband = np.logspace(*np.log10(PASSBAND_HZ), 40)
+    h = 20 * np.log10(np.abs(freq_response(ss, np.concatenate(([REF_HZ, CARRIER_HZ], passband)))))
+    return {
+        "snr_db": min(stream_snr_db(ss, stream) for stream in _streams),
+        "carrier_db": float(h[0] - h[1]),
+        "ripple_db": float(h[2:].max() - h[2:].min()),
+        "gain_db": float(h[0]),
+    }
+
+def cache_context(sch_file, streams):
+    """Cache section for this schematic, these streams and this metrics version."""
+    digest = hashlib.sha1(f"{METRICS_VERSION} {SAMPLE_OFFSETS} {AUDIO_BAND_HZ} {PASSBAND_HZ}".encode())
+    with open(sch_file, "rb") as f:
+        digest.update(f.read())
+    for stream in streams:
+        digest.update(f"{stream.clk_period_ps} {stream.period} {stream.initial}".encode())
+        digest.update(np.ascontiguousarray(stream.duty, dtype=np.uint8).tobytes())
+    return digest.hexdigest()
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_cache(path, cache):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+def search(candidates=CANDIDATES, jobs=None, captures=(), sch_file=SCHEMATIC, cache_path=CACHE, seed=0):
+    """[(score, metrics, overrides)] of every candidate tried, best first, and (computed, cached) counts."""
+    streams = [tune_stream()] + [load_capture(path) for path in captures]
+    components, _ = load_schematic(sch_file)
+    tuned = [c for c in components if c.kind in ("R", "C") and c.ref not in FIXED]
+    choices = {c.ref: e12_values(c.value) for c in tuned}
+    start = tuple(choices[c.ref].index(_round(c.value)) for c in tuned)
+
+    cache = load_cache(cache_path)
+    known = cache.setdefault(cache_context(sch_file, streams), {})
+    results = {} # index tuple -> metrics
+    counts = [0, 0]
+    workers = jobs or os.cpu_count()
+
+    def overrides(index):
+        return {c.ref: choices[c.ref][i] for c, i in zip(tuned, index)}
+
+    def evaluate(pool, indices):
+        todo = [ix for ix in indices if candidate_key(overrides(ix)) not in known]
+        for ix, m in zip(todo, pool.map(_metrics, [overrides(ix) for ix in todo],
+                                        chunksize=max(1, len(todo) // (4 * workers)))):
+            known[candidate_key(overrides(ix))] = m
+        for ix in indices:
+            results[ix] = known[candidate_key(overrides(ix))]
+        counts[0] += len(todo)
+        counts[1] += len(indices) - len(todo)
+        save_cache(cache_path, cache)
+
+    rng = np.random.default_rng(seed)
+    first = {start}
+    while len(first) < min(max(1, candidates // 2), math.prod(len(v) for v in choices.values())):
+        first.add(tuple(int(rng.integers(len(choices[c.ref]))) for c in tuned))
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(sch_file, streams)) as pool:
+        evaluate(pool, sorted(first))
+        while len(results) < candidates:
+            best = sorted(results, key=lambda ix: score(results[ix]), reverse=True)[:TOP]
+            neighbours = []
+            for ix in best:
+                for k, c in enumerate(tuned):
+                    for step in (-1, 1):
+                        j = ix[k] + step
+                        n = ix[:k] + (j,) + ix[k + 1:]
+                        if 0 <= j < len(choices[c.ref]) and n not in results and n not in neighbours:
+                            neighbours.append(n)
+            if not neighbours:
+                break
+            evaluate(pool, neighbours[:candidates - len(results)])
+
+    ranked = sorted(((score(m), m, overrides(ix)) for ix, m in results.items()), key=lambda r: r[0], reverse=True)
+    return ranked, overrides(start), counts
+
+if __name__ == "__main__":
+    candidates = int(sys.argv[1]) if len(sys.argv) > 1 else CANDIDATES
+    jobs = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    captures = sys.argv[3:]
+
+    start_s = time.perf_counter()
+    ranked, schematic, (computed, cached) = search(candidates, jobs, captures)
+    elapsed = time.perf_counter() - start_s
+    print(f"{len(ranked)} candidates ({computed} scored, {cached} from {CACHE}) in {elapsed:.1f} s, "
+          f"{60 * computed / elapsed:.0f} scored/min")
+    print("   score  snr_db carrier_db ripple_db gain_db  changes from the schematic")
+    base = next(r for r in ranked if r[2] == schematic)
+    for s, m, o in ranked[:10] + ([base] if base not in ranked[:10] else []):
+        changes = " ".join(f"{ref}={format_value(v)}" for ref, v in o.items() if v != schematic[ref]) or "(schematic)"
+        print(f"{s:8.1f} {m['snr_db']:7.1f} {m['carrier_db']:10.1f} {m['ripple_db']:9.2f} {m['gain_db']:7.2f}  {changes}")
+    best = ranked[0][2]
+    print(f"python pmod_filter.py tt-audio-pmod.kicad_sch response best.csv {candidate_key(best)}")
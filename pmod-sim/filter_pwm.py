@@ -1,85 +1,154 @@
 # apply a filter curve to a pwm signal
-# python filter_pwm.py ../test/pwm_edges.log ./freq_response.csv output.wav
+# python filter_pwm.py ../test/pwm_edges.log ./freq_response.csv output.wav [fft|iir|duty]
+#   fft (default): apply the measured response over a full-length FFT
+#   iir: stream through the fitted second-order sections from fit_iir.py
+#   duty: work on one sample per PWM period (256x fewer samples), also takes pwm_duty.bin
 
 import sys
 import csv
 import numpy as np
-from scipy.interpolate import make_interp_spline
-import wave
-import array
+from fractions import Fraction
+
+from duty_stream import read_edge_log, load_capture, pulse_moments
+from pmodsim import files
 
 WAV_SAMPLE_RATE = 48000
 PWM_SAMPLE_RATE = 28835840 # output sample rate
 
-pwm_data = sys.argv[1]  # ../test/pwm_edges.log   format: time_ns,value
-freq_data = sys.argv[2] # ./freq_response.csv   format: frequency;V(/Vout) (phase);V(/Vout) (gain);
-out_name = sys.argv[3]  # output WAV filename
-
-times = []
-values = []
-with open(pwm_data, 'r') as f:
-    r = csv.reader(f)
-    for t, v in r:
-        times.append(float(t) * 1e-9)  # convert ns to s
-        values.append(float(v))
-times = np.array(times)
-values = np.array(values)
-
-duration = times[-1]
-
-N = int(duration * PWM_SAMPLE_RATE)
-t_uniform = np.linspace(0, duration, N)
-
-# PWM is piecewise-constant, so use zero-order hold
-# interp1d with 'previous' gives step function
-interp = make_interp_spline(times, values, k=0)
-x = interp(t_uniform)
-
-freq = []
-gain_db = []
-phase_deg = []
-
-with open(freq_data, 'r') as f:
-    r = csv.reader(f, delimiter=';')
-    for f_hz, p, g, _ in r:
-        freq.append(float(f_hz))
-        phase_deg.append(float(p))
-        gain_db.append(float(g))
-
-freq = np.array(freq)
-gain = 10 ** (np.array(gain_db) / 20.0)
-phase = np.deg2rad(phase_deg)
-
-f_fft = np.fft.rfftfreq(N, 1/PWM_SAMPLE_RATE)
-
-# Interpolate magnitude & phase separately
-gain_interp = np.interp(f_fft, freq, gain)
-phase_interp = np.interp(f_fft, freq, phase)
-
-H_fft = gain_interp * np.exp(1j * phase_interp)
-
-print("Starting FFT filtering...")
-
-# apply filter in frequency domain
-X = np.fft.rfft(x)
-Y = X * H_fft
-y = np.fft.irfft(Y)
-
-print("Done FFT filtering...")
-
-# interp Fs down to WAV_SAMPLE_RATE
-num_wav_samples = int(len(y) * WAV_SAMPLE_RATE / PWM_SAMPLE_RATE)
-y = np.interp(np.linspace(0, len(y), num_wav_samples, endpoint=False),
-              np.arange(len(y)),
-              y)
-
-y_norm = y / np.max(np.abs(y)) * 0.95
-samples = [int(v * 32767) for v in y_norm]
-
-# Write to WAV (16-bit PCM)
-wavname = out_name.rsplit('.', 1)[0] + ".wav"
-with wave.open(wavname, "wb") as f:
-    f.setnchannels(1)
-    f.setsampwidth(2) # 2 byte samples
-    f.setframerate(WAV_SAMPLE_RATE)
-    f.writeframes(array.array('h', samples).tobytes())
\ No newline at end of file
+IIR_BLOCK = 1 << 20 # PWM samples per streaming block
+DUTY_ORDER = 4 # pulse moments kept by duty_filter, error ~ (pi f / f_pwm)^5 / 5!
+
+def load_pwm(pwm_data):
+    # format: time_ns,value
+    times, values = read_edge_log(pwm_data)
+    return times * 1e-9, values.astype(float) # convert ns to s
+
+def load_freq_response(freq_data):
+    # format: frequency;V(/Vout) (phase);V(/Vout) (gain);
+    freq = []
+    gain_db = []
+    phase_deg = []
+
+    with open(freq_data, 'r') as f:
+        r = csv.reader(f, delimiter=';')
+        for f_hz, p, g, _ in r:
+            freq.append(float(f_hz))
+            phase_deg.append(float(p))
+            gain_db.append(float(g))
+
+    freq = np.array(freq)
+    gain = 10 ** (np.array(gain_db) / 20.0)
+    phase = np.deg2rad(phase_deg)
+    return freq, gain, phase
+
+def zero_order_hold(times, values, t):
+    # value of the last edge at or before each t (the first value before the first edge)
+    idx = np.searchsorted(times, t, side='right') - 1
+    return np.where(idx >= 0, values[np.maximum(idx, 0)], values[0])
+
+def fft_filter(times, values, freq, gain, phase):
+    duration = times[-1]
+
+    N = int(duration * PWM_SAMPLE_RATE)
+    t_uniform = np.linspace(0, duration, N)
+
+    # PWM is piecewise-constant, so use zero-order hold
+    x = zero_order_hold(times, values, t_uniform)
+
+    f_fft = np.fft.rfftfreq(N, 1/PWM_SAMPLE_RATE)
+
+    # Interpolate magnitude & phase separately
+    gain_interp = np.interp(f_fft, freq, gain)
+    phase_interp = np.interp(f_fft, freq, phase)
+
+    H_fft = gain_interp * np.exp(1j * phase_interp)
+
+    print("Starting FFT filtering...")
+
+    # apply filter in frequency domain
+    X = np.fft.rfft(x)
+    Y = X * H_fft
+    y = np.fft.irfft(Y)
+
+    print("Done FFT filtering...")
+
+    # interp Fs down to WAV_SAMPLE_RATE
+    num_wav_samples = int(len(y) * WAV_SAMPLE_RATE / PWM_SAMPLE_RATE)
+    return np.interp(np.linspace(0, len(y), num_wav_samples, endpoint=False),
+                     np.arange(len(y)),
+                     y)
+
+def iir_filter(times, values, sos, block=IIR_BLOCK):
+    # same sample grid as fft_filter, but generated, filtered and decimated one block
+    # at a time so memory stays flat no matter how long the capture is
+    from fit_iir import SosStream
+
+    duration = times[-1]
+    N = int(duration * PWM_SAMPLE_RATE)
+    step = PWM_SAMPLE_RATE / WAV_SAMPLE_RATE
+    num_wav_samples = int(N / step)
+
+    stream = SosStream(sos)
+    out = np.empty(num_wav_samples)
+    done = 0
+    prev = 0.0 # last filtered sample of the previous block, for interpolating across blocks
+    for start in range(0, N, block):
+        n = np.arange(start, min(start + block, N))
+        x = zero_order_hold(times, values, n / PWM_SAMPLE_RATE)
+        y = stream.process(x)
+
+        # WAV samples whose position falls inside [start - 1, last sample of this block]
+        end = min(num_wav_samples, int(n[-1] // step) + 1)
+        pos = np.arange(done, end) * step
+        out[done:end] = np.interp(pos, np.concatenate(([start - 1], n)), np.concatenate(([prev], y)))
+        done = end
+        prev = y[-1]
+    return out
+
+def duty_filter(stream, freq, gain, phase, order=DUTY_ORDER):
+    # The duty byte only says how much charge each period carries; where the pulse sits
+    # inside the period shifts its phase. Expanding each pulse in moments about the
+    # period centre turns that into order + 1 sequences at the PWM rate whose weighted
+    # sum has the same spectrum as the 28.8 MHz waveform up to the PWM Nyquist rate.
+    from scipy import signal
+
+    pwm_rate = 1e12 / (stream.clk_period_ps * stream.period)
+    moments = pulse_moments(stream.duty, stream.initial, stream.period, order)
+    N = moments.shape[1]
+
+    f_fft = np.fft.rfftfreq(N, 1 / pwm_rate)
+    w = 2 * np.pi * f_fft / pwm_rate # rad per period
+    X = np.zeros(len(f_fft), dtype=complex)
+    weight = np.ones(len(f_fft), dtype=complex)
+    for m in range(order + 1):
+        X += weight * np.fft.rfft(moments[m])
+        weight *= -1j * w / (m + 1)
+    X *= np.exp(-0.5j * w) # moments are taken about the centre of each period
+
+    H_fft = np.interp(f_fft, freq, gain) * np.exp(1j * np.interp(f_fft, freq, phase))
+    y = np.fft.irfft(X * H_fft, N)
+
+    ratio = Fraction(WAV_SAMPLE_RATE * stream.period * stream.clk_period_ps, 10 ** 12).limit_denominator(10000)
+    return signal.resample_poly(y, ratio.numerator, ratio.denominator)
+
+def write_wav(out_name, y):
+    y_norm = y / np.max(np.abs(y)) * 0.95
+
+    # Write to WAV (16-bit PCM), truncating like int() did
+    wavname = out_name.rsplit('.', 1)[0] + ".wav"
+    files.write_wav(wavname, (y_norm * 32767).astype(np.int16), WAV_SAMPLE_RATE)
+
+if __name__ == "__main__":
+    pwm_data = sys.argv[1]  # ../test/pwm_edges.log   format: time_ns,value
+    freq_data = sys.argv[2] # ./freq_response.csv   format: frequency;V(/Vout) (phase);V(/Vout) (gain);
+    out_name = sys.argv[3]  # output WAV filename
+    mode = sys.argv[4] if len(sys.argv) > 4 else "fft"
+
+    if mode == "duty":
+        y = duty_filter(load_capture(pwm_data), *load_freq_response(freq_data))
+    elif mode == "iir":
+        from fit_iir import load_sos
+        y = iir_filter(*load_pwm(pwm_data), load_sos(freq_data, PWM_SAMPLE_RATE))
+    else:
+        y = fft_filter(*load_pwm(pwm_data), *load_freq_response(freq_data))
+    write_wav(out_name, y)
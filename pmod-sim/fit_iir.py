@@ -0,0 +1,142 @@
+# fit a stable low-order IIR (second-order sections) to the measured PMOD filter response
+# python fit_iir.py ./freq_response.csv [fs_hz] [num_order] [den_order]
+#
+# The fit is done on the analog response (iterated, weighted least squares on B(s)/A(s),
+# i.e. Sanathanan-Koerner), unstable poles are reflected into the left half plane, and
+# the result is mapped to fs with the bilinear transform. Fits are cached next to the
+# CSV in <name>.iir.json, keyed by the CSV contents, fs and orders.
+
+import sys
+import json
+import hashlib
+import os
+import numpy as np
+from scipy import signal
+
+from filter_pwm import load_freq_response, PWM_SAMPLE_RATE
+
+# the RC network has a coupling zero at DC and three real poles
+NUM_ORDER = 1
+DEN_ORDER = 3
+SK_ITERATIONS = 30
+
+def fit_analog_zpk(freq, H, num_order=NUM_ORDER, den_order=DEN_ORDER, iterations=SK_ITERATIONS):
+    """Fit H(s) = B(s) / A(s) to complex response samples; returns zeros, poles, gain in rad/s."""
+    # normalize s so the polynomial columns stay well conditioned over 6 decades
+    w0 = 2 * np.pi * np.sqrt(freq[0] * freq[-1])
+    s = 1j * 2 * np.pi * freq / w0
+
+    # relative weighting so every decade of the sweep counts, not just the passband
+    weight = 1 / np.abs(H)
+    a = np.ones(1)
+    for _ in range(iterations):
+        # B(s) - H (A(s) - 1) = H, with A(s) = 1 + a1 s + ... + an s^n
+        cols = [s ** k for k in range(num_order + 1)] + [-H * s ** k for k in range(1, den_order + 1)]
+        w = weight / np.abs(np.polyval(a[::-1], s))
+        M = np.column_stack(cols) * w[:, None]
+        rhs = H * w
+        x, *_ = np.linalg.lstsq(np.vstack((M.real, M.imag)), np.concatenate((rhs.real, rhs.imag)), rcond=None)
+        a = np.concatenate(([1.0], x[num_order + 1:]))
+
+    # reflect any unstable poles, then refit the numerator against the fixed denominator
+    p = np.roots(a[::-1])
+    p = -np.abs(p.real) + 1j * p.imag
+    a = np.real(np.poly(p))[::-1]
+    a = a / a[0]
+    A = np.polyval(a[::-1], s)
+    M = np.column_stack([s ** k / A for k in range(num_order + 1)]) * weight[:, None]
+    rhs = H * weight
+    b, *_ = np.linalg.lstsq(np.vstack((M.real, M.imag)), np.concatenate((rhs.real, rhs.imag)), rcond=None)
+
+    z = np.roots(b[::-1]) * w0
+    p = p * w0
+    k = b[-1] / a[-1] * w0 ** (den_order - num_order)
+    return z, p, k
+
+def fit_error(sos, fs, freq, gain, phase):
+    """Gain (dB) and phase (deg) error of the digital fit against the measurement below Nyquist."""
+    use = freq < fs / 2
+    _, h = signal.sosfreqz(sos, worN=freq[use], fs=fs)
+    gain_err = 20 * np.log10(np.abs(h) / gain[use])
+    phase_err = np.rad2deg(np.angle(h * np.exp(-1j * phase[use])))
+    return {
+        "max_gain_err_db": float(np.max(np.abs(gain_err))),
+        "rms_gain_err_db": float(np.sqrt(np.mean(gain_err ** 2))),
+        "max_phase_err_deg": float(np.max(np.abs(phase_err))),
+    }
+
+def fit_sos(freq, gain, phase, fs, num_order=NUM_ORDER, den_order=DEN_ORDER):
+    z, p, k = fit_analog_zpk(freq, gain * np.exp(1j * phase), num_order, den_order)
+    zd, pd, kd = signal.bilinear_zpk(z, p, k, fs)
+    sos = signal.zpk2sos(zd, pd, kd)
+    report = fit_error(sos, fs, freq, gain, phase)
+    report["poles_hz"] = sorted(float(v) for v in np.abs(p) / (2 * np.pi))
+    report["analog"] = {
+        "zeros": [[v.real, v.imag] for v in z],
+        "poles": [[v.real, v.imag] for v in p],
+        "gain": float(np.real(k)),
+    }
+    return sos, report
+
+def load_fit(freq_data, fs, num_order=NUM_ORDER, den_order=DEN_ORDER, verbose=False):
+    """Cached fit_sos() for a freq_response.csv, as stored in the cache."""
+    cache_name = freq_data.rsplit('.', 1)[0] + ".iir.json"
+    with open(freq_data, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    key = f"{fs}:{num_order}:{den_order}"
+
+    cache = {}
+    if os.path.exists(cache_name):
+        with open(cache_name, 'r') as f:
+            cache = json.load(f)
+        if cache.get("sha1") != digest:
+            cache = {}
+    if key in cache.get("fits", {}):
+        entry = cache["fits"][key]
+        if verbose:
+            print_report(fs, entry)
+        return entry
+
+    sos, report = fit_sos(*load_freq_response(freq_data), fs, num_order, den_order)
+    if verbose:
+        print_report(fs, report)
+    entry = {"sos": sos.tolist(), **report}
+    cache["sha1"] = digest
+    cache.setdefault("fits", {})[key] = entry
+    with open(cache_name, 'w') as f:
+        json.dump(cache, f, indent=1)
+    return entry
+
+def load_sos(freq_data, fs, num_order=NUM_ORDER, den_order=DEN_ORDER, verbose=False):
+    return np.array(load_fit(freq_data, fs, num_order, den_order, verbose)["sos"])
+
+def load_analog_zpk(freq_data, num_order=NUM_ORDER, den_order=DEN_ORDER):
+    """The fitted analog zeros, poles (rad/s) and gain, independent of any sample rate."""
+    analog = load_fit(freq_data, PWM_SAMPLE_RATE, num_order, den_order)["analog"]
+    z = np.array([complex(*v) for v in analog["zeros"]])
+    p = np.array([complex(*v) for v in analog["poles"]])
+    return z, p, analog["gain"]
+
+def print_report(fs, report):
+    print(f"IIR fit at fs = {fs} Hz, poles at {', '.join(f'{p:.1f}' for p in report['poles_hz'])} Hz")
+    print(f"  gain error: max {report['max_gain_err_db']:.4f} dB, rms {report['rms_gain_err_db']:.4f} dB")
+    print(f"  phase error: max {report['max_phase_err_deg']:.4f} deg")
+
+class SosStream:
+    """sosfilt with the filter state carried from one block to the next."""
+
+    def __init__(self, sos):
+        self.sos = np.asarray(sos)
+        self.zi = np.zeros((len(self.sos), 2))
+
+    def process(self, x):
+        y, self.zi = signal.sosfilt(self.sos, x, zi=self.zi)
+        return y
+
+if __name__ == "__main__":
+    freq_data = sys.argv[1]
+    fs = float(sys.argv[2]) if len(sys.argv) > 2 else PWM_SAMPLE_RATE
+    num_order = int(sys.argv[3]) if len(sys.argv) > 3 else NUM_ORDER
+    den_order = int(sys.argv[4]) if len(sys.argv) > 4 else DEN_ORDER
+
+    load_fit(freq_data, fs, num_order, den_order, verbose=True)
@@ -0,0 +1,237 @@
+# pre-rendered, filtered loops of every note on both channels, for instant tune previews
+# python note_cache.py build                         every MIDI note audio_util.tostep can play
+# python note_cache.py preview out.wav [end_s] [start_s:sine_note:triangle_note ...]
+# python note_cache.py preview tune.wav 0.9 0:76:52 0.3:72:56 0.6:69:57
+# python note_cache.py check [end_s] [notes ...]      preview against filter_pwm.duty_filter
+#
+# A channel only depends on its accumulator, which steps by freq_increment every frame
+# and comes back to where it started after L = 2^14 / gcd(inc, 2^14) frames. So a held
+# note is periodic in L frames (4L PWM periods), and its filtered sound in steady state
+# is one loop. render_loop() computes that loop exactly for the periodic input: the
+# bit-exact channel output (chip_model) per PWM period, through freq_response.csv by
+# one FFT of the period. The response is linear in the duty: it is the order-0 term of
+# filter_pwm.duty_filter. check puts the whole preview about 44 dB below the signal
+# against duty_filter for the test tune, pulse-shape terms and note-change transients
+# included (less for the top octaves, where the pulse shape counts for more). Because
+# the filter is linear, the two channels are rendered and mixed separately. Loops are cut
+# off at LOWPASS_HZ, so preview() gets to 48 kHz by linear interpolation and the preview
+# command never loads SciPy.
+#
+# A loop is keyed by channel, increment and start accumulator. Starting at acc a, the
+# channel only ever visits a + k * gcd(inc, 2^14), so loops for different residues differ.
+# Residues that only differ below the bits a channel reads (acc[13:5] for the sine,
+# acc[13:6] for the triangle) share a loop when the gcd is at least that large. build
+# renders the loops from acc 0; any other one is rendered and stored the first time a
+# preview needs it.
+#
+# preview() takes a write schedule like chip_model.ChipSchedule. For each stretch where
+# a channel's increment is held, it reads that loop from the index of the accumulator
+# the chip would have at that point (ChipSchedule.accumulator), so the phase runs on
+# across note changes. The stretch covers PWM periods 4 * f0 + 1 .. 4 * f1, matching
+# ChipSchedule.duty. The filter's transient at a change is not modelled: the output
+# switches straight from one steady state to the next, which at the same accumulator
+# is close to where it was.
+#
+# Loops live in note_cache/<revision>/ as .npy files. The revision is a hash of the RTL
+# that shapes the channel outputs, chip_model.py, the frequency response and
+# LOOP_VERSION, so editing any of them starts a fresh cache.
+
+import sys
+import os
+import math
+import time
+import hashlib
+
+import numpy as np
+
+from chip_model import ACC_BITS, ACC_MASK, INC_BITS, SAMPLE_RATE, PERIODS_PER_FRAME, PWM_PERIOD, CLOCK_HZ, \
+    ChipSchedule, sine_out, triangle_out
+from filter_pwm import WAV_SAMPLE_RATE, load_freq_response, write_wav
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(HERE, "note_cache")
+FREQ_RESPONSE = os.path.join(HERE, "freq_response.csv")
+RTL_SOURCES = [os.path.join(HERE, "..", "src", name) for name in
+               ("audio_chip.v", "phase_counter.v", "sine.v", "triangle.v", "pwm.v")]
+LOOP_VERSION = 2
+LOWPASS_HZ = 20000
+
+PWM_RATE = CLOCK_HZ // PWM_PERIOD
+# channel out as a function of acc, and the lowest acc bit it reads
+CHANNELS = {"sine": (sine_out, ACC_BITS - 9), "triangle": (triangle_out, ACC_BITS - 8)}
+
+def revision(freq_data=FREQ_RESPONSE):
+    """Hash of everything a loop depends on."""
+    h = hashlib.sha1(f"{LOOP_VERSION}".encode())
+    for path in RTL_SOURCES + [os.path.join(HERE, "chip_model.py"), freq_data]:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+def loop_frames(inc):
+    """Frames before the accumulator repeats (1 for increment 0)."""
+    return (1 << ACC_BITS) // math.gcd(inc & ((1 << INC_BITS) - 1), 1 << ACC_BITS)
+
+def loop_start(channel, inc, acc):
+    """(start accumulator of the loop that plays acc, index of acc in that loop)."""
+    inc &= (1 << INC_BITS) - 1
+    acc &= ACC_MASK
+    g = math.gcd(inc, 1 << ACC_BITS)
+    frames = (1 << ACC_BITS) // g
+    residue = acc % g
+    low = CHANNELS[channel][1]
+    start = residue >> low << low if g >= 1 << low else residue
+    if frames == 1:
+        return start, 0
+    return start, (acc - residue) // g * pow(inc // g, -1, frames) % frames
+
+def render_loop(channel, inc, start, freq, gain, phase):
+    """Steady-state filter output of one loop, per PWM period (float32, 4 * loop_frames).
+
+    Entry 4 * j + q is period q of the loop's frame j, whose channel output comes from
+    accumulator start + j * inc; period 0 of a frame still plays the frame before.
+    """
+    out, _ = CHANNELS[channel]
+    frames = loop_frames(inc)
+    acc = (start + (inc & ((1 << INC_BITS) - 1)) * np.arange(frames)) & ACC_MASK
+    x = np.roll(np.repeat(out(acc).astype(np.float64) / PWM_PERIOD, PERIODS_PER_FRAME), 1)
+    n = len(x)
+    f = np.fft.rfftfreq(n, 1 / PWM_RATE)
+    w = 2 * np.pi * f / PWM_RATE
+    # duty_filter's order-0 term: moments are taken about the centre of each period
+    h = np.interp(f, freq, gain) * np.exp(1j * (np.interp(f, freq, phase) - 0.5 * w))
+    h[f > LOWPASS_HZ] = 0 # band-limited, so preview() can resample by interpolation
+    return np.fft.irfft(np.fft.rfft(x) * h, n).astype(np.float32)
+
+class NoteCache:
+    """Loops on disk for one revision, with the ones in use kept in memory."""
+
+    def __init__(self, cache_dir=CACHE_DIR, freq_data=FREQ_RESPONSE):
+        self.response = load_freq_response(freq_data)
+        self.dir = os.path.join(cache_dir, revision(freq_data))
+        self.loops = {}
+        self.rendered = 0
+
+    def path(self, channel, inc, start):
+        return os.path.join(self.dir, f"{channel}_{inc}_{start}.npy")
+
+    def loop(self, channel, inc, start):
+        key = (channel, inc & ((1 << INC_BITS) - 1), start)
+        if key not in self.loops:
+            path = self.path(*key)
+            if os.path.exists(path):
+                self.loops[key] = np.load(path)
+            else:
+                y = render_loop(*key, *self.response)
+                os.makedirs(self.dir, exist_ok=True)
+                np.save(path + ".tmp.npy", y)
+                os.replace(path + ".tmp.npy", path)
+                self.loops[key] = y
+                self.rendered += 1
+        return self.loops[key]
+
+    def build(self, notes=range(128)):
+        """Render the acc-0 loop of every playable note on both channels."""
+        steps = sorted({step for _, step in note_steps(notes)})
+        for channel in CHANNELS:
+            for step in steps:
+                self.loop(channel, step, 0)
+        return steps
+
+    def channel(self, channel, schedule, frames):
+        """Filtered output of one channel for PWM periods 1 .. 4 * frames."""
+        address = 0 if channel == "sine" else 1
+        starts, incs, _ = schedule.channels[address]
+        bounds = np.append(starts[starts < frames], frames)
+        y = np.empty(PERIODS_PER_FRAME * frames, dtype=np.float32)
+        for f0, f1, inc in zip(bounds[:-1], bounds[1:], incs):
+            # the sine plays A[m] in frame m, the triangle A[m + 1]
+            acc = int(schedule.accumulator(address, f0 + (address == 1)))
+            start, j = loop_start(channel, int(inc), acc)
+            loop = self.loop(channel, int(inc), start)
+            k = (PERIODS_PER_FRAME * j + 1 + np.arange(PERIODS_PER_FRAME * (f1 - f0))) % len(loop)
+            y[PERIODS_PER_FRAME * f0:PERIODS_PER_FRAME * f1] = loop[k]
+        return y
+
+    def preview(self, writes, frames):
+        """The filtered chip output of writes (ChipSchedule (frame, address, value)) at 48 kHz."""
+        schedule = ChipSchedule(writes)
+        y = sum(self.channel(channel, schedule, frames) for channel in CHANNELS)
+        y = np.concatenate((y[:1], y[:-1])) # period 0 held from period 1
+        t = np.arange(int(len(y) * WAV_SAMPLE_RATE / PWM_RATE)) * (PWM_RATE / WAV_SAMPLE_RATE)
+        return np.interp(t, np.arange(len(y)), y)
+
+def note_steps(notes):
+    """(note, freq_increment) of the notes audio_util.tostep can play."""
+    sys.path.insert(0, os.path.join(HERE, "..", "test"))
+    from audio_util import tostep
+
+    return [(note, tostep(note)) for note in notes if tostep(note) < 1 << INC_BITS]
+
+def tune_writes(tune):
+    """ChipSchedule writes of [(start_s, sine_note, triangle_note)]."""
+    steps = dict(note_steps(range(128)))
+    writes = []
+    for start_s, sine_note, triangle_note in tune:
+        frame = round(start_s * SAMPLE_RATE)
+        writes += [(frame, 0, steps[sine_note]), (frame, 1, steps[triangle_note])]
+    return writes
+
+def parse_tune(end_s=None, notes=()):
+    """Tune and frames of an end time and "start_s:sine_note:triangle_note" strings,
+    audio_util's TUNE without notes."""
+    sys.path.insert(0, os.path.join(HERE, "..", "test"))
+    from audio_util import TUNE, TUNE_END_S
+
+    end_s = TUNE_END_S if end_s is None else float(end_s)
+    tune = [(float(s), int(a), int(b)) for s, a, b in (note.split(":") for note in notes)] or TUNE
+    return tune, round(end_s * SAMPLE_RATE)
+
+def check(tune, frames, cache):
+    """Preview against duty_filter on ChipSchedule's duty stream: relative error and timings."""
+    from duty_stream import DutyStream
+    from filter_pwm import duty_filter
+
+    writes = tune_writes(tune)
+    start = time.perf_counter()
+    y = cache.preview(writes, frames)
+    preview_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    duty = ChipSchedule(writes).duty_range(0, PERIODS_PER_FRAME * frames)
+    ref = duty_filter(DutyStream(duty, round(1e12 / CLOCK_HZ), 0, PWM_PERIOD, 0), *cache.response)
+    full_s = time.perf_counter() - start
+
+    n = min(len(y), len(ref))
+    # both sides ignore what came before the tune, so compare after the first 10 ms
+    skip = WAV_SAMPLE_RATE // 100
+    a, b = y[skip:n] - y[skip:n].mean(), ref[skip:n] - ref[skip:n].mean()
+    return 20 * np.log10(np.sqrt(np.mean((a - b) ** 2) / np.mean(b ** 2))), preview_s, full_s
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("build", "preview", "check"):
+        sys.exit("usage: note_cache.py build | preview <out.wav> [end_s] [start_s:sine:triangle ...] "
+                 "| check [end_s] [start_s:sine:triangle ...]")
+
+    cache = NoteCache()
+    if sys.argv[1] == "build":
+        start = time.perf_counter()
+        steps = cache.build()
+        size = sum(os.path.getsize(os.path.join(cache.dir, name)) for name in os.listdir(cache.dir))
+        print(f"{len(steps)} increments x {len(CHANNELS)} channels, {cache.rendered} loops rendered in "
+              f"{time.perf_counter() - start:.2f} s, {size / 1e6:.1f} MB in {cache.dir}")
+    elif sys.argv[1] == "preview":
+        args = sys.argv[3:]
+        tune, frames = parse_tune(args[0] if args else None, args[1:])
+        start = time.perf_counter()
+        y = cache.preview(tune_writes(tune), frames)
+        elapsed = time.perf_counter() - start
+        write_wav(sys.argv[2], y)
+        print(f"{len(tune)} notes, {frames / SAMPLE_RATE:.2f} s -> {sys.argv[2]} in {1000 * elapsed:.1f} ms "
+              f"({cache.rendered} loops rendered)")
+    else:
+        args = sys.argv[2:]
+        tune, frames = parse_tune(args[0] if args else None, args[1:])
+        error_db, preview_s, full_s = check(tune, frames, cache)
+        print(f"preview {1000 * preview_s:.1f} ms, duty_filter {1000 * full_s:.1f} ms, "
+              f"difference {error_db:.1f} dB relative to the signal")
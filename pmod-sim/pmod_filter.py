@@ -0,0 +1,377 @@
+# native model of the PMOD output filter, built from the KiCad schematic
+# python pmod_filter.py tt-audio-pmod.kicad_sch response out.csv [R4=330 C5=68n ...]
+# python pmod_filter.py tt-audio-pmod.kicad_sch render ../test/pwm_duty.bin output.wav [R4=330 ...]
+#
+# response: AC sweep (.ac dec 100 1 500k) in the same format as freq_response.csv
+# render: time-domain simulation of a duty stream or edge log, no SPICE run needed
+#
+# The passive network (R, C, L) is read from the schematic wires/labels/symbols, reduced
+# with nodal analysis to a continuous state space x' = A x + B u, y = C x + D u driven by
+# the voltage source, and discretized exactly for zero-order-hold input at the clock
+# period. The PWM input only changes on clock edges, so the discretization is exact.
+
+import sys
+import re
+from collections import namedtuple
+from fractions import Fraction
+
+import numpy as np
+from scipy import linalg, signal
+
+from duty_stream import load_capture, pulse_bounds
+
+VDD = 3.3 # PWM high level
+OUTPUT_NET = "Vout"
+
+Component = namedtuple("Component", ["ref", "kind", "value", "nodes"])
+
+# ---- schematic parsing ----
+
+def parse_sexpr(text):
+    tokens = re.findall(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()]+', text)
+    stack = [[]]
+    for tok in tokens:
+        if tok == '(':
+            stack.append([])
+        elif tok == ')':
+            node = stack.pop()
+            stack[-1].append(node)
+        elif tok.startswith('"'):
+            stack[-1].append(tok[1:-1].replace('\\"', '"'))
+        else:
+            stack[-1].append(tok)
+    return stack[0][0]
+
+def children(node, name):
+    return [c for c in node[1:] if isinstance(c, list) and c and c[0] == name]
+
+def child(node, name):
+    found = children(node, name)
+    return found[0] if found else None
+
+def properties(node):
+    return {p[1]: p[2] for p in children(node, "property")}
+
+def parse_value(text):
+    """'4k7' -> 4700, '47nF' -> 47e-9, '120R' -> 120, '2R2' -> 2.2"""
+    prefixes = {'f': 1e-15, 'p': 1e-12, 'n': 1e-9, 'u': 1e-6, 'µ': 1e-6, 'm': 1e-3,
+                'k': 1e3, 'K': 1e3, 'M': 1e6, 'G': 1e9, 'R': 1, 'r': 1}
+    m = re.fullmatch(r'\s*([0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)([fpnuµmkKMGRr]?)([0-9]*)\s*(?:F|H|Ohm|ohm|Ω)?\s*', text)
+    if not m:
+        raise ValueError(f"can't parse component value {text!r}")
+    mantissa, prefix, fraction = m.groups()
+    if fraction:
+        mantissa = mantissa + '.' + fraction
+    return float(mantissa) * prefixes.get(prefix, 1)
+
+def pin_offsets(lib_symbol):
+    pins = {}
+    for unit in children(lib_symbol, "symbol"):
+        for pin in children(unit, "pin"):
+            at = child(pin, "at")
+            pins[child(pin, "number")[1]] = (float(at[1]), float(at[2]))
+    return pins
+
+def place(x, y, angle, mirror, px, py):
+    # library coordinates are y-up, the sheet is y-down
+    if mirror == 'x':
+        py = -py
+    elif mirror == 'y':
+        px = -px
+    a = np.deg2rad(angle)
+    rx = px * np.cos(a) - py * np.sin(a)
+    ry = px * np.sin(a) + py * np.cos(a)
+    return (round(float(x + rx), 3), round(float(y - ry), 3))
+
+def on_segment(p, a, b):
+    (x, y), (x1, y1), (x2, y2) = p, a, b
+    cross = (x - x1) * (y2 - y1) - (y - y1) * (x2 - x1)
+    return abs(cross) < 1e-6 and min(x1, x2) - 1e-6 <= x <= max(x1, x2) + 1e-6 \
+        and min(y1, y2) - 1e-6 <= y <= max(y1, y2) + 1e-6
+
+def load_schematic(sch_file):
+    """Netlist of a single-sheet schematic: (components, (ref, plus_net, minus_net))."""
+    with open(sch_file, 'r') as f:
+        sch = parse_sexpr(f.read())
+
+    libs = {s[1]: s for s in children(child(sch, "lib_symbols"), "symbol")}
+
+    parent = {}
+    def find(p):
+        while parent.setdefault(p, p) != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+    def union(a, b):
+        parent[find(a)] = find(b)
+
+    points = []
+    wires = []
+    for wire in children(sch, "wire"):
+        a, b = [(round(float(xy[1]), 3), round(float(xy[2]), 3)) for xy in children(child(wire, "pts"), "xy")]
+        union(a, b)
+        wires.append((a, b))
+        points += [a, b]
+
+    names = {}
+    for label in children(sch, "label") + children(sch, "global_label"):
+        at = child(label, "at")
+        p = (round(float(at[1]), 3), round(float(at[2]), 3))
+        names[p] = label[1]
+        points.append(p)
+    for junction in children(sch, "junction"):
+        at = child(junction, "at")
+        points.append((round(float(at[1]), 3), round(float(at[2]), 3)))
+
+    placed = []
+    for sym in children(sch, "symbol"):
+        lib_id = child(sym, "lib_id")[1]
+        props = properties(sym)
+        at = child(sym, "at")
+        mirror = child(sym, "mirror")
+        pins = {}
+        for num, (px, py) in pin_offsets(libs[lib_id]).items():
+            pins[num] = place(float(at[1]), float(at[2]), float(at[3]) if len(at) > 3 else 0,
+                              mirror[1] if mirror else None, px, py)
+            points.append(pins[num])
+        if lib_id.startswith("power:"):
+            for p in pins.values():
+                names[p] = props["Value"]
+        else:
+            placed.append((lib_id, props, pins))
+
+    # anything landing on a wire (not just its ends) is connected to it
+    for p in points:
+        for a, b in wires:
+            if on_segment(p, a, b):
+                union(p, a)
+
+    # same-named labels and power symbols are one net
+    for p, name in names.items():
+        union(p, ("net", name))
+    net_names = {}
+    for name in sorted(set(names.values())):
+        net_names.setdefault(find(("net", name)), name)
+
+    def net(p):
+        root = find(p)
+        if root in net_names:
+            return net_names[root]
+        return f"Net({root[0]:g},{root[1]:g})"
+
+    components = []
+    source = None
+    for lib_id, props, pins in placed:
+        kind = lib_id.split(":")[-1]
+        if props.get("Sim.Device") == "V" or kind.startswith("V"):
+            # Sim.Pins is like "1=+ 2=-"
+            order = dict(item.split("=") for item in props.get("Sim.Pins", "1=+ 2=-").split())
+            plus = next(n for n, role in order.items() if role == "+")
+            minus = next(n for n, role in order.items() if role == "-")
+            source = (props["Reference"], net(pins[plus]), net(pins[minus]))
+        elif kind in ("R", "C", "L"):
+            components.append(Component(props["Reference"], kind, parse_value(props["Value"]),
+                                        (net(pins["1"]), net(pins["2"]))))
+    if source is None:
+        raise ValueError(f"{sch_file}: no voltage source to drive the network from")
+    return components, source
+
+# ---- state-space model ----
+
+StateSpace = namedtuple("StateSpace", ["A", "B", "C", "D"])
+
+def build_state_space(components, source, output=OUTPUT_NET, overrides=None):
+    """Continuous state space from the voltage source to the output net (w.r.t. ground)."""
+    overrides = overrides or {}
+    _, plus, ground = source
+    nodes = sorted({n for c in components for n in c.nodes if n not in (plus, ground)}, key=str)
+    index = {n: i for i, n in enumerate(nodes)}
+    n = len(nodes)
+    if output not in index:
+        raise ValueError(f"output net {output!r} not found (nets: {', '.join(map(str, nodes))})")
+
+    inductors = [c for c in components if c.kind == "L"]
+    size = n + len(inductors)
+    G = np.zeros((size, size))
+    Cm = np.zeros((size, size))
+    g_in = np.zeros(size) # coupling to the source node
+    c_in = np.zeros(size)
+
+    def stamp(M, m_in, a, b, y):
+        for p, q, sign in ((a, a, 1), (b, b, 1), (a, b, -1), (b, a, -1)):
+            if p in index and q in index:
+                M[index[p], index[q]] += sign * y
+            elif p in index and q == plus:
+                m_in[index[p]] += sign * y
+
+    for c in components:
+        value = overrides.get(c.ref, c.value)
+        if c.kind == "R":
+            stamp(G, g_in, *c.nodes, 1 / value)
+        elif c.kind == "C":
+            stamp(Cm, c_in, *c.nodes, value)
+    for k, c in enumerate(inductors):
+        # extra unknown: inductor current, with L di/dt = v_a - v_b
+        row = n + k
+        a, b = c.nodes
+        for node, sign in ((a, 1), (b, -1)):
+            if node in index:
+                G[index[node], row] += sign
+                G[row, index[node]] -= sign
+            elif node == plus:
+                g_in[row] -= sign
+        Cm[row, row] = overrides.get(c.ref, c.value)
+
+    if np.any(c_in):
+        raise ValueError("capacitors directly on the source node are not supported")
+
+    # split into dynamic unknowns (with capacitance/inductance) and purely resistive nodes,
+    # then eliminate the resistive ones (Kron reduction)
+    dyn = np.nonzero(np.any(Cm != 0, axis=1))[0]
+    res = np.setdiff1d(np.arange(size), dyn)
+    Gdd, Gdr, Grd, Grr = G[np.ix_(dyn, dyn)], G[np.ix_(dyn, res)], G[np.ix_(res, dyn)], G[np.ix_(res, res)]
+    Grr_inv_Grd = linalg.solve(Grr, Grd) if len(res) else np.zeros((0, len(dyn)))
+    Grr_inv_gr = linalg.solve(Grr, g_in[res]) if len(res) else np.zeros(0)
+    Cdd = Cm[np.ix_(dyn, dyn)]
+    A = -linalg.solve(Cdd, Gdd - Gdr @ Grr_inv_Grd)
+    B = -linalg.solve(Cdd, g_in[dyn] - Gdr @ Grr_inv_gr)[:, None]
+
+    out = index[output]
+    if out in dyn:
+        C = (dyn == out).astype(float)[None, :]
+        D = np.zeros((1, 1))
+    else:
+        r = np.nonzero(res == out)[0][0]
+        C = -Grr_inv_Grd[r][None, :]
+        D = np.array([[-Grr_inv_gr[r]]])
+    return StateSpace(A, B, C, D)
+
+def load_model(sch_file, output=OUTPUT_NET, overrides=None):
+    return build_state_space(*load_schematic(sch_file), output, overrides)
+
+def freq_response(ss, freq):
+    # C (sI - A)^-1 B + D straight from the state space; going through a transfer
+    # function loses precision with the ms and us time constants in one polynomial
+    A, B, C, D = (np.atleast_2d(m) for m in ss)
+    I = np.eye(len(A))
+    return np.array([(C @ np.linalg.solve(2j * np.pi * f * I - A, B) + D)[0, 0] for f in np.asarray(freq)])
+
+def write_freq_response(out_name, freq, h):
+    # same layout as the SPICE export: frequency;phase (deg);gain (dB);
+    with open(out_name, 'w') as f:
+        for f_hz, v in zip(freq, h):
+            f.write(f"{f_hz:g};{np.rad2deg(np.angle(v)):g};{20 * np.log10(np.abs(v)):g};\n")
+
+# ---- time-domain simulation ----
+
+class Discretized:
+    """Exact ZOH discretization at clk_period_s, in modal form so every mode is a one-pole IIR."""
+
+    def __init__(self, ss, clk_period_s):
+        lam, V = linalg.eig(ss.A)
+        self.lam_d = np.exp(lam * clk_period_s)
+        # zero-order hold input gain of each mode: integral of e^(lam t) over one clock
+        self.b = linalg.solve(V, ss.B[:, 0]) * np.where(lam != 0, (self.lam_d - 1) / np.where(lam != 0, lam, 1), clk_period_s)
+        self.c = (ss.C @ V)[0]
+        self.d = ss.D[0, 0]
+        self.z = np.zeros(len(lam), dtype=complex)
+
+    def settle(self, level):
+        """Jump to the steady state for a constant input level."""
+        self.z = self.b * level / (1 - self.lam_d)
+
+    def process_clocks(self, u):
+        """Output sampled at each clock edge for a block of per-clock input levels."""
+        u = np.asarray(u, dtype=float)
+        y = np.zeros(len(u))
+        for i in range(len(self.z)):
+            # z[n+1] = lam_d z[n] + b u[n], output uses z[n]
+            w, _ = signal.lfilter([1], [1, -self.lam_d[i]], self.b[i] * u, zi=[self.lam_d[i] * self.z[i]])
+            zn = np.concatenate(([self.z[i]], w[:-1]))
+            y += np.real(self.c[i] * zn)
+            self.z[i] = w[-1]
+        return y + self.d * u
+
+    def process_pulses(self, rise, fall, period, offsets=None):
+        """Output at each PWM period start, for one pulse per period high on clocks [rise, fall).
+
+        With offsets (clocks into the period, each < period), the output at each of those
+        instead, as a (periods, offsets) array.
+        """
+        rise = np.asarray(rise)
+        fall = np.asarray(fall)
+        at = np.asarray(offsets if offsets is not None else [0])
+        y = np.zeros((len(rise), len(at)))
+        for i in range(len(self.z)):
+            lam_d = self.lam_d[i]
+            # sum of lam_d^(period-1-j) over the high clocks j, in closed form
+            if abs(1 - lam_d) > 1e-12:
+                g = self.b[i] * (lam_d ** (period - fall) - lam_d ** (period - rise)) / (1 - lam_d)
+            else:
+                g = self.b[i] * (fall - rise)
+            lam_p = lam_d ** period
+            w, _ = signal.lfilter([1], [1, -lam_p], g, zi=[lam_p * self.z[i]])
+            zn = np.concatenate(([self.z[i]], w[:-1]))
+            # o clocks in: the period start state decayed, plus the high clocks before o
+            end = np.minimum(fall[:, None], at)
+            start = np.minimum(rise[:, None], end)
+            if abs(1 - lam_d) > 1e-12:
+                part = self.b[i] * (lam_d ** (at - end) - lam_d ** (at - start)) / (1 - lam_d)
+            else:
+                part = self.b[i] * (end - start)
+            y += np.real(self.c[i] * (lam_d ** at * zn[:, None] + part))
+            self.z[i] = w[-1]
+        # D term: level during the sampled clock
+        y += self.d * ((rise[:, None] <= at) & (at < fall[:, None]))
+        return y if offsets is not None else y[:, 0]
+
+def simulate_duty(ss, stream, block=1 << 16, vdd=VDD, settle=True, offsets=None):
+    """Filter output (volts) at the start of every PWM period of a duty stream.
+
+    With settle, the filter starts in steady state for the average duty instead of
+    charging the coupling capacitor from 0 V. With offsets, the output that many clocks
+    into every period, one column per offset.
+    """
+    disc = Discretized(ss, stream.clk_period_ps * 1e-12)
+    rise, fall = pulse_bounds(stream.duty, stream.initial)
+    if settle and len(rise):
+        disc.settle(np.mean(fall - rise) / stream.period)
+    out = np.empty((len(rise),) if offsets is None else (len(rise), len(offsets)))
+    for start in range(0, len(rise), block):
+        sl = slice(start, start + block)
+        out[sl] = disc.process_pulses(rise[sl], fall[sl], stream.period, offsets)
+    return out * vdd
+
+def simulate_pwm(ss, levels, clk_period_s, block=1 << 20, vdd=VDD):
+    """Filter output (volts) at every clock edge for per-clock PWM levels (0/1)."""
+    disc = Discretized(ss, clk_period_s)
+    out = np.empty(len(levels))
+    for start in range(0, len(levels), block):
+        sl = slice(start, start + block)
+        out[sl] = disc.process_clocks(levels[sl])
+    return out * vdd
+
+def parse_overrides(args):
+    return {ref: parse_value(value) for ref, value in (a.split("=", 1) for a in args)}
+
+if __name__ == "__main__":
+    sch_file = sys.argv[1]
+    cmd = sys.argv[2]
+
+    if cmd == "response":
+        out_name = sys.argv[3]
+        ss = load_model(sch_file, overrides=parse_overrides(sys.argv[4:]))
+        freq = np.logspace(0, np.log10(500e3), 571) # .ac dec 100 1 500k
+        write_freq_response(out_name, freq, freq_response(ss, freq))
+    elif cmd == "render":
+        from filter_pwm import write_wav, WAV_SAMPLE_RATE
+        capture, out_name = sys.argv[3], sys.argv[4]
+        ss = load_model(sch_file, overrides=parse_overrides(sys.argv[5:]))
+        stream = load_capture(capture)
+        y = simulate_duty(ss, stream)
+        # one output sample per PWM period -> WAV rate
+        ratio = Fraction(WAV_SAMPLE_RATE * stream.period * stream.clk_period_ps, 10 ** 12).limit_denominator(10000)
+        y = signal.resample_poly(y - np.mean(y), ratio.numerator, ratio.denominator)
+        write_wav(out_name, y)
+    else:
+        sys.exit("usage: pmod_filter.py <schematic> response <out.csv> | render <capture> <out.wav> [REF=value ...]")
@@ -0,0 +1,9 @@
+# the pmod-sim tools behind one command line, see __main__.py
+
+import os
+import sys
+
+# the tools themselves are the flat modules next to this package
+_TOOLS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _TOOLS not in sys.path:
+    sys.path.insert(0, _TOOLS)
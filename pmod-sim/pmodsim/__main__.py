@@ -0,0 +1,115 @@
+# one command line for the pmod-sim tools (run from pmod-sim/, or with it on PYTHONPATH)
+# python -m pmodsim render ../test/pwm_duty.bin output.wav [--mode duty|iir|fft]
+# python -m pmodsim extract ../test/tb.vcd input_waveform.txt [--format pwl|edges]
+# python -m pmodsim csv2wav spice.csv [out.wav]
+# python -m pmodsim sweep steps|notes [--out tuning.csv]
+# python -m pmodsim analyze ../test/pwm_edges.log
+# python -m pmodsim plot output.wav [--start 0.3 --stop 0.31] [--out zoom.png]
+# python -m pmodsim preview tune.wav 0:76:52 0.3:72:56 0.6:69:57 --end 0.9
+# python -m pmodsim batch jobs.txt          one command per line ("-" reads stdin)
+#
+# Nothing heavy is imported before a command runs, so the standard-library commands start
+# about as fast as the interpreter. batch runs its jobs in this one process: imports, the
+# frequency response and the fitted filter are loaded once for all of them.
+
+import argparse
+import shlex
+import sys
+import time
+
+from pmodsim import commands
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m pmodsim", description="pmod-sim tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("render", help="filter a pwm capture through the Pmod into a WAV")
+    p.add_argument("capture", help="pwm_edges.log or pwm_duty.bin")
+    p.add_argument("out", nargs="?", default="output.wav")
+    p.add_argument("--response", default=commands.FREQ_RESPONSE, help="frequency response CSV")
+    p.add_argument("--mode", choices=("duty", "iir", "fft"), default="duty",
+                   help="duty: one sample per PWM period (default, takes both capture formats); "
+                        "iir: fitted filter streamed at the clock rate; fft: full-length FFT")
+    p.set_defaults(run=commands.render)
+
+    p = sub.add_parser("extract", help="pull a 1-bit signal out of a VCD")
+    p.add_argument("vcd")
+    p.add_argument("out", nargs="?", default="input_waveform.txt")
+    p.add_argument("--signal", help=f"variable name (default: the only 1-bit one, else {commands.DEFAULT_SIGNAL})")
+    p.add_argument("--format", choices=("pwl", "edges"), default="pwl",
+                   help="pwl: ngspice PWL source; edges: time_ns,value log like pwm_edges.log")
+    p.add_argument("--step", type=float, default=35.0, help="PWL edge ramp in ns")
+    p.add_argument("--vdd", type=float, default=3.3)
+    p.set_defaults(run=commands.extract)
+
+    p = sub.add_parser("csv2wav", help="SPICE transient CSV (time;volts) to a 16-bit WAV")
+    p.add_argument("csv")
+    p.add_argument("out", nargs="?", help="default: the CSV name with .wav")
+    p.add_argument("--rate", type=int, default=48000)
+    p.add_argument("--vdd", type=float, default=3.3, help="volts mapped to full scale")
+    p.set_defaults(run=commands.csv2wav)
+
+    p = sub.add_parser("sweep", help="what every freq_increment plays (tuning_sweep.py)")
+    p.add_argument("what", choices=("steps", "notes"))
+    p.add_argument("--out", help="also write the steps table to this CSV")
+    p.set_defaults(run=commands.sweep)
+
+    p = sub.add_parser("analyze", help="summary and strongest tones of a capture")
+    p.add_argument("capture", help="pwm_edges.log or pwm_duty.bin")
+    p.add_argument("--peaks", type=int, default=5)
+    p.set_defaults(run=commands.analyze)
+
+    p = sub.add_parser("plot", help="min/max envelope plot of a capture or WAV (envelope.py)")
+    p.add_argument("capture", help="pwm_edges.log, pwm_duty.bin or a WAV")
+    p.add_argument("--start", type=float, help="seconds")
+    p.add_argument("--stop", type=float, help="seconds")
+    p.add_argument("--out", help="write a PNG instead of opening a window")
+    p.add_argument("--width", type=int, default=1600, help="pixel columns")
+    p.set_defaults(run=commands.plot)
+
+    p = sub.add_parser("preview", help="play a note list from the pre-rendered note loops (note_cache.py)")
+    p.add_argument("out", help="WAV to write")
+    p.add_argument("notes", nargs="*", help="start_s:sine_note:triangle_note (MIDI), default: the test tune")
+    p.add_argument("--end", type=float, help="seconds (default: the test tune's end)")
+    p.set_defaults(run=commands.preview)
+
+    p = sub.add_parser("batch", help="run one command per line of a file in this process")
+    p.add_argument("jobs", help='file of commands, "-" for stdin')
+    p.add_argument("--keep-going", action="store_true", help="run the remaining jobs after a failure")
+    p.set_defaults(run=batch)
+    return parser
+
+def batch(args):
+    parser = build_parser()
+    f = sys.stdin if args.jobs == "-" else open(args.jobs)
+    failed = 0
+    try:
+        for n, line in enumerate(f, 1):
+            argv = shlex.split(line, comments=True)
+            if not argv:
+                continue
+            start = time.perf_counter()
+            try:
+                job = parser.parse_args(argv)
+                if job.command == "batch":
+                    raise ValueError("batch jobs cannot nest")
+                job.run(job)
+            except (Exception, SystemExit) as e:
+                failed += 1
+                print(f"job {n} failed: {line.strip()}: {e}", file=sys.stderr)
+                if not args.keep_going:
+                    break
+            else:
+                print(f"job {n} done in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    if failed:
+        sys.exit(1)
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# the subcommands of python -m pmodsim. Each one imports what it needs when it runs:
+# csv2wav and extract stay on the standard library (and pyvcd), render, sweep,
+# analyze, plot and preview bring in NumPy, and only the render modes that need SciPy load it.
+
+import functools
+import math
+import os
+
+from pmodsim import files
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FREQ_RESPONSE = os.path.join(TOOLS_DIR, "freq_response.csv")
+
+# ---- render ----
+
+# loaded once per process, so a batch renders many captures against one response
+@functools.lru_cache(maxsize=None)
+def _freq_response(path):
+    from filter_pwm import load_freq_response
+    return load_freq_response(path)
+
+@functools.lru_cache(maxsize=None)
+def _sos(path):
+    from filter_pwm import PWM_SAMPLE_RATE
+    from fit_iir import load_sos
+    return load_sos(path, PWM_SAMPLE_RATE)
+
+def render(args):
+    import filter_pwm
+
+    if args.mode == "duty":
+        from duty_stream import load_capture
+        y = filter_pwm.duty_filter(load_capture(args.capture), *_freq_response(args.response))
+    elif args.mode == "iir":
+        y = filter_pwm.iir_filter(*filter_pwm.load_pwm(args.capture), _sos(args.response))
+    else:
+        y = filter_pwm.fft_filter(*filter_pwm.load_pwm(args.capture), *_freq_response(args.response))
+    filter_pwm.write_wav(args.out, y)
+    print(f"{args.capture} -> {args.out} ({args.mode})")
+
+# ---- extract ----
+
+TIMESCALE_S = {"s": 1.0, "ms": 1e-3, "us": 1e-6, "ns": 1e-9, "ps": 1e-12, "fs": 1e-15}
+DEFAULT_SIGNAL = "pwm_out"
+
+def vcd_edges(path, signal=None):
+    """(time_s, 0/1) for every change of one 1-bit signal, streamed from a VCD.
+
+    signal is the variable's name; without it a VCD with a single 1-bit variable uses
+    that one, otherwise DEFAULT_SIGNAL.
+    """
+    from vcd.reader import TokenKind, tokenize
+
+    unit_s = 1e-12
+    scalars = {}
+    id_code = None
+    time_s = 0.0
+    with open(path, "rb") as f:
+        for token in tokenize(f):
+            kind = token.kind
+            if kind == TokenKind.CHANGE_SCALAR:
+                change = token.scalar_change
+                if change.id_code == id_code and change.value in ("0", "1"):
+                    yield time_s, int(change.value)
+            elif kind == TokenKind.CHANGE_TIME:
+                time_s = token.time_change * unit_s
+            elif kind == TokenKind.VAR:
+                if token.var.size == 1:
+                    scalars.setdefault(token.var.reference, token.var.id_code)
+            elif kind == TokenKind.TIMESCALE:
+                unit_s = int(token.timescale.magnitude) * TIMESCALE_S[token.timescale.unit.value]
+            elif kind == TokenKind.ENDDEFINITIONS:
+                name = signal or (next(iter(scalars)) if len(scalars) == 1 else DEFAULT_SIGNAL)
+                if name not in scalars:
+                    raise ValueError(f"{path}: no 1-bit signal named {name}")
+                id_code = scalars[name]
+
+def pwl_points(edges, ramp_s, vdd):
+    """PWL corners for the edges: each change ramps over ramp_s up to its time."""
+    level = None
+    for t, value in edges:
+        if value == level:
+            continue
+        high = vdd if value else 0.0
+        yield t - ramp_s, vdd - high
+        yield t, high
+        level = value
+
+def extract(args):
+    edges = vcd_edges(args.vcd, args.signal)
+    if args.format == "edges":
+        files.write_edges(args.out, ((t * 1e9, v) for t, v in edges))
+    else:
+        files.write_pwl(args.out, pwl_points(edges, args.step * 1e-9, args.vdd))
+    print(f"{args.vcd} -> {args.out} ({args.format})")
+
+# ---- csv2wav ----
+
+def csv2wav(args):
+    sample_period = 1.0 / args.rate
+    samples = []
+    for t, v in files.read_spice_csv(args.csv):
+        value = max(-32768, min(32767, int(v / args.vdd * 32767))) # scale to 16-bit
+        if t > len(samples) * sample_period:
+            samples.extend([value] * int((t - len(samples) * sample_period) / sample_period))
+    out = args.out or args.csv.rsplit(".", 1)[0] + ".wav"
+    files.write_wav(out, samples, args.rate)
+    print(f"{args.csv} -> {out} ({len(samples)} samples)")
+
+# ---- sweep ----
+
+def sweep(args):
+    import tuning_sweep
+
+    table = tuning_sweep.load_table()
+    if args.what == "steps":
+        tuning_sweep.report_steps(table, args.out)
+    else:
+        tuning_sweep.report_notes(table)
+
+# ---- analyze ----
+
+def _peaks(spectrum, count, floor_db=-60):
+    """Bins of the count strongest local maxima within floor_db of the largest."""
+    import numpy as np
+
+    inner = spectrum[1:-1]
+    bins = np.nonzero((inner > spectrum[:-2]) & (inner >= spectrum[2:]))[0] + 1
+    bins = bins[spectrum[bins] > spectrum.max() * 10 ** (floor_db / 20)]
+    return bins[np.argsort(spectrum[bins])[::-1][:count]]
+
+def analyze(args):
+    import numpy as np
+    from duty_stream import load_capture
+
+    stream = load_capture(args.capture)
+    duty = stream.duty.astype(float)
+    period_s = stream.period * stream.clk_period_ps * 1e-12
+    print(f"{args.capture}: {len(duty)} PWM periods ({len(duty) * period_s:.4f} s), "
+          f"clock {stream.clk_period_ps / 1000:g} ns, first latch edge at {stream.offset_ps / 1000:g} ns")
+    if len(duty) == 0:
+        return
+    print(f"duty {int(duty.min())}..{int(duty.max())} of {stream.period}, mean {duty.mean():.2f} "
+          f"({100 * duty.mean() / stream.period:.1f}% of VDD on average)")
+    if len(duty) < 4:
+        return
+
+    spectrum = np.abs(np.fft.rfft((duty - duty.mean()) * np.hanning(len(duty))))
+    freq = np.fft.rfftfreq(len(duty), period_s)
+    print("strongest tones:")
+    for b in _peaks(spectrum, args.peaks):
+        note = 69 + 12 * math.log2(freq[b] / 440.0)
+        print(f"  {freq[b]:10.1f} Hz  {20 * np.log10(spectrum[b] / spectrum.max()):6.1f} dB  MIDI {note:6.2f}")
+
+# ---- plot ----
+
+def plot(args):
+    import envelope
+
+    envelope.plot(args.capture, args.start, args.stop, args.out, args.width)
+    if args.out:
+        print(f"{args.capture} -> {args.out}")
+
+# ---- preview ----
+
+# loops read once per process, so a batch of previews shares them
+@functools.lru_cache(maxsize=None)
+def _note_cache():
+    from note_cache import NoteCache
+    return NoteCache()
+
+def preview(args):
+    import time
+    import note_cache
+    from filter_pwm import write_wav
+
+    cache = _note_cache()
+    tune, frames = note_cache.parse_tune(args.end, args.notes)
+    start = time.perf_counter()
+    y = cache.preview(note_cache.tune_writes(tune), frames)
+    elapsed = time.perf_counter() - start
+    write_wav(args.out, y)
+    print(f"{len(tune)} notes -> {args.out} in {1000 * elapsed:.1f} ms")
@@ -0,0 +1,38 @@
+# file formats shared by the pmod-sim tools, standard library only so the light
+# commands never pay for NumPy
+
+import array
+import csv
+import wave
+
+SPICE_DELIMITER = ";"
+
+def write_wav(out_name, pcm, sample_rate, sampwidth=2):
+    """Mono PCM WAV. pcm is anything with tobytes() (numpy or array.array) or a list of ints."""
+    if isinstance(pcm, list):
+        pcm = array.array("h" if sampwidth == 2 else "B", pcm)
+    with wave.open(out_name, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(sampwidth)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+def read_spice_csv(path, delimiter=SPICE_DELIMITER):
+    """(time_s, volts) rows of an ngspice/KiCad transient export, header skipped."""
+    with open(path, "r") as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        next(reader, None)
+        for row in reader:
+            yield float(row[0]), float(row[1])
+
+def write_pwl(out_name, points):
+    """ngspice PWL source file: one "time_s volts" pair per line."""
+    with open(out_name, "w") as f:
+        for t, v in points:
+            f.write(f"{t:.9f} {v:.6f}\n")
+
+def write_edges(out_name, edges):
+    """time_ns,value edge log, the format audio_test.py captures."""
+    with open(out_name, "w") as f:
+        for t_ns, value in edges:
+            f.write(f"{t_ns:.3f},{value}\n")
@@ -0,0 +1,226 @@
+# real-time software synth emulating the chip, driven by register writes over a socket
+# python synth_server.py serve unix:/tmp/synth.sock out.wav [seconds]
+# python synth_server.py serve tcp:127.0.0.1:7000 - | aplay -f S16_LE -r 48000
+# python synth_server.py write unix:/tmp/synth.sock 0 256      (register 0 = sine freq_increment)
+# python synth_server.py bench [seconds]
+#
+# Protocol: one register write per line, "<address> <value>" (decimal or 0x hex), answered
+# with "ok". The chip is chip_model.ChipModel (bit-exact channels and PWM mixer), the
+# output filter is the exact state-space model of the Pmod from pmod_filter.py, and the
+# result is low-passed and resampled to 48 kHz as it streams.
+#
+# Audio is rendered BLOCK_FRAMES chip frames at a time, LEAD_BLOCKS blocks ahead of
+# real time, and writes apply from the next block. A write is heard at most
+# (1 + LEAD_BLOCKS) blocks (about 4.5 ms) after it arrives; the measured latency and the
+# render speed in multiples of real time are printed when the server stops.
+
+import sys
+import os
+import asyncio
+import time
+import wave
+from fractions import Fraction
+
+import numpy as np
+from scipy import signal
+
+from chip_model import ChipModel, SAMPLE_RATE
+from duty_stream import pulse_bounds, PWM_PERIOD
+from fit_iir import SosStream
+from filter_pwm import WAV_SAMPLE_RATE, PWM_SAMPLE_RATE
+from pmod_filter import load_model, Discretized, VDD
+
+SCHEMATIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tt-audio-pmod.kicad_sch")
+
+BLOCK_FRAMES = 64 # 2.27 ms of audio per render
+LEAD_BLOCKS = 1 # blocks rendered ahead of real time
+FULL_SCALE_V = 1.0 # filter output mapped to int16 full scale
+LOWPASS_HZ = 20000 # anti-alias filter ahead of the 48 kHz resampler
+
+class Renderer:
+    """ChipModel -> Pmod filter -> 48 kHz int16, one block at a time with all state carried."""
+
+    def __init__(self, sch_file=SCHEMATIC):
+        self.chip = ChipModel()
+        self.filter = Discretized(load_model(sch_file), 1 / PWM_SAMPLE_RATE)
+        self.filter.settle(64 / PWM_PERIOD) # out of reset the PWM idles at the sine midpoint
+        pwm_rate = PWM_SAMPLE_RATE // PWM_PERIOD
+        self.lowpass = SosStream(signal.butter(6, LOWPASS_HZ, fs=pwm_rate, output="sos"))
+        # output sample k sits at input sample k * ratio, kept exact with integers
+        self.ratio = Fraction(pwm_rate, WAV_SAMPLE_RATE)
+        self.consumed = 0 # input samples before the current block
+        self.out_index = 0
+        self.prev = 0.0
+        self.prev_duty = 0
+
+    def render(self, frames):
+        duty = self.chip.render(frames)
+        rise, fall = pulse_bounds(duty, self.prev_duty)
+        self.prev_duty = int(duty[-1])
+        x = self.lowpass.process(self.filter.process_pulses(rise, fall, PWM_PERIOD) * VDD)
+
+        n = len(x)
+        last = (self.consumed + n - 1) * self.ratio.denominator // self.ratio.numerator
+        k = np.arange(self.out_index, last + 1)
+        pos = k * self.ratio.numerator / self.ratio.denominator - self.consumed
+        y = np.interp(pos, np.arange(-1, n), np.concatenate(([self.prev], x)))
+        self.out_index = last + 1
+        self.consumed += n
+        self.prev = x[-1]
+        return np.clip(np.rint(y / FULL_SCALE_V * 32767), -32768, 32767).astype(np.int16)
+
+class WavSink:
+    def __init__(self, path):
+        self.f = wave.open(path, "wb")
+        self.f.setnchannels(1)
+        self.f.setsampwidth(2)
+        self.f.setframerate(WAV_SAMPLE_RATE)
+
+    def write(self, pcm):
+        self.f.writeframes(pcm.tobytes())
+
+    def close(self):
+        self.f.close()
+
+class RawSink:
+    """Headerless S16_LE, to a file or stdout ("-")."""
+
+    def __init__(self, path):
+        self.f = sys.stdout.buffer if path == "-" else open(path, "wb")
+
+    def write(self, pcm):
+        self.f.write(pcm.astype("<i2").tobytes())
+        self.f.flush()
+
+    def close(self):
+        if self.f is not sys.stdout.buffer:
+            self.f.close()
+
+def open_sink(path):
+    return WavSink(path) if path.endswith(".wav") else RawSink(path)
+
+def parse_endpoint(spec):
+    kind, _, rest = spec.partition(":")
+    if kind == "unix":
+        return ("unix", rest)
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        return ("tcp", (host or "127.0.0.1", int(port)))
+    raise ValueError(f"endpoint must be unix:<path> or tcp:<host>:<port>, got {spec}")
+
+class SynthServer:
+    def __init__(self, renderer, sink):
+        self.renderer = renderer
+        self.sink = sink
+        self.pending = [] # (arrival time, address, value)
+        self.latencies = []
+        self.render_s = 0.0
+        self.start = None
+
+    async def handle(self, reader, writer):
+        while line := await reader.readline():
+            try:
+                address, value = (int(v, 0) for v in line.split())
+            except ValueError:
+                writer.write(b"error: expected '<address> <value>'\n")
+            else:
+                self.pending.append((time.perf_counter(), address, value))
+                writer.write(b"ok\n")
+            await writer.drain()
+        writer.close()
+
+    def render_block(self):
+        chip = self.renderer.chip
+        # wall time at which the block about to be rendered starts playing
+        plays_at = self.start + chip.frame / SAMPLE_RATE
+        for arrival, address, value in self.pending:
+            chip.write(address, value)
+            self.latencies.append(plays_at - arrival)
+        self.pending.clear()
+
+        t = time.perf_counter()
+        self.sink.write(self.renderer.render(BLOCK_FRAMES))
+        self.render_s += time.perf_counter() - t
+
+    async def run(self, seconds=None):
+        # audio position 0 plays LEAD_BLOCKS blocks after we start rendering
+        self.start = time.perf_counter() + LEAD_BLOCKS * BLOCK_FRAMES / SAMPLE_RATE
+        chip = self.renderer.chip
+        while seconds is None or chip.frame < seconds * SAMPLE_RATE:
+            due = self.start + chip.frame / SAMPLE_RATE - LEAD_BLOCKS * BLOCK_FRAMES / SAMPLE_RATE
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.render_block()
+
+    def report(self):
+        audio_s = self.renderer.chip.frame / SAMPLE_RATE
+        lines = [f"{audio_s:.2f} s of audio, render {audio_s / max(self.render_s, 1e-9):.1f}x real time"]
+        if self.latencies:
+            lat = np.array(self.latencies) * 1000
+            lines.append(f"{len(lat)} writes, write-to-audio latency mean {lat.mean():.2f} ms, max {lat.max():.2f} ms")
+        return "\n".join(lines)
+
+async def serve(endpoint, out_path, seconds=None):
+    kind, addr = parse_endpoint(endpoint)
+    server = SynthServer(Renderer(), open_sink(out_path))
+    if kind == "unix":
+        if os.path.exists(addr):
+            os.unlink(addr)
+        listener = await asyncio.start_unix_server(server.handle, path=addr)
+    else:
+        listener = await asyncio.start_server(server.handle, *addr)
+    print(f"listening on {endpoint}", file=sys.stderr)
+    try:
+        async with listener:
+            await server.run(seconds)
+    finally:
+        server.sink.close()
+        if kind == "unix" and os.path.exists(addr):
+            os.unlink(addr)
+        print(server.report(), file=sys.stderr)
+
+async def send_write(endpoint, address, value):
+    kind, addr = parse_endpoint(endpoint)
+    if kind == "unix":
+        reader, writer = await asyncio.open_unix_connection(addr)
+    else:
+        reader, writer = await asyncio.open_connection(*addr)
+    writer.write(f"{address} {value}\n".encode())
+    await writer.drain()
+    reply = await reader.readline()
+    writer.close()
+    return reply.decode().strip()
+
+def bench(seconds=10.0):
+    """Render as fast as possible, with a note change every 100 ms; returns x real time."""
+    renderer = Renderer()
+    frames = int(seconds * SAMPLE_RATE)
+    note_frames = SAMPLE_RATE // 10
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    done = 0
+    while done < frames:
+        if done % note_frames < BLOCK_FRAMES:
+            renderer.chip.write(0, int(rng.integers(76, 1024)))
+            renderer.chip.write(1, int(rng.integers(38, 512)))
+        renderer.render(BLOCK_FRAMES)
+        done += BLOCK_FRAMES
+    return (done / SAMPLE_RATE) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "serve":
+        seconds = float(sys.argv[4]) if len(sys.argv) > 4 else None
+        try:
+            asyncio.run(serve(sys.argv[2], sys.argv[3], seconds))
+        except KeyboardInterrupt:
+            pass
+    elif cmd == "write":
+        print(asyncio.run(send_write(sys.argv[2], int(sys.argv[3], 0), int(sys.argv[4], 0))))
+    elif cmd == "bench":
+        seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+        print(f"{bench(seconds):.1f}x real time ({BLOCK_FRAMES} frames per block)")
+    else:
+        sys.exit("usage: synth_server.py serve <endpoint> <out.wav|out.raw|-> [seconds] | "
+                 "write <endpoint> <address> <value> | bench [seconds]")
@@ -0,0 +1,168 @@
+# what every freq_increment register value actually plays, through the bit-exact model
+# python tuning_sweep.py steps [tuning_table.csv]   all 4096 register values
+# python tuning_sweep.py notes                      MIDI notes as picked by audio_util.tostep
+#
+# For each increment both channels are run for 2^14 frames, which is a whole number of
+# accumulator cycles for every increment, so the spectrum has no leakage: the
+# fundamental sits exactly in bin freq_increment and every other bin is a harmonic,
+# possibly folded back from above Nyquist (alias). Per channel the table reports the
+# fundamental amplitude (LSB), the worst spur (dBc, frequency, harmonic number, alias)
+# and THD+N (dBc). The table is cached in tuning_table.csv, keyed by the model source.
+
+import sys
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import chip_model
+from chip_model import ACC_BITS, INC_BITS, SAMPLE_RATE, sine_out, triangle_out, accumulator, increment_freq
+
+FRAMES = 1 << ACC_BITS
+CHUNK = 256 # increments per worker task
+CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tuning_table.csv")
+
+A4_FREQ = 440.0
+A4_MIDI = 69
+
+CHANNELS = {"sine": sine_out, "triangle": triangle_out}
+CHANNEL_COLUMNS = ["amplitude", "spur_dbc", "spur_hz", "spur_harmonic", "spur_alias", "thd_n_dbc"]
+COLUMNS = ["freq_increment", "freq_hz", "midi", "cents"] + \
+    [f"{ch}_{col}" for ch in CHANNELS for col in CHANNEL_COLUMNS]
+
+def freq_to_midi(freq_hz):
+    with np.errstate(divide="ignore"):
+        return A4_MIDI + 12 * np.log2(np.asarray(freq_hz) / A4_FREQ)
+
+def midi_to_freq(note):
+    return A4_FREQ * 2 ** ((np.asarray(note) - A4_MIDI) / 12)
+
+def spectrum_stats(samples, inc):
+    """Per-row fundamental/spur stats for channel outputs over FRAMES frames."""
+    X = np.abs(np.fft.rfft(samples, axis=1)) / FRAMES
+    rows = np.arange(len(inc))
+    fund = np.where(inc > 0, X[rows, inc], 0) # increment 0 is silence, not a tone at DC
+    power = X ** 2
+    power[:, 0] = 0
+    power[rows, inc] = 0
+    spur_bin = np.argmax(power, axis=1)
+    spur = np.sqrt(power[rows, spur_bin])
+    rest = np.sqrt(np.sum(power, axis=1))
+
+    # every bin is a (folded) harmonic of the fundamental: solve n * inc = +-bin (mod cycle)
+    harmonic = np.zeros(len(inc), dtype=np.int64)
+    for i, (k, b) in enumerate(zip(inc, spur_bin)):
+        if k == 0 or spur[i] == 0:
+            continue
+        g = int(np.gcd(int(k), FRAMES))
+        cycle = FRAMES // g
+        n = (int(b) // g) * pow(int(k) // g, -1, cycle) % cycle if cycle > 1 else 0
+        harmonic[i] = min(n, cycle - n)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        spur_dbc = 20 * np.log10(spur / fund)
+        thd_n_dbc = 20 * np.log10(rest / fund)
+    return {
+        "amplitude": 2 * fund,
+        "spur_dbc": spur_dbc,
+        "spur_hz": spur_bin * SAMPLE_RATE / FRAMES,
+        "spur_harmonic": harmonic,
+        "spur_alias": harmonic * inc > FRAMES // 2,
+    }, thd_n_dbc
+
+def sweep_chunk(inc):
+    inc = np.asarray(inc)
+    acc = accumulator(inc, FRAMES)
+    out = {}
+    for ch, model in CHANNELS.items():
+        stats, thd_n = spectrum_stats(model(acc).astype(float), inc)
+        for col, v in stats.items():
+            out[f"{ch}_{col}"] = v
+        out[f"{ch}_thd_n_dbc"] = thd_n
+    return out
+
+def sweep(jobs=None):
+    """Table (dict of column arrays) over every freq_increment value."""
+    inc = np.arange(1 << INC_BITS)
+    chunks = [inc[i:i + CHUNK] for i in range(0, len(inc), CHUNK)]
+    with ProcessPoolExecutor(jobs) as pool:
+        parts = list(pool.map(sweep_chunk, chunks))
+
+    freq = increment_freq(inc)
+    midi = freq_to_midi(freq)
+    with np.errstate(invalid="ignore"):
+        cents = 100 * (midi - np.round(midi))
+    table = {"freq_increment": inc, "freq_hz": freq, "midi": midi, "cents": cents}
+    for col in COLUMNS[4:]:
+        table[col] = np.concatenate([p[col] for p in parts])
+    return table
+
+def model_digest():
+    h = hashlib.sha1()
+    for mod in (chip_model.__file__, __file__):
+        with open(mod, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def load_table(path=CACHE):
+    """Cached sweep(); recomputed when chip_model.py or this file changes."""
+    digest = model_digest()
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            header = f.readline()
+        if header.strip() == f"# sha1={digest}":
+            data = np.genfromtxt(path, delimiter=",", names=True, comments="#", skip_header=1)
+            return {col: data[col] for col in COLUMNS}
+
+    table = sweep()
+    with open(path, "w") as f:
+        f.write(f"# sha1={digest}\n")
+        f.write(",".join(COLUMNS) + "\n")
+        np.savetxt(f, np.column_stack([table[c] for c in COLUMNS]), delimiter=",", fmt="%.6g")
+    return table
+
+def note_table(table):
+    """Per MIDI note: the increment tostep() picks, its tuning error and channel quality."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test"))
+    from audio_util import tostep
+
+    rows = []
+    for note in range(128):
+        step = tostep(note)
+        if step >= 1 << INC_BITS:
+            rows.append((note, step, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan))
+            continue
+        freq = table["freq_hz"][step]
+        cents = 1200 * np.log2(freq / midi_to_freq(note)) if step else np.nan
+        rows.append((note, step, freq, cents,
+                     table["sine_amplitude"][step], table["sine_spur_dbc"][step],
+                     table["triangle_amplitude"][step], table["triangle_spur_dbc"][step]))
+    return rows
+
+def report_steps(table, out_name=None):
+    if out_name:
+        np.savetxt(out_name, np.column_stack([table[c] for c in COLUMNS]), delimiter=",",
+                   fmt="%.6g", header=",".join(COLUMNS), comments="")
+    alias = table["sine_spur_alias"].astype(bool)
+    print(f"{len(table['freq_increment'])} increments, {table['freq_hz'][1]:.4f} Hz resolution")
+    print(f"sine amplitude: {np.nanmin(table['sine_amplitude'][1:]):.1f} .. {np.nanmax(table['sine_amplitude'][1:]):.1f} LSB")
+    if np.any(alias):
+        first = table["freq_increment"][np.argmax(alias)]
+        print(f"sine worst spur is an alias from freq_increment {first} ({table['freq_hz'][first]:.1f} Hz) on, "
+              f"{np.sum(alias)} increments in total")
+
+def report_notes(table):
+    print("note  step   freq_hz    cents  sine_amp sine_spur  tri_amp tri_spur")
+    for note, step, freq, cents, s_amp, s_spur, t_amp, t_spur in note_table(table):
+        print(f"{note:4d} {step:5d} {freq:9.3f} {cents:8.2f} {s_amp:9.2f} {s_spur:9.1f} {t_amp:8.2f} {t_spur:8.1f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("steps", "notes"):
+        sys.exit("usage: tuning_sweep.py steps [out.csv] | notes")
+
+    table = load_table()
+    if sys.argv[1] == "steps":
+        report_steps(table, sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        report_notes(table)
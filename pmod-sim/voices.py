@@ -0,0 +1,231 @@
+# N-voice version of the chip model, and how output quality and cost scale with voices
+# python voices.py study [max_voices] [chords] [jobs]
+# python voices.py check
+#
+# VoiceModel runs N sine/triangle channels (the same bit-exact channels as chip_model.py,
+# alternating sine, triangle, sine, ...) into one PWM. The mixer adds the 7-bit outputs,
+# drops `shift` LSBs and keeps `mixer_bits` bits, wrapping like pwm.v's current_sample
+# register or saturating; the PWM is high for min(duty, pwm_period) of every pwm_period
+# clocks. With two voices, 8 bits and a 256-clock period it is the chip, and check
+# compares it against ChipModel.
+#
+# study plays random chords of N notes (audio_util.tostep) for 2^14 frames, a whole
+# number of accumulator cycles for every increment, under four mixer strategies:
+#   wrap      8-bit mixer, 256-clock PWM, as pwm.v would do it with more inputs
+#   saturate  the same with a saturating mixer
+#   shift     8-bit mixer and 256-clock PWM, LSBs dropped so N full-scale voices fit
+#   wide      mixer and PWM period grown to fit N voices (lower PWM rate)
+# Per strategy and N it reports the PWM rate, the output level (dBFS of the PWM), SNR
+# against the ideal mix (continuous sines and triangles at the same phases, fitted for
+# gain and offset, so CORDIC error, quantization, wrap and clipping all count as noise),
+# how often the mix clips or wraps, and the render cost of the vectorized model.
+
+import sys
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from chip_model import ACC_BITS, SAMPLE_RATE, SAMPLE_PERIOD, PWM_PERIOD, SINE_RESET, CLOCK_HZ, \
+    ChipModel, sine_out, triangle_out, accumulator
+
+VOICE_BITS = 7
+VOICE_MAX = (1 << VOICE_BITS) - 1
+FRAMES = 1 << ACC_BITS
+CHORDS = 64
+CHUNK = 8 # chords per worker task
+NOTE_RANGE = (36, 96) # MIDI notes chords are drawn from, upper end exclusive
+MAX_PWM_PERIOD = SAMPLE_PERIOD # at least one PWM period per frame
+
+WAVEFORMS = {"sine": sine_out, "triangle": triangle_out}
+
+MixerConfig = namedtuple("MixerConfig", ["mixer_bits", "shift", "pwm_period", "saturate"])
+
+def voice_waveforms(voices):
+    return tuple(("sine", "triangle")[k % 2] for k in range(voices))
+
+class VoiceModel:
+    """Duty streams of an N-voice chip out of reset, for a batch of chords at once.
+
+    Voice k plays register k. Each voice has the latency of its chip_model counterpart,
+    and the PWM latches the mix at the start of every period, so the first period of a
+    frame gets the outputs of the frame before.
+    """
+
+    def __init__(self, waveforms=("sine", "triangle"), mixer_bits=8, shift=0, pwm_period=PWM_PERIOD, saturate=False):
+        if SAMPLE_PERIOD % pwm_period:
+            raise ValueError(f"pwm_period must divide the {SAMPLE_PERIOD}-clock frame, got {pwm_period}")
+        self.waveforms = tuple(waveforms)
+        self.mixer_bits = mixer_bits
+        self.shift = shift
+        self.pwm_period = pwm_period
+        self.saturate = saturate
+        self.periods_per_frame = SAMPLE_PERIOD // pwm_period
+
+    @classmethod
+    def from_config(cls, voices, config):
+        return cls(voice_waveforms(voices), *config)
+
+    def outputs(self, inc, frames):
+        """f(A[m]) of every voice for m = 0..frames: shape (chords, voices, frames + 1)."""
+        acc = accumulator(np.asarray(inc), frames + 1)
+        out = np.empty(acc.shape, dtype=np.int32)
+        for k, waveform in enumerate(self.waveforms):
+            out[:, k] = WAVEFORMS[waveform](acc[:, k])
+        return out
+
+    def mix_unclipped(self, outputs):
+        return outputs.sum(axis=-2) >> self.shift
+
+    def mix(self, outputs):
+        """The mixer register for voice outputs (voices on axis -2)."""
+        total = self.mix_unclipped(outputs)
+        top = (1 << self.mixer_bits) - 1
+        return np.minimum(total, top) if self.saturate else total & top
+
+    def limit(self):
+        """Largest mix that reaches the PWM unchanged."""
+        return min((1 << self.mixer_bits) - 1, self.pwm_period)
+
+    def duty(self, inc, frames):
+        """Mixer value latched by each of the first frames frames' PWM periods: (chords, periods)."""
+        out = self.outputs(inc, frames)
+        new = np.empty(out.shape[:-1] + (frames,), dtype=np.int32)
+        old = np.empty_like(new)
+        for k, waveform in enumerate(self.waveforms):
+            if waveform == "sine":
+                # S(A[m]) from phase 9 of frame m, the reset value in frame 0
+                new[:, k] = out[:, k, :-1]
+                new[:, k, 0] = SINE_RESET
+                old[:, k, 0] = SINE_RESET
+                old[:, k, 1:] = new[:, k, :-1]
+            else:
+                # T(A[m + 1]) from phase 9 of frame m, T(A[m]) before it
+                new[:, k] = out[:, k, 1:]
+                old[:, k] = out[:, k, :-1]
+        duty = np.empty(new.shape[:1] + (frames, self.periods_per_frame), dtype=np.int32)
+        duty[:, :, 0] = self.mix(old)
+        duty[:, :, 1:] = self.mix(new)[:, :, None]
+        return duty.reshape(len(duty), -1)
+
+    def high_clocks(self, duty):
+        """Clocks pwm_out is high for in each period (the PWM compares phase < duty)."""
+        return np.minimum(duty, self.pwm_period)
+
+def ideal_outputs(waveforms, inc, frames):
+    """Continuous versions of the voices at the same accumulator phases: (chords, voices, frames)."""
+    acc = accumulator(np.asarray(inc), frames)
+    phase = acc / (1 << ACC_BITS)
+    out = np.empty(acc.shape)
+    for k, waveform in enumerate(waveforms):
+        if waveform == "sine":
+            out[:, k] = VOICE_MAX / 2 * np.sin(2 * np.pi * phase[:, k])
+        else:
+            out[:, k] = VOICE_MAX * (1 - np.abs(2 * phase[:, k] - 1))
+    return out
+
+def snr_db(out, ideal):
+    """SNR of out against ideal per row, after a least-squares gain and offset fit."""
+    ideal = ideal - ideal.mean(axis=1, keepdims=True)
+    out = out - out.mean(axis=1, keepdims=True)
+    power = np.sum(ideal ** 2, axis=1)
+    gain = np.sum(out * ideal, axis=1) / np.where(power > 0, power, 1)
+    noise = np.sum((out - gain[:, None] * ideal) ** 2, axis=1)
+    with np.errstate(divide="ignore"):
+        return 10 * np.log10(gain ** 2 * power / noise)
+
+def study_chunk(voices, config, inc):
+    """Per-chord SNR, level, clip fraction, and the render time of the chunk."""
+    model = VoiceModel.from_config(voices, config)
+    start = time.perf_counter()
+    model.duty(inc, FRAMES)
+    render_s = time.perf_counter() - start
+
+    # one value per frame: the periods after phase 9 all carry the same mix
+    out = model.outputs(inc, FRAMES)[:, :, :FRAMES]
+    level = model.high_clocks(model.mix(out)).astype(float)
+    clipped = model.mix_unclipped(out) > model.limit()
+    ideal = ideal_outputs(model.waveforms, inc, FRAMES).sum(axis=1)
+    ac = level - level.mean(axis=1, keepdims=True)
+    with np.errstate(divide="ignore"):
+        level_dbfs = 20 * np.log10(np.sqrt(np.mean(ac ** 2, axis=1)) / model.pwm_period)
+    return snr_db(level, ideal), level_dbfs, clipped.mean(axis=1), render_s
+
+def strategies(voices):
+    """MixerConfig of each study strategy for N voices."""
+    full = voices * VOICE_MAX
+    wide_bits = min(full.bit_length(), MAX_PWM_PERIOD.bit_length() - 1)
+    return {
+        "wrap": MixerConfig(8, 0, PWM_PERIOD, False),
+        "saturate": MixerConfig(8, 0, PWM_PERIOD, True),
+        "shift": MixerConfig(8, max(0, full.bit_length() - 8), PWM_PERIOD, False),
+        "wide": MixerConfig(wide_bits, max(0, full.bit_length() - wide_bits), 1 << wide_bits, False),
+    }
+
+def random_chords(voices, chords, seed=0):
+    """freq_increments of chords random chords of distinct notes in NOTE_RANGE: (chords, voices)."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test"))
+    from audio_util import tostep
+
+    rng = np.random.default_rng(seed + voices)
+    notes = np.array([rng.choice(np.arange(*NOTE_RANGE), voices, replace=False) for _ in range(chords)])
+    return np.vectorize(tostep)(notes)
+
+def study(max_voices=8, chords=CHORDS, jobs=None):
+    """[(voices, strategy, config, snr, level_dbfs, clip, render_s)] for 1..max_voices voices."""
+    tasks = []
+    for voices in range(1, max_voices + 1):
+        inc = random_chords(voices, chords)
+        for name, config in strategies(voices).items():
+            for i in range(0, chords, CHUNK):
+                tasks.append((voices, name, config, inc[i:i + CHUNK]))
+    with ProcessPoolExecutor(jobs) as pool:
+        parts = list(pool.map(study_chunk, *zip(*[(v, c, inc) for v, _, c, inc in tasks])))
+
+    rows = {}
+    for (voices, name, config, _), (snr, level, clip, render_s) in zip(tasks, parts):
+        row = rows.setdefault((voices, name), [config, [], [], [], 0.0])
+        row[1].append(snr)
+        row[2].append(level)
+        row[3].append(clip)
+        row[4] += render_s
+    return [(voices, name, config, np.concatenate(snr), np.concatenate(level), np.concatenate(clip), render_s)
+            for (voices, name), (config, snr, level, clip, render_s) in rows.items()]
+
+def check():
+    rng = np.random.default_rng(0)
+    frames = 3000
+    for _ in range(20):
+        inc = [int(v) for v in rng.integers(0, 1 << 12, 2)]
+        chip = ChipModel()
+        chip.write(0, inc[0])
+        chip.write(1, inc[1])
+        expected = chip.render(frames)
+        got = VoiceModel().duty([inc], frames)[0]
+        bad = np.nonzero(got != expected)[0]
+        if len(bad):
+            sys.exit(f"VoiceModel differs from ChipModel for increments {inc} at period {bad[0]}: "
+                     f"{got[bad[0]]} vs {expected[bad[0]]}")
+    print("two-voice VoiceModel matches ChipModel")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("study", "check"):
+        sys.exit("usage: voices.py study [max_voices] [chords] [jobs] | check")
+
+    if sys.argv[1] == "check":
+        check()
+    else:
+        max_voices = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+        chords = int(sys.argv[3]) if len(sys.argv) > 3 else CHORDS
+        jobs = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        audio_s = FRAMES / SAMPLE_RATE
+        print(f"{chords} random chords per voice count, {audio_s:.2f} s each")
+        print("voices strategy  bits shift period pwm_khz level_dbfs snr_mean snr_min clip_pct  render_x_rt")
+        for voices, name, config, snr, level, clip, render_s in study(max_voices, chords, jobs):
+            pwm_khz = CLOCK_HZ / config.pwm_period / 1e3
+            speed = chords * audio_s / render_s
+            print(f"{voices:6d} {name:9s} {config.mixer_bits:4d} {config.shift:5d} {config.pwm_period:6d} "
+                  f"{pwm_khz:7.1f} {np.mean(level):10.1f} {np.mean(snr):8.1f} {np.min(snr):7.1f} "
+                  f"{100 * np.mean(clip):8.2f} {speed:12.0f}")
@@ -1,92 +1,54 @@
 import cocotb
-from cocotb.clock import Clock
-from cocotb.triggers import ClockCycles, Edge, Timer
-from audio_util import *
-
-PERIOD_NS = 35
-
-async def write_reg(dut, value, addr, delay=5):
-    # setup phase 1 & MSB
-    dut.ui_in.value = (addr & 0xF) | (1 << 4) | (0 << 5)
-    dut.uio_in.value = value >> 8
-    await ClockCycles(dut.clk, delay)
-
-    # enable, writes MSB
-    dut.ui_in.value = (addr & 0xF) | (1 << 4) | (1 << 5)
-    await ClockCycles(dut.clk, delay)
-
-    # setup LSB
-    dut.uio_in.value = value & 0xFF
-    await ClockCycles(dut.clk, delay)
-
-    # phase 0, writes LSB
-    dut.ui_in.value = (addr & 0xF) | (0 << 4) | (1 << 5)
-    await ClockCycles(dut.clk, delay)
-
-    # disable, writes final value to reg
-    dut.ui_in.value = (addr & 0xF) | (0 << 4) | (0 << 5)
-    await ClockCycles(dut.clk, delay)
-
-    dut.uio_in.value = 0
-    dut.ui_in.value = 0
-
-    return delay * PERIOD_NS * 4 / 1e9
-
-def seconds_to_cycles(seconds):
-    return int(seconds * 1e9 / PERIOD_NS)
-
-async def monitor_edge(sig, data):
-    while True:
-        await sig.value_change
-        value = int(sig.value)
-        data.append((cocotb.utils.get_sim_time('ns'), value))
+from func_coverage import coverage
+from chip_io import monitor_duty, monitor_edge, play_writes, start_chip
+from golden import GoldenRun
+from timing import PERIOD_NS
+from segment_run import tune_writes, tune_clocks
+
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pmod-sim')))
+from duty_stream import write_duty_stream
+
+# what play_a_tune records: "edges" (pwm_edges.log), "duty" (pwm_duty.bin) or "both"
+CAPTURE = os.environ.get("CAPTURE", "edges")
+
+def start_monitors(dut, write_data, duty_data):
+    monitors = []
+    if CAPTURE in ("edges", "both"):
+        monitors.append(cocotb.start_soon(monitor_edge(dut.user_project.pwm_gen.pwm_out, write_data)))
+    if CAPTURE in ("duty", "both"):
+        monitors.append(cocotb.start_soon(monitor_duty(dut.user_project.pwm_gen, duty_data)))
+    return monitors
 
 @cocotb.test()
+@coverage
 async def play_a_tune(dut):
     # sim takes about 0.8s per ms without vcd dumping
-    # 13min for 1s
+    # 13min for 1s, or split it up with segment_run.py
 
     dut._log.info("Start")
+    await start_chip(dut)
 
-    # approx 28835840 Hz
-    clock = Clock(dut.clk, PERIOD_NS, unit="ns")
-    cocotb.start_soon(clock.start())
-
-    # Reset
-    dut._log.info("Reset")
-    dut.ena.value = 1
-    dut.ui_in.value = 0
-    dut.uio_in.value = 0
-    dut.rst_n.value = 0
-    await ClockCycles(dut.clk, 10)
-    dut.rst_n.value = 1
+    golden = GoldenRun(dut)
 
     dut._log.info("Full integration test")
     write_data = []
-    monitor = cocotb.start_soon(monitor_edge(dut.user_project.pwm_gen.pwm_out, write_data))
-
-    await write_reg(dut, tostep(76), 0) # e5 ~659 Hz
-    await write_reg(dut, tostep(52), 1) # e3 ~165 Hz
-
-    for i in range(30):
-        await Timer(0.01, unit="sec")
-        dut._log.info(f"Waited {(i+1) * 0.01}s")
-
-    await write_reg(dut, tostep(72), 0) # c5 ~523 Hz
-    await write_reg(dut, tostep(56), 1) # g#3 ~208 Hz
-
-    for i in range(30):
-        await Timer(0.01, unit="sec")
-        dut._log.info(f"Waited {(i+1) * 0.01}s")
-        
-    await write_reg(dut, tostep(69), 0) # a4 ~440 Hz
-    await write_reg(dut, tostep(57), 1) # a3 ~220 Hz
-
-    for i in range(30):
-        await Timer(0.01, unit="sec")
-        dut._log.info(f"Waited {(i+1) * 0.01}s")
-
-    monitor.kill()
-    with open("pwm_edges.log", "w") as f:
-        for (time_ns, value) in write_data:
-            f.write(f"{time_ns},{value}\n")
\ No newline at end of file
+    duty_data = {"duty": [], "offset_ps": 0, "initial": 0}
+    monitors = start_monitors(dut, write_data, duty_data)
+
+    # the tune from audio_util.TUNE, each write on its exact clock so segment_run.py can
+    # reproduce this run piece by piece
+    await play_writes(dut, tune_writes(), 0, tune_clocks())
+
+    for monitor in monitors:
+        monitor.kill()
+
+    if CAPTURE in ("edges", "both"):
+        with open("pwm_edges.log", "w") as f:
+            for (time_ns, value) in write_data:
+                f.write(f"{time_ns},{value}\n")
+    if CAPTURE in ("duty", "both"):
+        write_duty_stream("pwm_duty.bin", duty_data["duty"], PERIOD_NS * 1000,
+                          duty_data["offset_ps"], duty_data["initial"])
+    golden.finish("audio_test.play_a_tune")
@@ -1,8 +1,13 @@
+import math
+from collections import namedtuple
+
 HALF_STEP_RATIO = pow(2, 1/12)
+SAMPLE_RATE = 28160
+A4_FREQ = 440.0
+A4_MIDI = 69
 
 def calculate_step(freq_hz):
-    sample_rate = 28160
-    return round((freq_hz * (2 ** 14)) / sample_rate)
+    return round((freq_hz * (2 ** 14)) / SAMPLE_RATE)
 
 # MIDI note numbers
 #       -1  0   1   2   3   4   5   6   7   8   9
@@ -19,9 +24,47 @@ def calculate_step(freq_hz):
 # A#    10  22  34  46  58  70  82  94  106 118
 # B     11  23  35  47  59  71  83  95  107 119
 
+def note_freq(note):
+    return A4_FREQ * (HALF_STEP_RATIO ** (note - A4_MIDI))
+
+# step: freq_increment for the note, freq_hz: what the chip actually plays with it,
+# cents: how far that is from equal temperament. freq_increment is 12 bits wide, so
+# notes above 116 do not fit (fits=False); see pmod-sim/tuning_sweep.py for the full
+# per-register-value picture including the CORDIC amplitude and spurs.
+Tuning = namedtuple("Tuning", ["step", "freq_hz", "cents", "fits"])
+
+def _tuning(note):
+    step = calculate_step(note_freq(note))
+    freq_hz = step * SAMPLE_RATE / (2 ** 14)
+    cents = 1200 * math.log2(freq_hz / note_freq(note)) if step else -math.inf
+    return Tuning(step, freq_hz, cents, step < (1 << 12))
+
+NOTE_TUNING = [_tuning(note) for note in range(128)]
+
+def tuning(note):
+    """Tuning of the freq_increment tostep() picks for a MIDI note."""
+    if isinstance(note, int) and 0 <= note < len(NOTE_TUNING):
+        return NOTE_TUNING[note]
+    return _tuning(note)
+
 def tostep(note):
-    A4_FREQ = 440.0
-    A4_MIDI = 69
-    midi_number = note
-    freq = A4_FREQ * (HALF_STEP_RATIO ** (midi_number - A4_MIDI))
-    return calculate_step(freq)
\ No newline at end of file
+    return tuning(note).step
+
+# play_a_tune in audio_test.py, also run in parallel segments by segment_run.py:
+# (start in s, sine note, triangle note), ending at TUNE_END_S
+TUNE = [
+    (0.0, 76, 52), # e5 ~659 Hz, e3 ~165 Hz
+    (0.3, 72, 56), # c5 ~523 Hz, g#3 ~208 Hz
+    (0.6, 69, 57), # a4 ~440 Hz, a3 ~220 Hz
+]
+TUNE_END_S = 0.9
+
+# the integration tests in test.py, each a list of (sine note, triangle note, hold in s)
+# steps: both registers are written back to back (None writes 0, channel off), then the
+# notes hold that long. golden.py generates their golden files from the same steps.
+INTEGRATION_STEPS = {
+    "play_a_tune": [(60, 64, 0.005), (72, None, 0.005)], # c4 ~262 + e4 ~330, then c5 ~523
+    "single_sine_note": [(69, None, 0.003)], # A4 on the sine channel only
+    "single_triangle_note": [(None, 57, 0.003)], # A3 on the triangle channel only
+    "sine_and_triangle_together": [(69, 57, 0.003)],
+}
@@ -0,0 +1,172 @@
+"""Pin-level register writes and output recorders shared by the audio testbenches.
+
+Clocks count rising edges from the first one after reset is released (clock 0):
+
+    await start_chip(dut)
+    await play_writes(dut, [Write(0, 0, tostep(69)), Write(25, 1, tostep(57))], 0, end)
+
+A write_reg with the default delay takes WRITE_CLOCKS clocks. The register_interface FSM
+stores the value (the commit) on clock WRITE_VISIBLE - 1 of the write, and the channels
+add the new freq_increment from the next subsample_phase == APPLY_PHASE edge, in frame
+apply_frames(commit). chip_schedule() turns a write schedule into the closed-form
+ChipSchedule that way, registers_to_schedule() a log of recorded commits.
+
+The monitors run under cocotb.start_soon() until killed. monitor_pin only touches the
+output pins, so it also works on the gate-level netlist.
+"""
+
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+import cocotb
+from cocotb.triggers import Edge, ReadOnly, RisingEdge, Timer
+
+from audio_util import tostep
+from dump_control import dump_from_env
+from timing import PERIOD_NS, seconds_to_cycles, start_clock, wait_cycles
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pmod-sim')))
+from chip_model import ChipSchedule, SAMPLE_PERIOD
+from duty_stream import PWM_PERIOD
+
+WRITE_CLOCKS = 25 # write_reg with delay=5
+# a write whose pins change before clock 0 reaches freq_increment from clock 23: the
+# enable fall is set up for clock 20, goes through the 2-flop sync (21) and the FSM
+# stores the register on clock 22
+WRITE_VISIBLE = 23
+APPLY_PHASE = 8 # the channels add freq_increment on this edge
+
+Write = namedtuple("Write", ["clock", "address", "value"])
+
+def apply_frames(commits):
+    """Frame whose phase-8 edge first adds the increment stored on each commit clock."""
+    return -(-(np.asarray(commits, dtype=np.int64) + 1 - APPLY_PHASE) // SAMPLE_PERIOD)
+
+def chip_schedule(writes):
+    """The ChipSchedule of clock-level writes."""
+    frames = apply_frames([w.clock + WRITE_VISIBLE - 1 for w in writes])
+    return ChipSchedule([(max(0, int(f)), w.address, w.value) for f, w in zip(frames, writes)])
+
+def registers_to_schedule(log):
+    """ChipSchedule of recorded (commit clock, registers_flat) changes."""
+    writes = []
+    flat = 0
+    for clock, new in log:
+        for address in range(2):
+            value = (new >> (16 * address)) & 0xFFFF
+            if value != (flat >> (16 * address)) & 0xFFFF:
+                writes.append((int(apply_frames([clock])[0]), address, value))
+        flat = new
+    return ChipSchedule(writes)
+
+def step_writes(steps):
+    """(writes, end clock) of (sine note, triangle note, hold s) steps: both registers
+    written back to back, then held for hold s. A None note writes 0 (channel off)."""
+    writes, clock = [], 0
+    for sine, triangle, hold_s in steps:
+        for address, note in enumerate((sine, triangle)):
+            writes.append(Write(clock, address, 0 if note is None else tostep(note)))
+            clock += WRITE_CLOCKS
+        clock += seconds_to_cycles(hold_s)
+    return writes, clock
+
+async def write_reg(dut, value, addr, delay=5):
+    # setup phase 1 & MSB
+    dut.ui_in.value = (addr & 0xF) | (1 << 4) | (0 << 5)
+    dut.uio_in.value = value >> 8
+    await wait_cycles(dut.clk, delay)
+
+    # enable, writes MSB
+    dut.ui_in.value = (addr & 0xF) | (1 << 4) | (1 << 5)
+    await wait_cycles(dut.clk, delay)
+
+    # setup LSB
+    dut.uio_in.value = value & 0xFF
+    await wait_cycles(dut.clk, delay)
+
+    # phase 0, writes LSB
+    dut.ui_in.value = (addr & 0xF) | (0 << 4) | (1 << 5)
+    await wait_cycles(dut.clk, delay)
+
+    # disable, writes final value to reg
+    dut.ui_in.value = (addr & 0xF) | (0 << 4) | (0 << 5)
+    await wait_cycles(dut.clk, delay)
+
+    dut.uio_in.value = 0
+    dut.ui_in.value = 0
+
+async def play_writes(dut, writes, next_clock, end):
+    """Front-door writes on their scheduled clocks, then run until clock end.
+
+    Clocks count rising edges, next_clock is the next one to come.
+    """
+    for w in writes:
+        if w.clock > next_clock:
+            await wait_cycles(dut.clk, w.clock - next_clock)
+        dut._log.info(f"Writing register {w.address} = {w.value} at {w.clock * PERIOD_NS / 1e9:.3f}s")
+        await write_reg(dut, w.value, w.address)
+        next_clock = w.clock + WRITE_CLOCKS
+    if end > next_clock:
+        await wait_cycles(dut.clk, end - next_clock)
+
+async def start_chip(dut):
+    """Start the clock and reset the chip; returns right after reset is released."""
+    # approx 28835840 Hz
+    start_clock(dut.clk)
+    dump_from_env(dut)
+
+    # Reset
+    dut._log.info("Reset")
+    dut.ena.value = 1
+    dut.ui_in.value = 0
+    dut.uio_in.value = 0
+    dut.rst_n.value = 0
+    await wait_cycles(dut.clk, 10)
+    dut.rst_n.value = 1
+
+def clock_zero_ps():
+    """Sim time of clock 0, called right after start_chip()."""
+    return round(cocotb.utils.get_sim_time('ps')) + PERIOD_NS * 1000
+
+async def monitor_edge(sig, data):
+    while True:
+        await Edge(sig)
+        value = int(sig.value)
+        data.append((cocotb.utils.get_sim_time('ns'), value))
+
+async def monitor_pin(bus, bit, data):
+    """Like monitor_edge for one bit of an output bus (works on the gate-level netlist)."""
+    last = 0
+    while True:
+        await Edge(bus)
+        value = (int(bus.value) >> bit) & 1
+        if value != last:
+            data.append((cocotb.utils.get_sim_time('ns'), value))
+            last = value
+
+async def monitor_commits(regs, offset_ps, log):
+    """Record (clock, registers_flat) on every register change (the edge the FSM stores it on)."""
+    while True:
+        await Edge(regs.registers_flat)
+        clock = round((cocotb.utils.get_sim_time('ps') - offset_ps) / (PERIOD_NS * 1000))
+        log.append((clock, int(regs.registers_flat.value)))
+
+async def monitor_duty(pwm, data):
+    """Record current_sample once per PWM period, right after it is latched."""
+    # align to a latch edge: the counter reads 1 right after subsample_phase[7:0] == 0
+    while True:
+        await RisingEdge(pwm.clk)
+        await ReadOnly()
+        if (int(pwm.subsample_phase.value) & 0xFF) == 1:
+            break
+        data["initial"] = int(pwm.current_sample.value)
+
+    data["offset_ps"] = round(cocotb.utils.get_sim_time('ps'))
+    while True:
+        data["duty"].append(int(pwm.current_sample.value))
+        # one wakeup per period instead of one per clock
+        await Timer(PWM_PERIOD * PERIOD_NS, "ns")
+        await ReadOnly()
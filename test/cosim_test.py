@@ -0,0 +1,74 @@
+import cocotb
+from cocotb.triggers import RisingEdge
+from func_coverage import coverage
+from backdoor import Backdoor, uses_backdoor
+from chip_io import monitor_duty, play_writes, start_chip
+from timing import PERIOD_NS
+from segment_run import tune_writes, tune_clocks, cosim_windows, seam_state, model_duty, captured_periods
+
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pmod-sim')))
+from duty_stream import write_duty_stream, write_edge_log, duty_to_edges, DutyStream, PWM_PERIOD
+from chip_model import PERIODS_PER_FRAME
+
+# make AUDIO=yes MODULE=cosim_test: play_a_tune with RTL only from reset and for
+# COSIM_WINDOW_MS around each burst of writes, checked against pmod-sim/chip_model.py;
+# the model fills in the rest. CAPTURE as for audio_test.py
+CAPTURE = os.environ.get("CAPTURE", "edges")
+COSIM_WINDOW_MS = float(os.environ.get("COSIM_WINDOW_MS", "2"))
+
+@cocotb.test()
+@coverage
+@uses_backdoor
+async def play_cosim(dut):
+    """play_a_tune with RTL only where registers change, the model everywhere else.
+
+    Each RTL window must match the model period for period; the captures are then the
+    model's duty stream, i.e. what a full RTL run records.
+    """
+    writes = tune_writes()
+    end = tune_clocks()
+    windows = cosim_windows(writes, end, round(COSIM_WINDOW_MS * 1e6 / PERIOD_NS))
+    periods = captured_periods(end)
+    expected = model_duty(writes, -(-periods // PERIODS_PER_FRAME))[:periods]
+
+    await start_chip(dut)
+    backdoor = Backdoor(dut)
+    offset_ps = None
+    rtl_clocks = 0
+    for start, stop in windows:
+        duty_data = {"duty": [], "offset_ps": 0, "initial": 0}
+        if start:
+            # jump the chip ahead to the window (sim time itself is not skipped)
+            state = seam_state(start, writes)
+            await backdoor.load(
+                sine_acc=state["sine_acc"], triangle_acc=state["triangle_acc"], phase=state["phase"],
+                sine_out=state["sine_out"], triangle_out=state["triangle_out"], pwm_sample=state["pwm_sample"],
+                registers=state["registers"])
+            monitor = cocotb.start_soon(monitor_duty(dut.user_project.pwm_gen, duty_data))
+            await RisingEdge(dut.clk)
+            next_clock = start + 1
+        else:
+            monitor = cocotb.start_soon(monitor_duty(dut.user_project.pwm_gen, duty_data))
+            next_clock = 0
+        dut._log.info(f"RTL window {start * PERIOD_NS / 1e9:.4f}s .. {stop * PERIOD_NS / 1e9:.4f}s")
+        await play_writes(dut, [w for w in writes if start <= w.clock < stop], next_clock, stop)
+        monitor.kill()
+        rtl_clocks += stop - start
+
+        first = start // PWM_PERIOD
+        if offset_ps is None:
+            offset_ps = duty_data["offset_ps"]
+        got = duty_data["duty"][:periods - first]
+        for i, duty in enumerate(got):
+            assert duty == expected[first + i], \
+                f"RTL and model disagree at period {first + i} ({(first + i) * PWM_PERIOD * PERIOD_NS / 1e9:.6f}s): " \
+                f"RTL {duty}, model {expected[first + i]}"
+
+    dut._log.info(f"Simulated {rtl_clocks} of {end} clocks in RTL ({100 * rtl_clocks / end:.1f}%)")
+    stream = DutyStream(expected, PERIOD_NS * 1000, offset_ps, PWM_PERIOD, 0)
+    if CAPTURE in ("edges", "both"):
+        write_edge_log("pwm_edges.log", *duty_to_edges(stream))
+    if CAPTURE in ("duty", "both"):
+        write_duty_stream("pwm_duty.bin", stream.duty, stream.clk_period_ps, stream.offset_ps)
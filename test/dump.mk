@@ -0,0 +1,15 @@
+# Waveform dump options shared by the testbenches, see dump_control.vh
+#   DUMP=ctrl  dump nothing until a test starts dumping through dump_control.py
+#   FST=yes    write tb.fst instead of tb.vcd
+
+DUMP_MK_DIR := $(abspath $(dir $(lastword $(MAKEFILE_LIST))))
+COMPILE_ARGS += -I$(DUMP_MK_DIR)
+
+ifeq ($(DUMP),ctrl)
+PLUSARGS += +dump_ctrl
+endif
+
+ifeq ($(FST),yes)
+# vvp only takes -fst after the design file, where cocotb puts PLUSARGS
+PLUSARGS += -fst +fst
+endif
@@ -0,0 +1,85 @@
+"""Control waveform dumping from cocotb tests (see dump_control.vh).
+
+    dump = DumpControl(dut)
+    dump.start("sine", "pwm")   # first start picks the scopes
+    ...
+    dump.stop()
+    await dump.window(2e6, 2.1e6) # dump sim time 2 ms .. 2.1 ms
+
+Run with `make DUMP=ctrl` so nothing is dumped until a test starts it (AUDIO_TEST runs
+always work this way). Without it the whole design is dumped from t=0 and only
+stop()/start() windows apply. DUMP_WINDOWS="1.5-2,7-7.2" (ms from the start of the test)
+dumps just those windows for any test that calls dump_from_env(), so every test of a
+module that runs several gets its own.
+"""
+
+import os
+
+import cocotb
+from cocotb.triggers import Timer
+from cocotb.utils import get_sim_time
+
+# bit positions of dump_scope, matching dump_scopes in each tb.v
+BLOCK_SCOPES = {"io": 0, "all": 1}
+CHIP_SCOPES = {"io": 0, "all": 1, "regs": 2, "counter": 3, "sine": 4, "triangle": 5, "pwm": 6}
+
+class DumpControl:
+    def __init__(self, dut):
+        self.dut = dut
+        self.scopes = CHIP_SCOPES if hasattr(dut, "user_project") else BLOCK_SCOPES
+
+    def _request(self, on, mask=None):
+        if mask is not None:
+            self.dut.dump_scope.value = mask
+        self.dut.dump_on.value = int(on)
+        self.dut.dump_req.value = 1 - int(self.dut.dump_req.value)
+
+    def start(self, *scopes):
+        """Start (or resume) dumping. Scopes only count on the first start of a run."""
+        scopes = scopes or ("all",)
+        unknown = [s for s in scopes if s not in self.scopes]
+        if unknown:
+            raise ValueError(f"unknown dump scopes {unknown}, expected some of {list(self.scopes)}")
+        self._request(True, sum(1 << self.scopes[s] for s in scopes))
+
+    def stop(self):
+        self._request(False)
+
+    async def window(self, start_ns, stop_ns, *scopes):
+        """Dump from sim time start_ns to stop_ns; start it with cocotb.start_soon().
+
+        A window that is already over is skipped.
+        """
+        now = get_sim_time("ns")
+        if stop_ns <= now:
+            return
+        if start_ns > now:
+            await Timer(start_ns - now, "ns")
+        self.start(*scopes)
+        await Timer(stop_ns - max(start_ns, now), "ns")
+        self.stop()
+
+def parse_windows(spec):
+    """"1.5-2,7-7.2" (ms) -> [(1.5e6, 2e6), (7e6, 7.2e6)] in ns."""
+    windows = []
+    for part in filter(None, spec.split(",")):
+        start, stop = part.split("-")
+        windows.append((float(start) * 1e6, float(stop) * 1e6))
+    return windows
+
+def dump_from_env(dut):
+    """Dump the DUMP_WINDOWS windows (scopes from DUMP_SCOPES, default all), if any."""
+    windows = parse_windows(os.environ.get("DUMP_WINDOWS", ""))
+    if not windows:
+        return None
+    scopes = tuple(filter(None, os.environ.get("DUMP_SCOPES", "").split(",")))
+
+    dump = DumpControl(dut)
+    t0 = get_sim_time("ns")
+
+    async def run():
+        dump.stop() # when everything is being dumped from t=0, only keep the windows
+        for start_ns, stop_ns in sorted(windows):
+            await dump.window(t0 + start_ns, t0 + stop_ns, *scopes)
+
+    return cocotb.start_soon(run())
@@ -0,0 +1,41 @@
+// Waveform dump control shared by the testbenches, driven from dump_control.py.
+//
+// By default everything under tb is dumped to tb.vcd from t=0, as before. With
+// +dump_ctrl (make DUMP=ctrl, and always for AUDIO_TEST) nothing is dumped until a test
+// starts dumping, which picks the scopes from dump_scope (see dump_scopes in tb.v).
+// After that dump_on opens and closes dump windows. +fst (make FST=yes) names the
+// file tb.fst, for vvp -fst.
+//
+// The test sets dump_scope and dump_on, then toggles dump_req to apply them.
+
+  reg [7:0] dump_scope = 0;
+  reg dump_on = 0;
+  reg dump_req = 0;
+  reg dump_started;
+
+  initial begin
+    if ($test$plusargs("fst"))
+      $dumpfile("tb.fst");
+    else
+      $dumpfile("tb.vcd");
+`ifdef AUDIO_TEST
+    dump_started = 0; // full-length audio runs only dump what a test asks for
+`else
+    dump_started = !$test$plusargs("dump_ctrl");
+`endif
+    if (dump_started)
+      $dumpvars(0, tb);
+  end
+
+  always @(dump_req) begin
+    if (!dump_started && dump_on) begin
+      // $dumpvars can only be used once per run, so the first start fixes the scopes
+      dump_started = 1;
+      dump_scopes;
+    end else if (dump_started) begin
+      if (dump_on)
+        $dumpon;
+      else
+        $dumpoff;
+    end
+  end
@@ -0,0 +1,154 @@
+"""Functional coverage from the sim-only counters in func_coverage.v.
+
+Decorate a test to record what it hit:
+
+    @cocotb.test()
+    @coverage
+    async def my_test(dut): ...
+
+The counters are read once before and once after the test (no per-cycle sampling) and
+the difference is written to func_coverage_<module>.json in the sim directory.
+FUNC_COVERAGE_FILE overrides the name, e.g. to keep parallel runs apart. Gate-level
+runs have no counters and record nothing.
+
+Merge any number of those files and print the report:
+
+    python func_coverage.py func_coverage_test.json tb_*/func_coverage_*.json [-o merged.json]
+"""
+
+import functools
+import json
+import os
+import sys
+
+# bin labels per coverpoint, in the bin order of func_coverage.v
+COVERPOINTS = {
+    "cov_sine": {
+        "quadrant": ["Q1", "Q2", "Q3", "Q4"],
+        "rotation": [f"iter{i} {d}" for i in range(8) for d in ("+", "-")],
+        "level": [f"{16 * i}-{16 * i + 15}" for i in range(8)],
+    },
+    "cov_triangle": {
+        "direction": ["up", "down"],
+        "turns.pairs": ["up->up", "up->down", "down->up", "down->down"],
+    },
+    "cov_pwm": {
+        "duty": [f"{32 * i}-{32 * i + 31}" for i in range(8)],
+        "extremes": ["0", "1-253", "254"],
+    },
+    "cov_regs": {
+        "states": ["idle", "msb", "lsb", "error"],
+        "transitions.pairs": [f"{a}->{b}" for a in ("idle", "msb", "lsb", "error")
+                                          for b in ("idle", "msb", "lsb", "error")],
+        "writes": ["in range", "out of range"],
+    },
+}
+
+# state pairs the register FSM cannot make, left out of the holes list
+UNREACHABLE = {
+    ("cov_regs", "transitions.pairs"): {"idle->lsb", "msb->error", "lsb->msb", "error->msb", "error->lsb"},
+}
+
+def _handle(dut, path):
+    h = dut
+    for part in path.split("."):
+        h = getattr(h, part)
+    return h
+
+def _read_counts(counts):
+    try:
+        flat = int(counts.value)
+    except ValueError: # x/z before the counters are initialized
+        flat = 0
+    return [(flat >> (32 * i)) & 0xFFFFFFFF for i in range(len(counts) // 32)]
+
+def snapshot(dut):
+    """{group: {coverpoint: [count per bin]}} for every coverage instance in this tb."""
+    snap = {}
+    for group, points in COVERPOINTS.items():
+        if not hasattr(dut, group):
+            continue
+        snap[group] = {point: _read_counts(_handle(dut, f"{group}.{point}.counts")) for point in points}
+    return snap
+
+def _diff(after, before):
+    return {g: {p: [a - b for a, b in zip(c, before.get(g, {}).get(p, [0] * len(c)))]
+                for p, c in pts.items()} for g, pts in after.items()}
+
+_started = set() # coverage files this sim run has already written to
+
+def _record(module, test, hits):
+    path = os.environ.get("FUNC_COVERAGE_FILE", f"func_coverage_{module}.json")
+    data = {"tests": {}}
+    if path in _started and os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+    _started.add(path)
+    data["tests"][f"{module}.{test}"] = hits
+    with open(path, "w") as f:
+        json.dump(data, f, indent=1)
+
+def coverage(test):
+    """Record the coverage a cocotb test hits (put it below @cocotb.test())."""
+    @functools.wraps(test)
+    async def wrapper(dut, *args, **kwargs):
+        before = snapshot(dut)
+        try:
+            await test(dut, *args, **kwargs)
+        finally:
+            if before:
+                _record(test.__module__, test.__name__, _diff(snapshot(dut), before))
+    return wrapper
+
+# ---- merge and report ----
+
+def merge(paths):
+    """Sum per-test hits from coverage files into {group: {point: [counts]}}, plus who hit what."""
+    total = {}
+    tests = {}
+    for path in paths:
+        with open(path) as f:
+            for test, hits in json.load(f)["tests"].items():
+                tests[f"{test} ({path})"] = hits
+                for group, points in hits.items():
+                    for point, counts in points.items():
+                        acc = total.setdefault(group, {}).setdefault(point, [0] * len(counts))
+                        for i, c in enumerate(counts):
+                            acc[i] += c
+    return total, tests
+
+def report(total, tests):
+    lines = []
+    covered = bins = 0
+    for group, points in COVERPOINTS.items():
+        if group not in total:
+            lines.append(f"{group}: not instantiated in any run")
+            continue
+        for point, labels in points.items():
+            counts = total[group][point]
+            skip = UNREACHABLE.get((group, point), set())
+            reachable = [(l, c) for l, c in zip(labels, counts) if l not in skip]
+            hit = sum(1 for _, c in reachable if c)
+            covered += hit
+            bins += len(reachable)
+            holes = [l for l, c in reachable if not c]
+            lines.append(f"{group}.{point}: {hit}/{len(reachable)} bins"
+                         + (f", missing: {', '.join(holes)}" if holes else ""))
+    lines.append(f"total: {covered}/{bins} bins ({100 * covered / max(bins, 1):.1f}%) over {len(tests)} tests")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    out = None
+    if "-o" in args:
+        i = args.index("-o")
+        out = args[i + 1]
+        del args[i:i + 2]
+    if not args:
+        sys.exit("usage: func_coverage.py <func_coverage_*.json> ... [-o merged.json]")
+
+    total, tests = merge(args)
+    print(report(total, tests))
+    if out:
+        with open(out, "w") as f:
+            json.dump({"tests": tests, "total": total}, f, indent=1)
@@ -0,0 +1,123 @@
+// Sim-only functional coverage counters, read from Python by func_coverage.py.
+//
+// Each coverpoint is a cov_bins instance: a 32-bit hit counter per bin, bumped on the
+// clock edge when sample is high, and exposed as one flat vector so a test can read
+// all of them with a single access at the end. Counters are never reset, so totals
+// accumulate over every test of a sim run; func_coverage.py records per-test deltas.
+//
+// The <block>_coverage wrappers are instantiated in the testbenches (RTL only) with
+// hierarchical references into the design. Bin order must match COVERPOINTS in
+// func_coverage.py.
+
+`default_nettype none
+
+module cov_bins #(
+    parameter BINS = 2,
+    parameter SEL_BITS = 1
+) (
+    input wire                clk,
+    input wire                sample,
+    input wire [SEL_BITS-1:0] bin
+);
+    reg [31:0] count [0:BINS-1];
+    wire [BINS*32-1:0] counts;
+
+    integer i;
+    initial begin
+        for (i = 0; i < BINS; i = i + 1)
+            count[i] = 32'd0;
+    end
+
+    always @(posedge clk) begin
+        if (sample && bin < BINS)
+            count[bin] <= count[bin] + 32'd1;
+    end
+
+    genvar g;
+    generate
+        for (g = 0; g < BINS; g = g + 1) begin : flat
+            assign counts[g*32 +: 32] = count[g];
+        end
+    endgenerate
+endmodule
+
+// {previous, current} pairs of a value over consecutive samples
+module cov_transitions #(
+    parameter SEL_BITS = 1
+) (
+    input wire                clk,
+    input wire                sample,
+    input wire [SEL_BITS-1:0] value
+);
+    reg [SEL_BITS-1:0] prev;
+    reg valid = 1'b0;
+
+    cov_bins #(1 << (2 * SEL_BITS), 2 * SEL_BITS) pairs (clk, sample && valid, {prev, value});
+
+    always @(posedge clk) begin
+        if (sample) begin
+            prev <= value;
+            valid <= 1'b1;
+        end
+    end
+endmodule
+
+module sine_coverage (
+    input wire        clk,
+    input wire        rst_n,
+    input wire [9:0]  subsample_phase,
+    input wire [13:0] accumulator,
+    input wire [7:0]  t,
+    input wire [6:0]  out
+);
+    // accumulator quadrant when the CORDIC loads t
+    cov_bins #(4, 2) quadrant (clk, rst_n && subsample_phase == 10'd1023, accumulator[13:12]);
+    // rotation direction of each CORDIC iteration: {iteration, t[7]}
+    cov_bins #(16, 4) rotation (clk, rst_n && subsample_phase < 10'd8, {subsample_phase[2:0], t[7]});
+    // output level in 8 bands, once per new output
+    cov_bins #(8, 3) level (clk, rst_n && subsample_phase == 10'd9, out[6:4]);
+endmodule
+
+module triangle_coverage (
+    input wire        clk,
+    input wire        rst_n,
+    input wire [9:0]  subsample_phase,
+    input wire [13:0] accumulator
+);
+    // ramp direction (acc[13]: 0 up, 1 down) at each accumulator step
+    cov_bins #(2, 1) direction (clk, rst_n && subsample_phase == 10'd8, accumulator[13]);
+    // direction at consecutive steps, 01/10 are the turnarounds at the peak and trough
+    cov_transitions #(1) turns (clk, rst_n && subsample_phase == 10'd8, accumulator[13]);
+endmodule
+
+module pwm_coverage (
+    input wire       clk,
+    input wire       rst_n,
+    input wire [7:0] subsample_phase,
+    input wire [6:0] bitstream_ch1,
+    input wire [6:0] bitstream_ch2
+);
+    wire [7:0] sample = bitstream_ch1 + bitstream_ch2;
+
+    // latched duty in 8 bands
+    cov_bins #(8, 3) duty (clk, rst_n && subsample_phase == 8'd0, sample[7:5]);
+    // latched duty extremes: 0, in between, 254
+    cov_bins #(3, 2) extremes (clk, rst_n && subsample_phase == 8'd0,
+                                sample == 8'd0 ? 2'd0 : sample == 8'd254 ? 2'd2 : 2'd1);
+endmodule
+
+module regs_coverage (
+    input wire       clk,
+    input wire       rst_n,
+    input wire [1:0] state,
+    input wire       enable_sync,
+    input wire       enable_prev,
+    input wire [3:0] address
+);
+    // FSM state occupancy (3 is the error state)
+    cov_bins #(4, 2) states (clk, rst_n, state);
+    // FSM state on consecutive clocks, including the error entries 0->3 and 2->3
+    cov_transitions #(2) transitions (clk, rst_n, state);
+    // completed writes (state 2, enable falling): to a register, or ignored out of range
+    cov_bins #(2, 1) writes (clk, rst_n && state == 2'd2 && !enable_sync && enable_prev, address >= 4'd2);
+endmodule
@@ -0,0 +1,199 @@
+"""Gate-level regression that fits a wall-time budget: short integration cases, GL vs RTL.
+
+    python gl_regress.py [budget_s] [out_dir]
+
+Each case in CASES is a few frames of register writes (regress_case in regress_test.py).
+Every case runs on RTL first, which is cheap, and the gate-level runs are then planned
+against the budget (default GL_BUDGET_S): cases are taken in CASES order, and one that
+does not fit is shortened by halving its frames down to MIN_FRAMES, or left out. The
+GL cost per clock comes from the previous report in out_dir, or DEFAULT_GL_RATIO times
+this run's RTL cost before there is one.
+
+Both runs record the pwm pin only and turn it into a per-period duty stream, so the
+comparison is period by period rather than edge by edge and ignores the gate delays.
+The report (gl_regress.json in out_dir) lists per-case times and GL/RTL speed ratios;
+the exit status is 1 if any case differs. Needs gate_level_netlist.v, see README.md.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+import numpy as np
+
+from audio_util import tostep
+from chip_io import Write, WRITE_CLOCKS
+from segment_run import TEST_DIR
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pmod-sim')))
+from chip_model import SAMPLE_PERIOD
+from duty_stream import read_duty_stream
+
+GL_BUDGET_S = 600
+MIN_FRAMES = 2
+DEFAULT_GL_RATIO = 50 # GL wall time per RTL wall time until a report has measured it
+SIM_BUILD = {"rtl": "sim_build/regress_rtl", "gl": "sim_build/regress_gl"}
+
+# writes: (fraction of the case length, address, value); writes at the same point go
+# back to back
+Case = namedtuple("Case", ["name", "frames", "writes"])
+
+# in priority order: the first cases are the ones kept when the budget is tight
+CASES = [
+    Case("both_channels", 8, [(0, 0, tostep(69)), (0, 1, tostep(57))]),
+    Case("note_change", 16, [(0, 0, tostep(76)), (0, 1, tostep(52)), (0.5, 0, tostep(72)), (0.5, 1, tostep(56))]),
+    Case("sine_only", 8, [(0, 0, tostep(69))]),
+    Case("triangle_only", 8, [(0, 1, tostep(57))]),
+    Case("idle_after_reset", 4, []),
+    Case("max_increment", 8, [(0, 0, 0xFFF), (0, 1, 0xFFF)]),
+    Case("wide_values", 8, [(0, 0, 0xFFFF), (0, 1, 0xF000 | tostep(57))]),
+    Case("out_of_range_address", 8, [(0, 0, tostep(60)), (0.25, 2, 0x1234), (0.25, 15, 0xABCD)]),
+    Case("silence", 8, [(0, 0, tostep(69)), (0, 1, tostep(57)), (0.5, 0, 0), (0.5, 1, 0)]),
+]
+
+def case_writes(case, frames):
+    """The case's writes as clock-level Writes for a run of frames frames."""
+    writes = []
+    next_clock = 0
+    for at, address, value in case.writes:
+        clock = max(next_clock, int(at * frames) * SAMPLE_PERIOD)
+        writes.append(Write(clock, address, value))
+        next_clock = clock + WRITE_CLOCKS
+    return writes
+
+def case_clocks(case, frames):
+    writes = case_writes(case, frames)
+    return max(frames * SAMPLE_PERIOD, writes[-1].clock + WRITE_CLOCKS if writes else 0)
+
+def _results_time(path):
+    """Wall time cocotb recorded for regress_case (without make and simulator startup)."""
+    for tc in ET.parse(path).iter("testcase"):
+        if tc.get("name") == "regress_case":
+            if tc.find("failure") is not None or tc.find("error") is not None:
+                return None
+            return float(tc.get("time"))
+    return None
+
+def build(kind):
+    gates = ["GATES=yes"] if kind == "gl" else []
+    start = time.perf_counter()
+    subprocess.run(["make", "-B", "AUDIO=yes", *gates, f"SIM_BUILD={SIM_BUILD[kind]}",
+                    f"{SIM_BUILD[kind]}/sim.vvp"], cwd=TEST_DIR, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def run_case(kind, case, frames, out_dir):
+    """Run one case; returns (duty array, cocotb wall time in s)."""
+    case_dir = os.path.join(out_dir, kind, case.name)
+    os.makedirs(case_dir, exist_ok=True)
+    spec = {
+        "name": case.name,
+        "clocks": case_clocks(case, frames),
+        "writes": [list(w) for w in case_writes(case, frames)],
+        "out": os.path.join(case_dir, "pwm_duty.bin"),
+    }
+    path = os.path.join(case_dir, "case.json")
+    with open(path, "w") as f:
+        json.dump(spec, f, indent=1)
+    gates = ["GATES=yes"] if kind == "gl" else []
+    results = os.path.join(case_dir, "results.xml")
+    env = dict(os.environ, REGRESS_CASE=path, FUNC_COVERAGE_FILE=os.path.join(case_dir, "func_coverage.json"))
+    with open(os.path.join(case_dir, "sim.log"), "w") as log:
+        subprocess.run(["make", "AUDIO=yes", "MODULE=regress_test", *gates, f"SIM_BUILD={SIM_BUILD[kind]}", f"COCOTB_RESULTS_FILE={results}"],
+                       cwd=TEST_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    wall = _results_time(results) if os.path.exists(results) else None
+    if wall is None or not os.path.exists(spec["out"]):
+        raise RuntimeError(f"{kind} run of {case.name} failed, see {case_dir}/sim.log")
+    return read_duty_stream(spec["out"]).duty, wall
+
+def first_mismatch(gl, rtl):
+    """First period where the streams differ (a length difference counts), or None."""
+    n = min(len(gl), len(rtl))
+    bad = np.nonzero(gl[:n] != rtl[:n])[0]
+    if len(bad):
+        return int(bad[0])
+    return n if len(gl) != len(rtl) else None
+
+def plan(cases, gl_s_per_clock, budget_s):
+    """[(case, frames)] that fit the budget, and the names of the cases left out."""
+    chosen, dropped = [], []
+    left = budget_s
+    for case in cases:
+        frames = case.frames
+        while frames > MIN_FRAMES and case_clocks(case, frames) * gl_s_per_clock > left:
+            frames //= 2
+        cost = case_clocks(case, frames) * gl_s_per_clock
+        if cost > left:
+            dropped.append(case.name)
+            continue
+        chosen.append((case, frames))
+        left -= cost
+    return chosen, dropped
+
+def previous_gl_cost(report_path):
+    if not os.path.exists(report_path):
+        return None
+    with open(report_path) as f:
+        return json.load(f).get("gl_s_per_clock")
+
+def gl_regress(budget_s=GL_BUDGET_S, out_dir="gl_regress"):
+    out_dir = os.path.abspath(out_dir)
+    report_path = os.path.join(out_dir, "gl_regress.json")
+    if not os.path.exists(os.path.join(TEST_DIR, "gate_level_netlist.v")):
+        sys.exit("gate_level_netlist.v not found, see README.md")
+
+    build("rtl")
+    rtl = {}
+    for case in CASES:
+        rtl[case.name] = run_case("rtl", case, case.frames, out_dir)
+    rtl_clocks = sum(case_clocks(case, case.frames) for case in CASES)
+    rtl_s_per_clock = sum(wall for _, wall in rtl.values()) / rtl_clocks
+
+    gl_s_per_clock = previous_gl_cost(report_path) or rtl_s_per_clock * DEFAULT_GL_RATIO
+    chosen, dropped = plan(CASES, gl_s_per_clock, budget_s)
+    print(f"planned {len(chosen)} of {len(CASES)} cases at {gl_s_per_clock * 1e3:.2f} ms per GL clock")
+
+    build_s = build("gl")
+    rows = []
+    failed = False
+    for case, frames in chosen:
+        if frames != case.frames:
+            # a shortened variant needs its own RTL reference
+            rtl[case.name] = run_case("rtl", case, frames, out_dir)
+        rtl_duty, rtl_s = rtl[case.name]
+        gl_duty, gl_s = run_case("gl", case, frames, out_dir)
+        mismatch = first_mismatch(gl_duty, rtl_duty)
+        failed |= mismatch is not None
+        rows.append({"case": case.name, "frames": frames, "periods": len(gl_duty), "rtl_s": rtl_s,
+                     "gl_s": gl_s, "ratio": gl_s / rtl_s, "mismatch": mismatch})
+        status = "ok" if mismatch is None else f"DIFFERS from period {mismatch}"
+        print(f"{case.name:22s} {frames:3d} frames  RTL {rtl_s:7.2f} s  GL {gl_s:8.2f} s  "
+              f"x{gl_s / rtl_s:6.1f}  {status}")
+
+    gl_s = sum(r["gl_s"] for r in rows)
+    report = {
+        "budget_s": budget_s,
+        "gl_build_s": build_s,
+        "gl_s": gl_s,
+        "rtl_s_per_clock": rtl_s_per_clock,
+        "gl_s_per_clock": gl_s / sum(case_clocks(c, f) for c, f in chosen) if chosen else gl_s_per_clock,
+        "cases": rows,
+        "dropped": dropped,
+    }
+    if rows:
+        report["ratio"] = gl_s / sum(r["rtl_s"] for r in rows)
+        print(f"GL {gl_s:.1f} s of {budget_s} s budget (+{build_s:.1f} s build), "
+              f"GL/RTL x{report['ratio']:.1f} overall")
+    if dropped:
+        print(f"left out for the budget: {', '.join(dropped)}")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=1)
+    return not failed
+
+if __name__ == "__main__":
+    budget_s = float(sys.argv[1]) if len(sys.argv) > 1 else GL_BUDGET_S
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else "gl_regress"
+    sys.exit(0 if gl_regress(budget_s, out_dir) else 1)
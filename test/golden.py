@@ -0,0 +1,221 @@
+"""Golden fingerprints of the integration tests' PWM output, for quick audio regression checks.
+
+    python golden.py generate [name ...]
+    python golden.py check golden/test.play_a_tune.json pwm_duty.bin
+    python golden.py show golden/audio_test.play_a_tune.json
+
+An integration test records the duty of every PWM period from clock 0 and compares a
+fingerprint of it against test/golden/<module>.<test>.json:
+
+    golden = GoldenRun(dut)          # right after reset is released
+    ...
+    golden.finish("test.play_a_tune")
+
+A fingerprint cuts the stream into SEGMENT_PERIODS-period segments. For each one it keeps
+a rolling hash (the hash of the previous segment's hash plus this segment, so equal
+hashes mean equal streams up to there) and the segment's min, max and mean duty. The
+first differing hash names the first divergent segment. To name the exact period,
+RTL runs also log every register commit and rebuild the output from them with the
+closed-form ChipSchedule. If that reference reproduces the golden hashes up to and
+including the divergent segment, the first period where the run differs from it is the
+first divergent period.
+
+The tests' writes are deterministic, so the golden files are not recorded from a run:
+`generate` builds each one with the same ChipSchedule from the writes the test plays
+(audio_util.INTEGRATION_STEPS and TUNE). GOLDEN=check (default) compares and fails on a missing golden file,
+GOLDEN=update rewrites it from the run, GOLDEN=off skips the whole thing. Gate-level runs
+record the duty from the pwm pin (edges_to_duty), so they check against the same files.
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+import cocotb
+
+from audio_util import INTEGRATION_STEPS
+from chip_io import chip_schedule, clock_zero_ps, monitor_commits, monitor_duty, monitor_pin, \
+    registers_to_schedule, step_writes
+from segment_run import tune_clocks, tune_writes
+from timing import PERIOD_NS
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pmod-sim')))
+from duty_stream import PWM_PERIOD, edges_to_duty, load_capture
+
+GOLDEN = os.environ.get("GOLDEN", "check")
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+SEGMENT_PERIODS = 256
+HASH_BYTES = 8
+GATES = os.environ.get("GATES") == "yes"
+
+class GoldenMismatch(AssertionError):
+    pass
+
+def fingerprint(duty, segment_periods=SEGMENT_PERIODS):
+    """Rolling hash and min/max/mean of each segment of a duty stream."""
+    data = bytes(bytearray(int(d) for d in duty))
+    digest = b""
+    segments = []
+    for start in range(0, len(data), segment_periods):
+        seg = data[start:start + segment_periods]
+        digest = hashlib.blake2b(digest + seg, digest_size=HASH_BYTES).digest()
+        segments.append([digest.hex(), min(seg), max(seg), round(sum(seg) / len(seg), 2)])
+    return {"periods": len(data), "segment_periods": segment_periods,
+            "hash": digest.hex(), "segments": segments}
+
+def first_divergent_segment(got, golden):
+    """Index of the first segment whose rolling hash differs, or None if the streams match."""
+    for k, (a, b) in enumerate(zip(got["segments"], golden["segments"])):
+        if a[0] != b[0]:
+            return k
+    if got["periods"] != golden["periods"]:
+        return min(len(got["segments"]), len(golden["segments"]))
+    return None
+
+def first_divergent_period(duty, golden, reference):
+    """Exact first period where duty leaves golden, or None if that cannot be told.
+
+    reference must reproduce the golden hashes up to the end of the divergent segment.
+    """
+    seg = golden["segment_periods"]
+    k = first_divergent_segment(fingerprint(duty, seg), golden)
+    if k is None or reference is None:
+        return None
+    stop = min(golden["periods"], (k + 1) * seg)
+    if len(reference) < stop:
+        return None
+    ref = fingerprint(reference[:stop], seg)
+    if [s[0] for s in ref["segments"]] != [s[0] for s in golden["segments"][:len(ref["segments"])]]:
+        return None
+    for p in range(k * seg, stop):
+        if p >= len(duty) or int(duty[p]) != int(reference[p]):
+            return p
+    return stop # the run goes on past the end of the golden stream
+
+def describe(name, duty, golden, reference=None):
+    """Why duty does not match golden, or None if it does."""
+    got = fingerprint(duty, golden["segment_periods"])
+    k = first_divergent_segment(got, golden)
+    if k is None:
+        return None
+    seg = golden["segment_periods"]
+    ms = lambda p: p * PWM_PERIOD * PERIOD_NS / 1e6
+    lines = [f"{name}: output differs from its golden fingerprint from segment {k} "
+             f"(periods {k * seg}..{(k + 1) * seg - 1}, {ms(k * seg):.3f}..{ms((k + 1) * seg):.3f} ms)"]
+    if got["periods"] != golden["periods"]:
+        lines.append(f"  recorded {got['periods']} periods, golden has {golden['periods']}")
+    if k < len(got["segments"]) and k < len(golden["segments"]):
+        (_, *now), (_, *then) = got["segments"][k], golden["segments"][k]
+        lines.append(f"  segment min/max/mean: got {now[0]}/{now[1]}/{now[2]}, golden {then[0]}/{then[1]}/{then[2]}")
+    p = first_divergent_period(duty, golden, reference)
+    if p is not None and p < min(len(duty), golden["periods"]):
+        lines.append(f"  first divergent period {p} ({ms(p):.4f} ms): duty {int(duty[p])}, golden {int(reference[p])}")
+    elif p is not None:
+        lines.append(f"  streams agree up to period {p}, where one of them ends")
+    return "\n".join(lines)
+
+def golden_path(name):
+    return os.path.join(GOLDEN_DIR, name + ".json")
+
+def load_golden(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save_golden(path, duty):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(fingerprint(duty), f, indent=0)
+        f.write("\n")
+
+def reference_runs():
+    """{name: (writes, end)} of every test with a golden file: its Write list and the clock
+    it stops before (finish() runs right after clock end - 1)."""
+    runs = {f"test.{name}": step_writes(steps) for name, steps in INTEGRATION_STEPS.items()}
+    runs["audio_test.play_a_tune"] = (tune_writes(), tune_clocks())
+    return runs
+
+def reference_duty(writes, end):
+    """What GoldenRun.stream() returns for a run of writes finished right after clock end - 1."""
+    count = max(0, (end - 1 - 2) // PWM_PERIOD)
+    return chip_schedule(writes).duty_range(0, count)
+
+class GoldenRun:
+    """Records one integration test's duty stream (and on RTL its register commits)."""
+
+    def __init__(self, dut):
+        self.dut = dut
+        self.duty_data = {"duty": [], "offset_ps": 0, "initial": 0}
+        self.edges = []
+        self.commits = []
+        self.tasks = []
+        if GOLDEN == "off":
+            return
+        # right after start_chip(): the period latched on clock 0 is period 0
+        self.offset_ps = clock_zero_ps()
+        if GATES:
+            self.tasks.append(cocotb.start_soon(monitor_pin(dut.uo_out, 7, self.edges)))
+        else:
+            self.tasks.append(cocotb.start_soon(monitor_duty(dut.user_project.pwm_gen, self.duty_data)))
+            self.tasks.append(cocotb.start_soon(monitor_commits(dut.user_project.reg_block, self.offset_ps,
+                                                                self.commits)))
+
+    def _clock(self):
+        return round((cocotb.utils.get_sim_time('ps') - self.offset_ps) / (PERIOD_NS * 1000))
+
+    def stream(self):
+        """Duty of every period that finished before now (the same count on RTL and GL)."""
+        count = max(0, (self._clock() - 2) // PWM_PERIOD)
+        if GATES:
+            times = [t for t, _ in self.edges]
+            values = [v for _, v in self.edges]
+            return list(edges_to_duty(times, values, PERIOD_NS * 1000, self.offset_ps, count=count).duty)
+        return self.duty_data["duty"][:count]
+
+    def finish(self, name):
+        """Stop recording and check against golden/<name>.json (rewrite it with GOLDEN=update)."""
+        for task in self.tasks:
+            task.kill()
+        if GOLDEN == "off":
+            return
+        duty = self.stream()
+        path = golden_path(name)
+        if GOLDEN == "update":
+            save_golden(path, duty)
+            self.dut._log.info(f"recorded golden fingerprint {path} ({len(duty)} periods)")
+            return
+        if not os.path.exists(path):
+            raise GoldenMismatch(f"{name}: no golden fingerprint {path}, "
+                                 f"create it with `python golden.py generate {name}`")
+        reference = None
+        if not GATES:
+            reference = registers_to_schedule(self.commits).duty_range(0, len(duty))
+        problem = describe(name, duty, load_golden(path), reference)
+        if problem:
+            raise GoldenMismatch(problem)
+        self.dut._log.info(f"output matches golden fingerprint {path} ({len(duty)} periods)")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["generate"]:
+        runs = reference_runs()
+        for name in sys.argv[2:] or runs:
+            if name not in runs:
+                sys.exit(f"no reference run {name}, known: {' '.join(runs)}")
+            duty = reference_duty(*runs[name])
+            save_golden(golden_path(name), duty)
+            print(f"{golden_path(name)}: {len(duty)} periods")
+        sys.exit(0)
+    if len(sys.argv) < 3 or sys.argv[1] not in ("check", "show"):
+        sys.exit("usage: golden.py generate [name ...] | check <golden.json> <capture> | show <golden.json>")
+
+    golden = load_golden(sys.argv[2])
+    if sys.argv[1] == "show":
+        print(f"{golden['periods']} periods in {len(golden['segments'])} segments of "
+              f"{golden['segment_periods']}, hash {golden['hash']}")
+        for k, (h, lo, hi, mean) in enumerate(golden["segments"]):
+            print(f"{k:5d} {h} {lo:4d} {hi:4d} {mean:7.2f}")
+    else:
+        duty = load_capture(sys.argv[3]).duty[:golden["periods"]]
+        problem = describe(os.path.basename(sys.argv[3]), duty, golden)
+        print(problem or f"{sys.argv[3]} matches {sys.argv[2]}")
+        sys.exit(1 if problem else 0)
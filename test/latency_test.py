@@ -0,0 +1,39 @@
+import cocotb
+from func_coverage import coverage
+from chip_io import clock_zero_ps, monitor_commits, monitor_duty, play_writes, start_chip
+from timing import PERIOD_NS
+from segment_run import captured_periods
+from write_latency import latency_writes, latency_clocks, measure, report, save_record
+
+import os
+
+# make AUDIO=yes MODULE=latency_test: LATENCY_WRITES writes at random phases, see write_latency.py
+LATENCY_WRITES = int(os.environ.get("LATENCY_WRITES", "2000"))
+
+@cocotb.test()
+@coverage
+async def write_latency(dut):
+    """Register write to pwm pin latency over LATENCY_WRITES writes at random phases.
+
+    Only commits and latched duty are recorded during the run; write_latency.py does the
+    rest offline and write_latency.json keeps the record for re-running it.
+    """
+    writes = latency_writes(LATENCY_WRITES)
+    end = latency_clocks(writes)
+    dut._log.info(f"{len(writes)} writes over {end} clocks ({end * PERIOD_NS / 1e9:.3f}s)")
+    await start_chip(dut)
+    offset_ps = clock_zero_ps()
+
+    duty_data = {"duty": [], "offset_ps": 0, "initial": 0}
+    commits = []
+    monitors = [cocotb.start_soon(monitor_duty(dut.user_project.pwm_gen, duty_data)),
+                cocotb.start_soon(monitor_commits(dut.user_project.reg_block, offset_ps, commits))]
+    await play_writes(dut, writes, 0, end)
+    for monitor in monitors:
+        monitor.kill()
+
+    duty = duty_data["duty"][:captured_periods(end)]
+    clocks = [clock for clock, _ in commits]
+    save_record("write_latency.json", writes, clocks, duty)
+    for line in report(measure(writes, clocks, duty)):
+        dut._log.info(line)
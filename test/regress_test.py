@@ -0,0 +1,40 @@
+import cocotb
+from func_coverage import coverage
+from chip_io import Write, clock_zero_ps, monitor_pin, play_writes, start_chip
+from timing import PERIOD_NS
+from segment_run import captured_periods
+
+import json
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pmod-sim')))
+from duty_stream import write_duty_stream, edges_to_duty
+
+# set by gl_regress.py, which runs this module (make AUDIO=yes MODULE=regress_test [GATES=yes]):
+# the case description with its writes, length and output file
+REGRESS_CASE = os.environ["REGRESS_CASE"]
+
+@cocotb.test()
+@coverage
+async def regress_case(dut):
+    """One short case from gl_regress.py, recorded at the pwm pin as a duty stream.
+
+    Only pins are touched, so the same test runs on RTL and on the gate-level netlist.
+    """
+    with open(REGRESS_CASE) as f:
+        case = json.load(f)
+    dut._log.info(f"Regression case {case['name']}: {case['clocks']} clocks")
+    await start_chip(dut)
+    offset_ps = clock_zero_ps() # clock 0 is the first latch edge
+
+    edges = []
+    monitor = cocotb.start_soon(monitor_pin(dut.uo_out, 7, edges))
+    await play_writes(dut, [Write(*w) for w in case["writes"]], 0, case["clocks"])
+    monitor.kill()
+
+    times = [t for t, _ in edges]
+    values = [v for _, v in edges]
+    # gate delays can push the edges of the last clock past the end of the run
+    count = captured_periods(case["clocks"]) - 1
+    stream = edges_to_duty(times, values, PERIOD_NS * 1000, offset_ps, count=count)
+    write_duty_stream(case["out"], stream.duty, stream.clk_period_ps, stream.offset_ps, stream.initial)
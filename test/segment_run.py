@@ -0,0 +1,215 @@
+"""Run play_a_tune as N time segments in parallel simulator processes and stitch them.
+
+    python segment_run.py [segments] [out_dir] [jobs]
+
+The chip's state at a PWM period boundary is small (phase counter, two accumulators,
+two output registers, the PWM latch and the registers) and follows from the write
+schedule alone, so segment k starts from reset, has that state deposited through the
+backdoor (see backdoor.py) and plays only its own part of the tune. The state comes
+from the closed-form ChipSchedule in pmod-sim/chip_model.py.
+
+Seams sit on subsample_phase SEAM_PHASE (a period start, clear of the CORDIC run),
+never while a register write is in flight. Each segment runs OVERLAP_PERIODS past its
+seam, and the stitch fails unless both sides agree there and each segment's latch edges
+line up with segment 0's. The stitched stream is also compared against the model.
+out_dir gets pwm_duty.bin and pwm_edges.log (the same captures as `make AUDIO=yes`).
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_util import TUNE, TUNE_END_S, tostep
+from chip_io import Write, WRITE_CLOCKS, chip_schedule
+from timing import PERIOD_NS
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pmod-sim')))
+from chip_model import SAMPLE_PERIOD, PERIODS_PER_FRAME
+from duty_stream import read_duty_stream, write_duty_stream, duty_to_edges, write_edge_log, DutyStream, PWM_PERIOD
+
+SEAM_PHASE = 512
+OVERLAP_PERIODS = 8
+SIM_BUILD = "sim_build/segments"
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def tune_writes(tune=TUNE):
+    """play_a_tune's register writes, back to back from each note's start clock."""
+    writes = []
+    for start_s, sine_note, triangle_note in tune:
+        clock = round(start_s * 1e9 / PERIOD_NS)
+        writes.append(Write(clock, 0, tostep(sine_note)))
+        writes.append(Write(clock + WRITE_CLOCKS, 1, tostep(triangle_note)))
+    return writes
+
+def tune_clocks(end_s=TUNE_END_S):
+    return round(end_s * 1e9 / PERIOD_NS)
+
+def _in_write(clock, writes):
+    return any(w.clock <= clock <= w.clock + WRITE_CLOCKS for w in writes)
+
+def seams(segments, writes, end):
+    """Start clocks of segments 1..N-1: on SEAM_PHASE, not inside a write."""
+    out = []
+    for k in range(1, segments):
+        clock = k * end // segments
+        frame = max(0, (clock - SEAM_PHASE + SAMPLE_PERIOD - 1) // SAMPLE_PERIOD)
+        while _in_write(frame * SAMPLE_PERIOD + SEAM_PHASE, writes):
+            frame += 1
+        clock = frame * SAMPLE_PERIOD + SEAM_PHASE
+        if clock < end and (not out or clock > out[-1]):
+            out.append(clock)
+    return out
+
+def seam_before(clock, writes):
+    """Last seam clock before clock, or None if there is none."""
+    frame = (clock - SEAM_PHASE - 1) // SAMPLE_PERIOD
+    while frame >= 0 and _in_write(frame * SAMPLE_PERIOD + SEAM_PHASE, writes):
+        frame -= 1
+    return frame * SAMPLE_PERIOD + SEAM_PHASE if frame >= 0 else None
+
+def cosim_windows(writes, end, window):
+    """(start, stop) clock ranges the hybrid run simulates in RTL: from reset, and from the
+    seam before each write until window clocks after it. Overlapping ranges are merged."""
+    ranges = [(0, min(end, window))]
+    for w in sorted(writes):
+        if w.clock >= end:
+            break
+        start = seam_before(w.clock, writes)
+        stop = min(end, w.clock + WRITE_CLOCKS + window)
+        if start is None or start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], stop))
+        else:
+            ranges.append((start, stop))
+    return ranges
+
+def captured_periods(end):
+    """Periods a run stopped just after clock end - 1 has recorded: the latch on that last
+    clock is not read any more."""
+    return (end - 2) // PWM_PERIOD + 1
+
+def model_duty(writes, frames):
+    """Duty per PWM period over the first frames frames of the schedule."""
+    return chip_schedule(writes).duty_range(0, frames * PERIODS_PER_FRAME)
+
+def seam_state(clock, writes):
+    """Architectural state just before the seam clock (which has subsample_phase SEAM_PHASE)."""
+    schedule = chip_schedule(writes)
+    frame = clock // SAMPLE_PERIOD
+    # frame's accumulator increment (phase 8) has happened, its sine output is up
+    registers = {0: 0, 1: 0}
+    for w in sorted(writes):
+        if w.clock < clock:
+            registers[w.address] = w.value & 0xFFFF
+    return {
+        "phase": clock % SAMPLE_PERIOD,
+        "sine_acc": int(schedule.accumulator(0, frame + 1)),
+        "triangle_acc": int(schedule.accumulator(1, frame + 1)),
+        "sine_out": int(schedule.sine(frame)),
+        "triangle_out": int(schedule.triangle(frame)),
+        "pwm_sample": int(schedule.duty(clock // PWM_PERIOD - 1)), # latched by the period before the seam
+        "registers": registers,
+    }
+
+def segment_specs(segments, out_dir, tune=TUNE, end_s=TUNE_END_S):
+    writes = tune_writes(tune)
+    end = tune_clocks(end_s)
+    starts = [0] + seams(segments, writes, end)
+    specs = []
+    for k, start in enumerate(starts):
+        last = k == len(starts) - 1
+        stop = end if last else min(end, starts[k + 1] + OVERLAP_PERIODS * PWM_PERIOD)
+        seg_dir = os.path.join(out_dir, f"segment{k}")
+        specs.append({
+            "index": k,
+            "start": start,
+            "end": stop,
+            "state": seam_state(start, writes) if start else None,
+            "writes": [list(w) for w in writes if start <= w.clock < stop],
+            "dir": seg_dir,
+            "out": os.path.join(seg_dir, "pwm_duty.bin"),
+        })
+    return specs
+
+def run_segment(spec):
+    os.makedirs(spec["dir"], exist_ok=True)
+    path = os.path.join(spec["dir"], "segment.json")
+    with open(path, "w") as f:
+        json.dump(spec, f, indent=1)
+    env = dict(os.environ, SEGMENT=path, FUNC_COVERAGE_FILE=os.path.join(spec["dir"], "func_coverage.json"))
+    start = time.perf_counter()
+    with open(os.path.join(spec["dir"], "sim.log"), "w") as log:
+        proc = subprocess.run(["make", "AUDIO=yes", "MODULE=segment_test", f"SIM_BUILD={SIM_BUILD}",
+                               f"COCOTB_RESULTS_FILE={os.path.join(spec['dir'], 'results.xml')}"],
+                              cwd=TEST_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    if proc.returncode != 0 or not os.path.exists(spec["out"]):
+        raise RuntimeError(f"segment {spec['index']} failed, see {spec['dir']}/sim.log")
+    return time.perf_counter() - start
+
+def stitch(specs):
+    """One duty stream from the segment captures, checking every seam."""
+    streams = [read_duty_stream(spec["out"]) for spec in specs]
+    base = streams[0]
+    period_ps = base.period * base.clk_period_ps
+    parts = []
+    for k, (spec, stream) in enumerate(zip(specs, streams)):
+        first = round((stream.offset_ps - base.offset_ps) / period_ps)
+        if stream.offset_ps != base.offset_ps + first * period_ps or first * PWM_PERIOD != spec["start"]:
+            raise ValueError(f"segment {k}: first latch edge at {stream.offset_ps} ps is off the period grid "
+                             f"of segment 0 or not at clock {spec['start']}")
+        if k + 1 < len(specs):
+            seam = specs[k + 1]["start"] // PWM_PERIOD - first
+            nxt = streams[k + 1].duty
+            overlap = min(OVERLAP_PERIODS, len(stream.duty) - seam, len(nxt))
+            if overlap <= 0:
+                raise ValueError(f"segment {k} stops before its seam at period {seam + first}")
+            bad = np.nonzero(stream.duty[seam:seam + overlap] != nxt[:overlap])[0]
+            if len(bad):
+                raise ValueError(f"seam {k}/{k + 1}: duty differs at period {seam + first + bad[0]} "
+                                 f"({stream.duty[seam + bad[0]]} vs {nxt[bad[0]]})")
+            parts.append(stream.duty[:seam])
+        else:
+            parts.append(stream.duty)
+    return DutyStream(np.concatenate(parts), base.clk_period_ps, base.offset_ps, base.period, base.initial)
+
+def check_model(stream, writes):
+    """First period where the stitched stream differs from the model, or None."""
+    frames = -(-len(stream.duty) // PERIODS_PER_FRAME)
+    expected = model_duty(writes, frames)[:len(stream.duty)]
+    bad = np.nonzero(stream.duty != expected)[0]
+    return int(bad[0]) if len(bad) else None
+
+def segment_run(segments, out_dir, jobs=None):
+    out_dir = os.path.abspath(out_dir)
+    specs = segment_specs(segments, out_dir)
+    subprocess.run(["make", "-B", "AUDIO=yes", f"SIM_BUILD={SIM_BUILD}", f"{SIM_BUILD}/sim.vvp"],
+                   cwd=TEST_DIR, check=True, stdout=subprocess.DEVNULL)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as pool:
+        times = list(pool.map(run_segment, specs))
+    wall = time.perf_counter() - start
+    for spec, t in zip(specs, times):
+        print(f"segment {spec['index']}: clocks {spec['start']}..{spec['end']}, {t:.1f} s")
+    print(f"{len(specs)} segments in {wall:.1f} s wall, {sum(times):.1f} s of simulation")
+
+    stream = stitch(specs)
+    write_duty_stream(os.path.join(out_dir, "pwm_duty.bin"), stream.duty, stream.clk_period_ps,
+                      stream.offset_ps, stream.initial, stream.period)
+    write_edge_log(os.path.join(out_dir, "pwm_edges.log"), *duty_to_edges(stream))
+    mismatch = check_model(stream, tune_writes())
+    if mismatch is not None:
+        print(f"warning: stitched stream differs from chip_model from period {mismatch}")
+    print(f"{len(stream.duty)} periods stitched into {out_dir}")
+    return stream
+
+if __name__ == "__main__":
+    segments = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else "segments"
+    jobs = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    segment_run(segments, out_dir, jobs)
@@ -0,0 +1,49 @@
+import cocotb
+from cocotb.triggers import RisingEdge
+from func_coverage import coverage
+from backdoor import Backdoor, uses_backdoor
+from chip_io import Write, monitor_duty, play_writes, start_chip
+from timing import PERIOD_NS
+
+import json
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pmod-sim')))
+from duty_stream import write_duty_stream
+
+# set by segment_run.py, which runs this module (make AUDIO=yes MODULE=segment_test): the
+# segment description with its clocks, starting state, writes and output file
+SEGMENT = os.environ["SEGMENT"]
+
+@cocotb.test()
+@coverage
+@uses_backdoor
+async def play_segment(dut):
+    """One segment of play_a_tune, started from the state segment_run.py worked out."""
+    with open(SEGMENT) as f:
+        seg = json.load(f)
+    start, end = seg["start"], seg["end"]
+    dut._log.info(f"Segment {seg['index']}: clocks {start}..{end}")
+    await start_chip(dut)
+
+    duty_data = {"duty": [], "offset_ps": 0, "initial": 0}
+    state = seg["state"]
+    if state:
+        await Backdoor(dut).load(
+            sine_acc=state["sine_acc"], triangle_acc=state["triangle_acc"], phase=state["phase"],
+            sine_out=state["sine_out"], triangle_out=state["triangle_out"], pwm_sample=state["pwm_sample"],
+            registers={int(a): v for a, v in state["registers"].items()})
+        # from here on local clock 0 is clock `start` of the full run
+        monitor = cocotb.start_soon(monitor_duty(dut.user_project.pwm_gen, duty_data))
+        await RisingEdge(dut.clk)
+        next_clock = 1
+    else:
+        monitor = cocotb.start_soon(monitor_duty(dut.user_project.pwm_gen, duty_data))
+        next_clock = 0
+
+    writes = [Write(clock - start, address, value) for clock, address, value in seg["writes"]]
+    await play_writes(dut, writes, next_clock, end - start)
+    monitor.kill()
+
+    write_duty_stream(seg["out"], duty_data["duty"], PERIOD_NS * 1000,
+                      duty_data["offset_ps"] + start * PERIOD_NS * 1000, duty_data["initial"])
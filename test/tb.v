@@ -6,14 +6,23 @@
 */
 module tb ();
 
-`ifndef AUDIO_TEST
-  // Dump the signals to a VCD file. You can view it with gtkwave or surfer.
-  initial begin
-    $dumpfile("tb.vcd");
-    $dumpvars(0, tb);
-    #1;
-  end
+  // Waveform dumping, see dump_control.vh and dump_control.py
+  `include "dump_control.vh"
+
+  // scope bits, in the order of CHIP_SCOPES in dump_control.py
+  task dump_scopes;
+    begin
+      if (dump_scope[0]) $dumpvars(1, tb); // io: chip pins only
+      if (dump_scope[1]) $dumpvars(0, tb); // all
+`ifndef GL_TEST
+      if (dump_scope[2]) $dumpvars(0, tb.user_project.reg_block);
+      if (dump_scope[3]) $dumpvars(0, tb.user_project.counter);
+      if (dump_scope[4]) $dumpvars(0, tb.user_project.sine_gen);
+      if (dump_scope[5]) $dumpvars(0, tb.user_project.triangle_gen);
+      if (dump_scope[6]) $dumpvars(0, tb.user_project.pwm_gen);
 `endif
+    end
+  endtask
 
   // Wire up the inputs and outputs:
   reg clk;
@@ -48,4 +57,36 @@ module tb ();
       .rst_n  (rst_n)     // not reset
   );
 
+`ifndef GL_TEST
+  // Functional coverage counters, see func_coverage.v and func_coverage.py
+  sine_coverage cov_sine (
+      clk, rst_n,
+      user_project.sine_gen.subsample_phase,
+      user_project.sine_gen.accumulator,
+      user_project.sine_gen.t,
+      user_project.sine_gen.out
+  );
+
+  triangle_coverage cov_triangle (
+      clk, rst_n,
+      user_project.triangle_gen.subsample_phase,
+      user_project.triangle_gen.accumulator
+  );
+
+  pwm_coverage cov_pwm (
+      clk, rst_n,
+      user_project.pwm_gen.subsample_phase,
+      user_project.pwm_gen.bitstream_ch1,
+      user_project.pwm_gen.bitstream_ch2
+  );
+
+  regs_coverage cov_regs (
+      clk, rst_n,
+      user_project.reg_block.state,
+      user_project.reg_block.enable_sync,
+      user_project.reg_block.enable_prev,
+      user_project.reg_block.address
+  );
+`endif
+
 endmodule
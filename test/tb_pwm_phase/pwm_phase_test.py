@@ -1,20 +1,22 @@
 import cocotb
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, ReadOnly
 
-import random
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from func_coverage import coverage
+from timing import start_clock, wait_cycles
 
-PERIOD_NS = 35
+import random
 
 async def test_setup(dut):
     """Start clock and reset DUT; initialize inputs."""
-    clock = Clock(dut.clk, PERIOD_NS, units="ns")
-    cocotb.start_soon(clock.start())
+    start_clock(dut.clk)
 
     dut.bitstream_ch1.value = 0
     dut.bitstream_ch2.value = 0
     dut.rst_n.value = 0
-    await ClockCycles(dut.clk, 20)
+    await wait_cycles(dut.clk, 20)
     dut.rst_n.value = 1
     await ClockCycles(dut.clk, 1)
 
@@ -23,12 +25,13 @@ async def test_setup(dut):
     dut._log.info("Reset test passed")
 
 @cocotb.test()
+@coverage
 async def test_reset_while_running(dut):
     """phase_counter/pwm: reset in the middle of operation clears state and restarts from 0."""
     await test_setup(dut)
 
     # Let the design run for a while so counter and PWM are active
-    await ClockCycles(dut.clk, 500)
+    await wait_cycles(dut.clk, 500)
     pre_reset_phase = int(dut.subsample_phase.value)
     dut._log.info(f"Pre-reset phase: {pre_reset_phase}")
     assert pre_reset_phase != 0, "Counter did not advance before reset"
@@ -52,6 +55,7 @@ async def wait_for_low8(dut, target: int):
     return
 
 @cocotb.test()
+@coverage
 async def test_phase_counter_counts_and_wraps(dut):
     """phase_counter: after reset -> 0; increments each clk; wraps at 1024."""
     await test_setup(dut)
@@ -62,17 +66,18 @@ async def test_phase_counter_counts_and_wraps(dut):
     # After N cycles, value should equal N (mod 1024)
     N = random.randint(0, 1023)
     dut._log.info(f"Testing phase counter with {N} cycles")
-    await ClockCycles(dut.clk, N)
+    await wait_cycles(dut.clk, N)
     assert int(dut.subsample_phase.value) == (N % 1024), f"Expected {N % 1024}, got {int(dut.subsample_phase.value)}"
 
     # Advance to wrap to 0
     current = int(dut.subsample_phase.value)
     dut._log.info(f"Current phase: {current}")
     to_wrap = 1024 - current
-    await ClockCycles(dut.clk, to_wrap)
+    await wait_cycles(dut.clk, to_wrap)
     assert int(dut.subsample_phase.value) == 0, f"Expected wrap to 0, got {int(dut.subsample_phase.value)}"
 
 @cocotb.test()
+@coverage
 async def test_pwm_duty_matches_sample_sum(dut):
     """pwm: duty over a 256-cycle period == bitstream_ch1 + bitstream_ch2."""
     await test_setup(dut)
@@ -109,6 +114,7 @@ async def test_pwm_duty_matches_sample_sum(dut):
         assert highs == expected, f"Duty mismatch: expected {expected} highs, got {highs} (ch1={ch1}, ch2={ch2})"
 
 @cocotb.test()
+@coverage
 async def test_pwm_sample_sum_overflow_edge(dut):
     """pwm: verify behavior when ch1+ch2 hits maximum 8-bit range and around wrap."""
     await test_setup(dut)
@@ -143,6 +149,7 @@ async def test_pwm_sample_sum_overflow_edge(dut):
             f"Overflow-edge duty mismatch: expected {expected}, got {highs} (ch1={ch1}, ch2={ch2})"
 
 @cocotb.test()
+@coverage
 async def test_pwm_phase_threshold_behavior(dut):
     """pwm: within a period, pwm_out=1 iff subsample_phase < current_sample."""
     await test_setup(dut)
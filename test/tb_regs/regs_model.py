@@ -0,0 +1,263 @@
+"""Clock-accurate model of register_interface.v, vectorized over many pin sequences at once.
+
+    python regs_model.py [sequences] [clocks] [seed]
+
+A sequence gives the pins for each clock t of a run that starts from reset: enable,
+phase, address and reg_value as the rising edge t samples them, and reset (rst_n held low
+across edge t). Pins are only seen at the edges, so a glitch is a pin that holds for a
+single clock. The model covers the two sync flops per input, the *_prev flops and the
+4-state FSM. It predicts the registers and FSM state after the last clock, including
+writes still in flight.
+
+The model is bit-sliced. Every signal bit is a uint64 word holding that bit for 64
+sequences, so one numpy step per clock advances every sequence with a few dozen bitwise
+operations. Packed keeps a batch of sequences that way ((clocks, words) per pin bit).
+pack() and unpack() convert to and from Stimulus, which has one uint8 per pin, clock and
+sequence.
+
+random_sequences() packs two kinds of sequences, half each:
+  - write trains in the shape of regs_test.write_reg. Addresses and values are random,
+    spacings run from 1 clock up, and enable and phase get single-clock glitches.
+  - pins that toggle at random, so phases and enables come out of order.
+Both kinds get an occasional reset. select() picks a few sequences per distinct outcome:
+FSM transitions taken, registers stored, out-of-range writes, reset and final state.
+fuzz_regs_replay in regs_test.py replays those on the RTL and compares the final registers.
+"""
+
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+NUM_REGS = 2
+STATES = ("idle", "msb", "lsb", "error")
+# FSM state changes, in the bit order of Result.transitions
+TRANSITIONS = ("idle->msb", "idle->error", "msb->lsb", "msb->idle", "lsb->idle", "lsb->error", "error->idle")
+ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+# one sequence per column: enable, phase, reset (clocks, n) and address, reg_value
+# (clocks, n), all uint8
+Stimulus = namedtuple("Stimulus", ["enable", "phase", "address", "reg_value", "reset"])
+
+# bit-sliced: enable, phase, reset (clocks, words) and address (clocks, 4, words),
+# reg_value (clocks, 8, words) uint64, sequence i in bit i % 64 of word i // 64
+Packed = namedtuple("Packed", ["enable", "phase", "address", "reg_value", "reset"])
+
+# after the last clock, per sequence: registers (NUM_REGS, n) uint16, state (n,) and
+# transitions (n,), a bit per TRANSITIONS entry taken. stored (NUM_REGS, n) and ignored
+# (n,) tell whether a write completed to that register or to an address >= NUM_REGS.
+Result = namedtuple("Result", ["registers", "state", "transitions", "stored", "ignored"])
+
+def _lanes(words, n):
+    """(..., words) uint64 -> (..., n) 0/1 uint8, lane i from bit i % 64 of word i // 64."""
+    words = np.ascontiguousarray(words, dtype="<u8")
+    bits = np.unpackbits(words.view(np.uint8), axis=-1, bitorder="little")
+    return bits[..., :n]
+
+def _words(lanes):
+    """(..., n) 0/1 -> (..., ceil(n / 64)) uint64, the inverse of _lanes."""
+    lanes = np.asarray(lanes, dtype=np.uint8) & 1
+    pad = -lanes.shape[-1] % 64
+    lanes = np.concatenate((lanes, np.zeros(lanes.shape[:-1] + (pad,), np.uint8)), axis=-1)
+    return np.packbits(lanes, axis=-1, bitorder="little").view("<u8").astype(np.uint64)
+
+def _planes(values, bits):
+    """(clocks, n) ints -> (clocks, bits, words) bit planes."""
+    values = np.asarray(values, dtype=np.uint16)
+    return _words(np.stack([(values >> b) & 1 for b in range(bits)], axis=1))
+
+def _unplane(planes, n):
+    """(..., bits, words) bit planes -> (..., n) ints."""
+    lanes = _lanes(planes, n).astype(np.uint16)
+    return sum(lanes[..., b, :] << b for b in range(planes.shape[-2])).astype(np.uint16)
+
+def pack(stim):
+    return Packed(_words(stim.enable), _words(stim.phase), _planes(stim.address, 4),
+                  _planes(stim.reg_value, 8), _words(stim.reset))
+
+def unpack(packed, indices=None):
+    """The sequences at indices (default all) as a Stimulus."""
+    n = packed.enable.shape[-1] * 64
+    indices = np.arange(n) if indices is None else np.asarray(indices)
+    word, bit = indices // 64, (indices % 64).astype(np.uint64)
+    lane = lambda a: ((a[..., word] >> bit) & np.uint64(1)).astype(np.uint8)
+    plane = lambda a: sum(lane(a[:, b]) << b for b in range(a.shape[1])).astype(np.uint8)
+    return Stimulus(lane(packed.enable), lane(packed.phase), plane(packed.address),
+                    plane(packed.reg_value), lane(packed.reset))
+
+def run(packed, n=None):
+    """Result of the first n (default all) sequences of packed."""
+    clocks, words = packed.enable.shape
+    n = words * 64 if n is None else n
+    zero = lambda *shape: np.zeros(shape + (words,), dtype=np.uint64)
+    enable_sync1, enable_sync, enable_prev = zero(), zero(), zero()
+    phase_sync1, phase_sync, phase_prev = zero(), zero(), zero()
+    s0, s1 = zero(), zero() # state bits
+    temp, registers = zero(16), zero(NUM_REGS, 16)
+    taken, stored, ignored = zero(len(TRANSITIONS)), zero(NUM_REGS), zero()
+
+    for t in range(clocks):
+        # async reset wins: a clock with rst_n low makes no transition and stores nothing
+        reset = packed.reset[t]
+        keep = ~reset
+        enable_rise, enable_fall = enable_sync & ~enable_prev, ~enable_sync & enable_prev
+        phase_rise, phase_fall = phase_sync & ~phase_prev, ~phase_sync & phase_prev
+        idle, msb = ~s1 & ~s0, ~s1 & s0
+        lsb, error = s1 & ~s0, s1 & s0
+
+        start = idle & enable_rise
+        to_msb, start_error = start & phase_sync, start & ~phase_sync
+        to_lsb = msb & phase_fall
+        abort = msb & ~phase_fall & enable_fall
+        done = lsb & enable_fall
+        lsb_error = lsb & ~enable_fall & phase_rise
+        leave_error = error & enable_fall
+        changed = start | to_lsb | abort | done | lsb_error | leave_error
+        s0, s1 = (s0 & ~changed) | to_msb | start_error | lsb_error, \
+                 (s1 & ~changed) | start_error | to_lsb | lsb_error
+
+        address = packed.address[t]
+        in_range = done & ~(address[1] | address[2] | address[3])
+        for r in range(NUM_REGS):
+            write = in_range & (address[0] if r else ~address[0])
+            registers[r] = (registers[r] & ~write) | (temp & write)
+            stored[r] |= write & keep
+        ignored |= done & ~in_range & keep
+        value = packed.reg_value[t]
+        temp[8:] = (temp[8:] & ~to_msb) | (value & to_msb)
+        temp[:8] = (temp[:8] & ~to_lsb) | (value & to_lsb)
+        for k, mask in enumerate((to_msb, start_error, to_lsb, abort, done, lsb_error, leave_error)):
+            taken[k] |= mask & keep
+
+        enable_prev, enable_sync, enable_sync1 = enable_sync, enable_sync1, packed.enable[t]
+        phase_prev, phase_sync, phase_sync1 = phase_sync, phase_sync1, packed.phase[t]
+
+        if reset.any():
+            enable_sync1, enable_sync, enable_prev = enable_sync1 & keep, enable_sync & keep, enable_prev & keep
+            phase_sync1, phase_sync, phase_prev = phase_sync1 & keep, phase_sync & keep, phase_prev & keep
+            s0, s1, temp, registers = s0 & keep, s1 & keep, temp & keep, registers & keep
+
+    state = (_lanes(s1, n) << 1) | _lanes(s0, n)
+    return Result(_unplane(registers, n), state, _unplane(taken, n), _lanes(stored, n).astype(bool),
+                  _lanes(ignored, n).astype(bool))
+
+# ---- random sequences ----
+
+def _bits(rng, *shape):
+    """Random uint64 words."""
+    return rng.bit_generator.random_raw(int(np.prod(shape))).reshape(shape).astype(np.uint64)
+
+def _sparse(rng, shape, k):
+    """Words whose bits are set with probability 2**-k, k (words,) a rate per word."""
+    out = np.full(shape, ONES)
+    for j in range(int(k.max())):
+        out &= np.where(j < k, _bits(rng, *shape), ONES)
+    return out
+
+def _trains(rng, clocks, words):
+    """write_reg shaped trains: spacing and start shared by the 64 sequences of a word,
+    address and value random per write and sequence, glitches per sequence."""
+    delay = rng.integers(1, 9, words)
+    start = rng.integers(0, 5 * delay)
+    writes = clocks // 5 + 1
+    values = _bits(rng, writes, 16, words)
+    # address bits 1..3 set one time in 8, so about two thirds of the writes are in range
+    addresses = _bits(rng, writes, 4, words)
+    addresses[:, 1:] &= _sparse(rng, (writes, 3, words), np.full(words, 3))
+
+    t = np.arange(clocks)[:, None] - start
+    active = np.where(t >= 0, ONES, np.uint64(0))
+    t = np.maximum(t, 0)
+    step, write = (t // delay) % 5, np.minimum(t // (5 * delay), writes - 1)
+    word = np.arange(words)
+    value = values[write, :, word].transpose(0, 2, 1) # (clocks, 16, words)
+    mask = lambda condition: np.where(condition, ONES, np.uint64(0)) & active
+    enable = mask((step >= 1) & (step <= 3))
+    phase = mask(step <= 2)
+    high = mask(step <= 1)[:, None]
+    reg_value = ((value[:, 8:] & high) | (value[:, :8] & ~high)) & active[:, None]
+    address = addresses[write, :, word].transpose(0, 2, 1) & active[:, None]
+
+    glitch = rng.integers(4, 9, words) # one clock in 16..256
+    enable ^= _sparse(rng, (clocks, words), glitch)
+    phase ^= _sparse(rng, (clocks, words), glitch)
+    return enable, phase, address, reg_value
+
+def _toggles(rng, clocks, words):
+    """Pins that toggle at random: enable and phase each at a rate of 1/2..1/32 per clock,
+    address to a new value one clock in 8, reg_value every clock."""
+    enable = np.bitwise_xor.accumulate(_sparse(rng, (clocks, words), rng.integers(1, 6, words)), axis=0)
+    phase = np.bitwise_xor.accumulate(_sparse(rng, (clocks, words), rng.integers(1, 6, words)), axis=0)
+    change = _sparse(rng, (clocks, 1, words), np.full(words, 3))
+    new = _bits(rng, clocks, 4, words)
+    new[:, 1:] &= _sparse(rng, (clocks, 3, words), np.full(words, 2))
+    address = np.empty((clocks, 4, words), dtype=np.uint64)
+    address[0] = new[0]
+    for t in range(1, clocks):
+        address[t] = (address[t - 1] & ~change[t]) | (new[t] & change[t])
+    return enable, phase, address, _bits(rng, clocks, 8, words)
+
+def random_sequences(n, clocks, seed=0):
+    """Packed stimulus of at least n sequences (whole words) of clocks clocks."""
+    rng = np.random.default_rng(seed)
+    words = -(-n // 64)
+    half = words // 2
+    parts = [_trains(rng, clocks, half), _toggles(rng, clocks, words - half)]
+    pins = [np.concatenate(p, axis=-1) for p in zip(*parts)]
+    # rst_n low on one clock in 1024 per sequence, so about one run in 10 sees a reset
+    reset = _sparse(rng, (clocks, words), np.full(words, 10))
+    return Packed(*pins, reset)
+
+# ---- picking sequences to replay ----
+
+def outcome(result, packed):
+    """Per-sequence key: transitions taken, registers stored, ignored writes, reset, final state."""
+    n = len(result.state)
+    key = result.transitions.astype(np.int64)
+    bit = len(TRANSITIONS)
+    for flag in (*result.stored, result.ignored, _lanes(np.bitwise_or.reduce(packed.reset, axis=0), n)):
+        key |= flag.astype(np.int64) << bit
+        bit += 1
+    return key | (result.state.astype(np.int64) << bit)
+
+def select(result, packed, count, per_outcome=4, seed=0):
+    """Indices of up to count sequences: per_outcome of every distinct outcome, rarest
+    outcomes first, then random others."""
+    key = outcome(result, packed)
+    order = np.argsort(key, kind="stable")
+    _, first, sizes = np.unique(key[order], return_index=True, return_counts=True)
+    rank = np.arange(len(key)) - np.repeat(first, sizes)
+    picked = order[rank < per_outcome]
+    rarity = np.repeat(sizes, np.minimum(sizes, per_outcome))
+    picked = picked[np.argsort(rarity, kind="stable")][:count]
+    rest = np.setdiff1d(np.arange(len(key)), picked)
+    extra = np.random.default_rng(seed).choice(rest, min(len(rest), count - len(picked)), replace=False)
+    return np.concatenate((picked, extra)).astype(np.int64)
+
+def describe(stim, i):
+    """Sequence i of a Stimulus as text: a row per pin, a column per clock."""
+    lines = [f"{name:9s} " + "".join("_#"[int(v)] for v in a[:, i])
+             for name, a in (("enable", stim.enable), ("phase", stim.phase), ("reset", stim.reset))]
+    lines.append("address   " + "".join(f"{int(v):x}" for v in stim.address[:, i]))
+    lines.append("reg_value " + " ".join(f"{int(v):02x}" for v in stim.reg_value[:, i]))
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 20
+    clocks = int(sys.argv[2]) if len(sys.argv) > 2 else 96
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    start = time.perf_counter()
+    packed = random_sequences(n, clocks, seed)
+    generated = time.perf_counter()
+    result = run(packed, n)
+    elapsed = time.perf_counter() - generated
+    print(f"{n} sequences of {clocks} clocks: generated in {generated - start:.2f} s, "
+          f"modelled in {elapsed:.2f} s ({n / elapsed:,.0f} sequences/s, {n * clocks / elapsed:,.0f} clocks/s)")
+    print(f"{int(result.stored.sum())} sequences stored a register, {int(result.ignored.sum())} "
+          f"wrote out of range, {len(np.unique(outcome(result, packed)))} distinct outcomes")
+    for k, name in enumerate(TRANSITIONS):
+        print(f"  {name:12s} {np.count_nonzero(result.transitions & (1 << k)):9d} sequences")
+    for s, name in enumerate(STATES):
+        print(f"  ends {name:7s} {np.count_nonzero(result.state == s):9d} sequences")
@@ -1,39 +1,56 @@
 import cocotb
-from cocotb.clock import Clock
-from cocotb.triggers import ClockCycles
+from cocotb.triggers import ClockCycles, Edge, FallingEdge
+from cocotb.utils import get_sim_time
 
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from audio_util import *
+from func_coverage import coverage
+from timing import PERIOD_NS, start_clock, wait_cycles
 
 import math
 import random
+import time
 
-PERIOD_NS = 35
+import regs_model
+
+CLOCK_HZ = 28835840 # real chip clock, for reporting rates
+
+# benchmark mode: REGS_BENCH=yes make
+REGS_BENCH = os.environ.get("REGS_BENCH", "no") == "yes"
+BENCH_WRITES = int(os.environ.get("REGS_BENCH_WRITES", "256"))
+BENCH_SPACINGS = [int(v) for v in os.environ.get("REGS_BENCH_SPACINGS", "50,10,5,4,3").split(",")]
+
+# protocol fuzzing: REGS_FUZZ=yes make, see regs_model.py
+REGS_FUZZ = os.environ.get("REGS_FUZZ", "no") == "yes"
+FUZZ_SEQUENCES = int(os.environ.get("REGS_FUZZ_SEQUENCES", str(1 << 20))) # run through the model
+FUZZ_REPLAY = int(os.environ.get("REGS_FUZZ_REPLAY", "1000")) # of those, replayed on the RTL
+FUZZ_CLOCKS = int(os.environ.get("REGS_FUZZ_CLOCKS", "96"))
+FUZZ_SEED = int(os.environ.get("REGS_FUZZ_SEED", "0"))
 
 async def write_reg(dut, value, addr, delay=5):
     # setup phase 1 & MSB
     dut.phase.value = 1
     dut.address.value = addr & 0xF
     dut.reg_value.value = value >> 8
-    await ClockCycles(dut.clk, delay)
+    await wait_cycles(dut.clk, delay)
 
     # enable, writes MSB
     dut.enable.value = 1
-    await ClockCycles(dut.clk, delay)
+    await wait_cycles(dut.clk, delay)
 
     # setup LSB
     dut.reg_value.value = value & 0xFF
-    await ClockCycles(dut.clk, delay)
+    await wait_cycles(dut.clk, delay)
 
     # phase 0, writes LSB
     dut.phase.value = 0
-    await ClockCycles(dut.clk, delay)
+    await wait_cycles(dut.clk, delay)
 
     # disable, writes final value to reg
     dut.enable.value = 0
-    await ClockCycles(dut.clk, delay)
+    await wait_cycles(dut.clk, delay)
 
     dut.address.value = 0
     dut.reg_value.value = 0
@@ -44,8 +61,7 @@ async def test_setup(dut):
     global subsample_phase
 
     # approx 28835840 Hz
-    clock = Clock(dut.clk, PERIOD_NS, units="ns")
-    cocotb.start_soon(clock.start())
+    start_clock(dut.clk)
 
     # Reset
     dut._log.info("Reset")
@@ -54,11 +70,12 @@ async def test_setup(dut):
     dut.address.value = 0
     dut.reg_value.value = 0
     dut.rst_n.value = 0
-    await ClockCycles(dut.clk, 10)
+    await wait_cycles(dut.clk, 10)
     dut.rst_n.value = 1
     dut._log.info("Reset complete")
 
 @cocotb.test()
+@coverage
 async def test_regs_reset(dut):
     await test_setup(dut)
 
@@ -67,7 +84,7 @@ async def test_regs_reset(dut):
 
     dut._log.info("Reset")
     dut.rst_n.value = 0
-    await ClockCycles(dut.clk, 10)
+    await wait_cycles(dut.clk, 10)
     dut.rst_n.value = 1
     dut._log.info("Reset complete")
 
@@ -75,6 +92,7 @@ async def test_regs_reset(dut):
     assert int(dut.registers_flat.value) == 0, f"Expected 0, got {int(dut.registers_flat.value)}"
 
 @cocotb.test()
+@coverage
 async def test_regs_mid_transaction_reset(dut):
     """Reset during an in-progress write transaction clears state and registers."""
     await test_setup(dut)
@@ -97,6 +115,7 @@ async def test_regs_mid_transaction_reset(dut):
     assert int(dut.registers_flat.value) == 0, f"Expected registers cleared after mid-transaction reset, got {int(dut.registers_flat.value)}"
 
 @cocotb.test()
+@coverage
 async def test_regs_double_write(dut):
     await test_setup(dut)
 
@@ -109,6 +128,7 @@ async def test_regs_double_write(dut):
         assert ((flat >> (reg * 16)) & 0xFFFF) == 0x5678, f"Expected 0x5678, got {flat:#06x}"
 
 @cocotb.test()
+@coverage
 async def test_regs_timing(dut):
     await test_setup(dut)
 
@@ -124,6 +144,7 @@ async def test_regs_timing(dut):
             assert ((flat >> (reg * 16)) & 0xFFFF) == reg_value,f"Expected {reg_value}, got {flat:#06x}"
 
 @cocotb.test()
+@coverage
 async def test_regs_extreme_values(dut):
     """Write extreme 16-bit values to each register and verify storage."""
     await test_setup(dut)
@@ -139,6 +160,7 @@ async def test_regs_extreme_values(dut):
             assert read_back == value, f"Extreme-value mismatch on reg{reg}: wrote 0x{value:04X}, read 0x{read_back:04X}"
 
 @cocotb.test()
+@coverage
 async def test_regs_error_states(dut):
     for reg in range(2):
         await test_setup(dut)
@@ -210,6 +232,7 @@ async def test_regs_error_states(dut):
         assert ((flat >> (reg * 16)) & 0xFFFF) == 0x1234, "Expected reg write"
     
 @cocotb.test()
+@coverage
 async def test_regs_large_addresses(dut):
     await test_setup(dut)
 
@@ -219,6 +242,7 @@ async def test_regs_large_addresses(dut):
         assert int(dut.registers_flat.value) == 0, f"Expected 0, got {int(dut.registers_flat.value)}"
 
 @cocotb.test()
+@coverage
 async def test_regs_address_boundary_and_no_clobber(dut):
     """Addresses at and beyond NUM_REGS do not clobber lower registers."""
     await test_setup(dut)
@@ -241,3 +265,154 @@ async def test_regs_address_boundary_and_no_clobber(dut):
 
     assert reg0 == 0xAAAA, f"Reg0 clobbered by out-of-range writes: got 0x{reg0:04X}"
     assert reg1 == 0x5555, f"Reg1 clobbered by out-of-range writes: got 0x{reg1:04X}"
+
+# ---- benchmark mode ----
+
+async def record_registers(dut, log):
+    """Append (sim time ns, registers_flat) on every change of the register outputs."""
+    while True:
+        await Edge(dut.registers_flat)
+        log.append((get_sim_time(units="ns"), int(dut.registers_flat.value)))
+
+def burst_writes(n, seed=0):
+    """n (address, value) writes alternating between both registers.
+
+    Each value differs from the one already in its register, so every accepted write
+    shows up as a change in the recorded log.
+    """
+    rng = random.Random(seed)
+    current = [0, 0]
+    writes = []
+    for i in range(n):
+        reg = i % 2
+        value = current[reg]
+        while value == current[reg]:
+            value = rng.randint(0, 0xFFFF)
+        current[reg] = value
+        writes.append((reg, value))
+    return writes
+
+def log_to_writes(log, flat=0):
+    """Turn recorded registers_flat changes back into (address, value) writes."""
+    writes = []
+    for _, new in log:
+        for reg in range(2):
+            value = (new >> (reg * 16)) & 0xFFFF
+            if value != (flat >> (reg * 16)) & 0xFFFF:
+                writes.append((reg, value))
+        flat = new
+    return writes
+
+def count_landed(got, writes):
+    """Number of writes found, in order, among the recorded ones."""
+    landed = 0
+    for w in got:
+        if landed < len(writes) and w == writes[landed]:
+            landed += 1
+    return landed
+
+async def run_burst(dut, writes, spacing):
+    """Stream writes back to back; returns (recorded writes, clocks taken)."""
+    log = []
+    start_flat = int(dut.registers_flat.value)
+    recorder = cocotb.start_soon(record_registers(dut, log))
+    start = get_sim_time(units="ns")
+    for reg, value in writes:
+        await write_reg(dut, value, reg, delay=spacing)
+    # let the last write make it through the synchronizers
+    await ClockCycles(dut.clk, 4)
+    clocks = (get_sim_time(units="ns") - start) / PERIOD_NS
+    recorder.kill()
+    return log_to_writes(log, start_flat), clocks
+
+@cocotb.test(skip=not REGS_BENCH)
+@coverage
+async def bench_regs_back_to_back(dut):
+    """Sustained write rate for long bursts at each spacing in REGS_BENCH_SPACINGS."""
+    await test_setup(dut)
+
+    for spacing in BENCH_SPACINGS:
+        writes = burst_writes(BENCH_WRITES, seed=spacing)
+        got, clocks = await run_burst(dut, writes, spacing)
+        rate = len(writes) / (clocks / CLOCK_HZ)
+        dut._log.info(f"spacing {spacing:3d} clk: {count_landed(got, writes)}/{len(writes)} writes verified, "
+                      f"{clocks / len(writes):.1f} clk/write, {rate:,.0f} writes/s at {CLOCK_HZ} Hz")
+        assert got == writes, f"spacing {spacing}: only {count_landed(got, writes)} of {len(writes)} writes landed, " \
+                              f"{len(got)} register changes recorded"
+
+@cocotb.test(skip=not REGS_BENCH)
+@coverage
+async def bench_regs_min_spacing(dut):
+    """Smallest spacing at which every write of a burst still lands."""
+    await test_setup(dut)
+
+    min_ok = None
+    for spacing in range(max(BENCH_SPACINGS), 0, -1):
+        writes = burst_writes(min(BENCH_WRITES, 64), seed=spacing)
+        got, clocks = await run_burst(dut, writes, spacing)
+        dut._log.info(f"spacing {spacing:3d} clk: {count_landed(got, writes)}/{len(writes)} writes verified")
+        if got != writes:
+            break
+        min_ok = spacing
+        rate = len(writes) / (clocks / CLOCK_HZ)
+
+    assert min_ok is not None, "no spacing tried accepted every write"
+    dut._log.info(f"minimum spacing {min_ok} clk ({5 * min_ok} clk per write, {rate:,.0f} writes/s)")
+    if min_ok > 1:
+        dut._log.info(f"the FSM stops accepting writes at {min_ok - 1} clk")
+
+# ---- protocol fuzzing ----
+
+async def replay(dut, stim):
+    """registers_flat after the last clock of every sequence of a regs_model.Stimulus.
+
+    Each sequence starts with one clock in reset. Pins are driven on the falling edge
+    before the rising edge that samples them, and only when they change.
+    """
+    clocks, n = stim.enable.shape
+    pins = (dut.enable, dut.phase, dut.address, dut.reg_value, dut.rst_n)
+    finals = []
+    for i in range(n):
+        await FallingEdge(dut.clk)
+        for pin in pins:
+            pin.value = 0
+        driven = [0] * len(pins)
+        rst_n = (1 - stim.reset[:, i]).tolist()
+        columns = zip(*(a[:, i].tolist() for a in stim[:4]), rst_n)
+        for values in columns:
+            await FallingEdge(dut.clk)
+            for k, value in enumerate(values):
+                if value != driven[k]:
+                    pins[k].value = value
+                    driven[k] = value
+        await FallingEdge(dut.clk)
+        finals.append(int(dut.registers_flat.value))
+    return finals
+
+@cocotb.test(skip=not REGS_FUZZ)
+@coverage
+async def fuzz_regs_replay(dut):
+    """Random glitchy pin sequences through regs_model, a selection of them through the RTL."""
+    await test_setup(dut)
+
+    start = time.perf_counter()
+    packed = regs_model.random_sequences(FUZZ_SEQUENCES, FUZZ_CLOCKS, FUZZ_SEED)
+    result = regs_model.run(packed, FUZZ_SEQUENCES)
+    modelled = time.perf_counter() - start
+    picked = regs_model.select(result, packed, FUZZ_REPLAY, seed=FUZZ_SEED)
+    outcomes = regs_model.outcome(result, packed)
+    dut._log.info(f"model: {FUZZ_SEQUENCES} sequences of {FUZZ_CLOCKS} clocks in {modelled:.2f} s, "
+                  f"{len(set(outcomes.tolist()))} distinct outcomes, replaying {len(picked)} "
+                  f"covering {len(set(outcomes[picked].tolist()))} of them")
+
+    stim = regs_model.unpack(packed, picked)
+    expected = [int(r0) | int(r1) << 16 for r0, r1 in zip(*result.registers[:, picked])]
+    start = time.perf_counter()
+    got = await replay(dut, stim)
+    dut._log.info(f"RTL: {len(picked)} sequences in {time.perf_counter() - start:.1f} s")
+
+    bad = [k for k, (a, b) in enumerate(zip(got, expected)) if a != b]
+    for k in bad[:3]:
+        dut._log.error(f"sequence {int(picked[k])}: RTL registers {got[k]:#010x}, model {expected[k]:#010x}\n"
+                       + regs_model.describe(stim, k))
+    assert not bad, f"{len(bad)} of {len(picked)} replayed sequences end with other registers than the model"
@@ -3,12 +3,15 @@
 
 module tb ();
 
-  // Dump the signals to a VCD file. You can view it with gtkwave or surfer.
-  initial begin
-    $dumpfile("tb.vcd");
-    $dumpvars(0, tb);
-    #1;
-  end
+  // Waveform dumping, see dump_control.vh and dump_control.py
+  `include "dump_control.vh"
+
+  task dump_scopes;
+    begin
+      if (dump_scope[0]) $dumpvars(1, tb); // io: testbench signals only
+      if (dump_scope[1]) $dumpvars(0, tb); // all
+    end
+  endtask
 
   // Wire up the inputs and outputs:
   reg clk;
@@ -28,5 +31,14 @@ module tb ();
     rst_n,            // reset_n - low to reset
     registers_flat    // flattened registers output
   );
-  
+
+  // Functional coverage counters, see func_coverage.v and func_coverage.py
+  regs_coverage cov_regs (
+      clk, rst_n,
+      regs_inst.state,
+      regs_inst.enable_sync,
+      regs_inst.enable_prev,
+      regs_inst.address
+  );
+
 endmodule
@@ -1,17 +1,19 @@
 import cocotb
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles
 
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from audio_util import *
+from func_coverage import coverage
+from timing import start_clock, wait_cycles
+from backdoor import Backdoor, BACKDOOR, uses_backdoor
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'pmod-sim')))
+from chip_model import sine_out
 
 import math
 import random
 
-PERIOD_NS = 35
-
 # values closer to 64 are more noisy by nature of the CORDIC algorithm
 SAMPLE_TOLERANCE_LOW = 3
 SAMPLE_TOLERANCE_HIGH = 9
@@ -24,8 +26,7 @@ async def test_setup(dut):
     global subsample_phase
 
     # approx 28835840 Hz
-    clock = Clock(dut.clk, PERIOD_NS, units="ns")
-    cocotb.start_soon(clock.start())
+    start_clock(dut.clk)
 
     # Reset
     subsample_phase = 0
@@ -33,7 +34,7 @@ async def test_setup(dut):
     dut.subsample_phase.value = 0
     dut.freq_increment.value = 0
     dut.rst_n.value = 0
-    await ClockCycles(dut.clk, 10)
+    await wait_cycles(dut.clk, 10)
     dut.rst_n.value = 1
     dut._log.info("Reset complete")
 
@@ -46,6 +47,7 @@ async def inc_subsample_phase(dut, inc):
         await ClockCycles(dut.clk, 1)
 
 @cocotb.test()
+@coverage
 async def test_sine_reset(dut):
     global subsample_phase
     await test_setup(dut)
@@ -56,7 +58,7 @@ async def test_sine_reset(dut):
 
     dut._log.info("Reset")
     dut.rst_n.value = 0
-    await ClockCycles(dut.clk, 10)
+    await wait_cycles(dut.clk, 10)
     dut.rst_n.value = 1
     dut._log.info("Reset complete")
 
@@ -64,6 +66,7 @@ async def test_sine_reset(dut):
     assert dut.out.value == 64, f"Expected 64, got {dut.out.value.integer}"
 
 @cocotb.test()
+@coverage
 async def test_random_frequencies(dut):
     global subsample_phase
     await test_setup(dut)
@@ -101,6 +104,7 @@ async def test_random_frequencies(dut):
             phase += 2 * math.pi * freq / SAMPLE_FREQ
 
 @cocotb.test()
+@coverage
 async def test_silence(dut):
     global subsample_phase
     await test_setup(dut)
@@ -152,4 +156,49 @@ async def test_silence(dut):
         if sample_num == 49:
             await inc_subsample_phase(dut, 1024 - 3)
         else:
-            await inc_subsample_phase(dut, 1024)
\ No newline at end of file
+            await inc_subsample_phase(dut, 1024)
+
+# accumulator values either side of the quadrant changes (acc[13:12]) and of the wrap
+QUADRANT_BOUNDARIES = [0x0FE0, 0x0FFF, 0x1000, 0x1FE0, 0x1FFF, 0x2000, 0x2FE0, 0x2FFF, 0x3000, 0x3FE0, 0x3FFF, 0x0000]
+
+@cocotb.test(skip=not BACKDOOR)
+@coverage
+@uses_backdoor
+async def test_quadrant_boundaries(dut):
+    global subsample_phase
+    await test_setup(dut)
+    backdoor = Backdoor(dut)
+
+    for acc in QUADRANT_BOUNDARIES:
+        # start each CORDIC run on the boundary instead of clocking the accumulator there
+        subsample_phase = 1022
+        await backdoor.load(sine_acc=acc, phase=subsample_phase)
+        await inc_subsample_phase(dut, 1 + 8 + 2) # 1023 loads t, 0-7 rotate, 8 outputs
+
+        expected = int(sine_out(acc))
+        assert int(dut.out.value) == expected, \
+            f"Accumulator {acc:#06x}: expected {expected}, got {dut.out.value.integer}"
+
+@cocotb.test(skip=not BACKDOOR)
+@coverage
+@uses_backdoor
+async def test_accumulator_wrap(dut):
+    global subsample_phase
+    await test_setup(dut)
+    backdoor = Backdoor(dut)
+
+    inc = calculate_step(1760)
+    dut.freq_increment.value = inc
+    subsample_phase = 1022
+    await backdoor.load(sine_acc=0x4000 - inc // 2, phase=subsample_phase)
+
+    acc = 0x4000 - inc // 2
+    for sample_num in range(4):
+        await inc_subsample_phase(dut, 1 + 8 + 2)
+        expected = int(sine_out(acc))
+        assert int(dut.out.value) == expected, \
+            f"Sample {sample_num} (accumulator {acc:#06x}): expected {expected}, got {dut.out.value.integer}"
+        acc = (acc + inc) & 0x3FFF
+        assert backdoor.sine_acc() == acc, \
+            f"Sample {sample_num}: accumulator expected {acc:#06x}, got {backdoor.sine_acc():#06x}"
+        await inc_subsample_phase(dut, 1024 - 11)
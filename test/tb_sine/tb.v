@@ -3,12 +3,15 @@
 
 module tb ();
 
-  // Dump the signals to a VCD file. You can view it with gtkwave or surfer.
-  initial begin
-    $dumpfile("tb.vcd");
-    $dumpvars(0, tb);
-    #1;
-  end
+  // Waveform dumping, see dump_control.vh and dump_control.py
+  `include "dump_control.vh"
+
+  task dump_scopes;
+    begin
+      if (dump_scope[0]) $dumpvars(1, tb); // io: testbench signals only
+      if (dump_scope[1]) $dumpvars(0, tb); // all
+    end
+  endtask
 
   // Wire up the inputs and outputs:
   reg clk;
@@ -24,5 +27,14 @@ module tb ();
       clk,
       out
   );
-  
+
+  // Functional coverage counters, see func_coverage.v and func_coverage.py
+  sine_coverage cov_sine (
+      clk, rst_n,
+      sine_inst.subsample_phase,
+      sine_inst.accumulator,
+      sine_inst.t,
+      sine_inst.out
+  );
+
 endmodule
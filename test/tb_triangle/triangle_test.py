@@ -2,6 +2,14 @@ import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles
 
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from func_coverage import coverage
+from backdoor import Backdoor, BACKDOOR, uses_backdoor
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'pmod-sim')))
+from chip_model import triangle_out
+
 subsample_phase = 0
 
 async def cycle_subsample_phase(dut, cycles=1):
@@ -28,6 +36,7 @@ async def wait_for_subsample_phase(dut, target_phase):
     subsample_phase = (subsample_phase + 1) % 1024
 
 @cocotb.test()
+@coverage
 async def test_reset1(dut):
     """Test that reset properly initializes the output and accumulator"""
     dut._log.info("Testing reset functionality")
@@ -48,6 +57,7 @@ async def test_reset1(dut):
     dut._log.info("Reset test passed")
 
 @cocotb.test()
+@coverage
 async def test_reset2(dut):
     """Test that reset properly initializes the output and accumulator"""
     dut._log.info("Testing reset functionality")
@@ -76,6 +86,7 @@ async def test_reset2(dut):
     dut._log.info("Cycle test passed")
 
 @cocotb.test()
+@coverage
 async def test_midrun_reset_clears_wave(dut):
     """Reset while triangle is running forces output back to 0 and restarts ramp."""
     global subsample_phase
@@ -109,6 +120,7 @@ async def test_midrun_reset_clears_wave(dut):
     assert dut.out.value.integer > 0, "Triangle output did not restart after reset"
 
 @cocotb.test()
+@coverage
 async def test_accumulator_increment(dut):
     """Test that accumulator increments only at subsample_phase = 8"""
     global subsample_phase
@@ -156,6 +168,7 @@ async def test_accumulator_increment(dut):
     dut._log.info("Accumulator increment test passed")
 
 @cocotb.test()
+@coverage
 async def test_frequency_control(dut):
     """Test that freq_increment controls the rate of triangle wave"""
     global subsample_phase
@@ -196,6 +209,7 @@ async def test_frequency_control(dut):
     dut._log.info(f"Frequency control test passed - different rates produce different outputs")
 
 @cocotb.test()
+@coverage
 async def test_max_freq_increment_overflow_behavior(dut):
     """Use maximum freq_increment and verify output stays in 0..127 and toggles direction."""
     global subsample_phase
@@ -233,6 +247,7 @@ async def test_max_freq_increment_overflow_behavior(dut):
         "Expected both ascending and descending segments even at high increment"
 
 @cocotb.test()
+@coverage
 async def test_triangle_wave_shape(dut):
     """Test that the wave ascends and descends properly"""
     global subsample_phase
@@ -275,6 +290,7 @@ async def test_triangle_wave_shape(dut):
     dut._log.info("Triangle wave shape test passed")
 
 @cocotb.test()
+@coverage
 async def test_full_range(dut):
     """Test that triangle wave reaches full output range (0-127)"""
     global subsample_phase
@@ -311,6 +327,7 @@ async def test_full_range(dut):
     dut._log.info("Full range test passed")
 
 @cocotb.test()
+@coverage
 async def test_continuous_waveform(dut):
     """Test that waveform is continuous without large jumps"""
     global subsample_phase
@@ -348,6 +365,7 @@ async def test_continuous_waveform(dut):
     dut._log.info("Continuity test passed - smooth waveform")
 
 @cocotb.test()
+@coverage
 async def test_zero_frequency(dut):
     """Test that freq_increment=0 produces constant output"""
     global subsample_phase
@@ -378,3 +396,35 @@ async def test_zero_frequency(dut):
     assert final_output == initial_output, f"Output changed with zero frequency: {initial_output} -> {final_output}"
     
     dut._log.info("Zero frequency test passed")
+
+@cocotb.test(skip=not BACKDOOR)
+@coverage
+@uses_backdoor
+async def test_turn_and_wrap(dut):
+    """Preload the accumulator just before the top of the ramp and the wrap, check both corners"""
+    global subsample_phase
+
+    clock = Clock(dut.clk, 10, units="ns")
+    cocotb.start_soon(clock.start())
+
+    subsample_phase = 0
+    dut.subsample_phase.value = 0
+    dut.freq_increment.value = 64
+    dut.rst_n.value = 0
+    await ClockCycles(dut.clk, 5)
+    dut.rst_n.value = 1
+
+    backdoor = Backdoor(dut)
+    for start in (0x2000 - 4 * 64, 0x4000 - 4 * 64): # acc[13] sets (turn), then wraps to 0
+        subsample_phase = 0
+        await backdoor.load(triangle_acc=start)
+        acc = start
+        for frame in range(8):
+            # past the increment on phase 8 and the output register on phase 9
+            await wait_for_subsample_phase(dut, 10)
+            acc = (acc + 64) & 0x3FFF
+            assert backdoor.triangle_acc() == acc, \
+                f"Start {start:#06x}, frame {frame}: accumulator expected {acc:#06x}, got {backdoor.triangle_acc():#06x}"
+            expected = int(triangle_out(acc))
+            assert dut.out.value == expected, \
+                f"Start {start:#06x}, frame {frame}: expected {expected}, got {dut.out.value.integer}"
@@ -0,0 +1,48 @@
+"""Testbench clock and cheap idle waits, shared by all testbenches.
+
+PERIOD_NS is the one place the testbench clock period lives. Start clocks with
+start_clock() so wait_cycles() knows their period:
+
+    start_clock(dut.clk)
+    await wait_cycles(dut.clk, 50000)
+
+wait_cycles(clk, n) returns right after the n-th rising edge of clk, exactly like
+ClockCycles(clk, n), but with at most three scheduler wakeups however large n is: one
+edge to line up, one simulator-side Timer over the idle stretch and the final edge.
+ClockCycles wakes Python on every edge.
+"""
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, RisingEdge, Timer
+
+PERIOD_NS = 35 # approx 28835840 Hz, the real chip clock
+
+_periods = {} # clock signal -> period in ns, set by start_clock
+
+def start_clock(clk, period_ns=PERIOD_NS):
+    """Start a free-running clock on clk and remember its period for wait_cycles."""
+    _periods[clk._path] = period_ns
+    return cocotb.start_soon(Clock(clk, period_ns, "ns").start())
+
+def clock_period_ns(clk):
+    """Period of a clock started with start_clock, or None."""
+    return _periods.get(clk._path)
+
+async def wait_cycles(clk, n):
+    """Wait for n rising edges of clk (ClockCycles(clk, n) without a wakeup per edge)."""
+    period = clock_period_ns(clk)
+    if period is None:
+        # not started through start_clock: the period is unknown, count every edge
+        await ClockCycles(clk, n)
+        return
+    if n <= 0:
+        return
+    await RisingEdge(clk)
+    if n > 1:
+        # land half a period before the n-th edge, clear of the ones around it
+        await Timer((n - 1.5) * period, "ns")
+        await RisingEdge(clk)
+
+def seconds_to_cycles(seconds):
+    return int(seconds * 1e9 / PERIOD_NS)
@@ -0,0 +1,175 @@
+"""How long a register write takes to reach the pwm pin, measured in bulk on RTL.
+
+    make -B AUDIO=yes MODULE=latency_test [LATENCY_WRITES=2000]
+    python write_latency.py [write_latency.json]
+
+A write's last pin change (enable falling) goes through the 2-flop sync and the
+register_interface FSM, which stores the register (the commit). The channels pick the
+new freq_increment up on the next subsample_phase == 8 edge. The triangle output follows
+on the next clock. The sine output waits for the CORDIC run at 1023..7 of the next frame.
+The PWM latches the sum at the start of the next period (phase 0, 256, 512 or 768), and
+pwm_out shows it one clock later.
+
+write_latency in latency_test.py plays latency_writes(): random values to random registers
+at random phases, each write well clear of the next. One cocotb run records every
+commit clock (a wakeup per write, on registers_flat) and the latched duty of every PWM
+period (a wakeup per period). It saves them to write_latency.json, and the analysis here
+is all numpy. A write's first changed period is the first one whose recorded duty differs
+from the duty the chip would have produced without that write: the closed-form
+ChipSchedule of all the measured commits, with that one channel held at its old
+increment. The recorded duty must match the schedule with every commit exactly.
+"""
+
+import json
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from chip_io import Write, WRITE_CLOCKS, APPLY_PHASE, apply_frames
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pmod-sim')))
+from chip_model import ChipSchedule, ACC_MASK, INC_BITS, SAMPLE_PERIOD, PERIODS_PER_FRAME, CLOCK_HZ
+from duty_stream import PWM_PERIOD
+
+# write_reg with delay=5 sets enable low for the edge at clock 20 of the write
+ENABLE_SAMPLED = 20
+MIN_GAP = 3 * SAMPLE_PERIOD # clocks between writes, plus a random 0..1023
+MIN_STEP = 256 # smallest freq_increment change, so the output moves quickly
+WINDOW_PERIODS = 16 # periods after the commit searched for the first change
+HIST_BIN = 64 # clocks per histogram bar
+
+REGISTER_NAMES = ("sine", "triangle")
+
+# per-write arrays, in clocks from the edge that samples the enable fall
+Latency = namedtuple("Latency", ["address", "sync", "wait", "total", "late", "found"])
+
+def latency_writes(n, seed=0):
+    """n writes at random phases, each changing its register's freq_increment by at least MIN_STEP."""
+    rng = np.random.default_rng(seed)
+    clocks = SAMPLE_PERIOD + np.cumsum(MIN_GAP + rng.integers(0, SAMPLE_PERIOD, n))
+    addresses = rng.integers(0, 2, n)
+    steps = rng.integers(MIN_STEP, (1 << INC_BITS) - MIN_STEP + 1, n)
+    values = np.empty(n, dtype=np.int64)
+    for address in range(2):
+        mask = addresses == address
+        values[mask] = np.cumsum(steps[mask]) & ((1 << INC_BITS) - 1)
+    return [Write(int(c), int(a), int(v)) for c, a, v in zip(clocks, addresses, values)]
+
+def latency_clocks(writes):
+    """Run length: the last write plus time for its sine change to come out."""
+    return writes[-1].clock + WRITE_CLOCKS + 3 * SAMPLE_PERIOD
+
+def previous_values(addresses, values):
+    """Each write's register value before it (0 after reset)."""
+    prev = np.zeros(len(values), dtype=np.int64)
+    for address in range(2):
+        idx = np.nonzero(addresses == address)[0]
+        prev[idx[1:]] = values[idx[:-1]]
+    return prev
+
+class HeldSchedule(ChipSchedule):
+    """A ChipSchedule where row i of every lookup keeps channel address[i] on increment inc[i]
+    from frame[i] on, i.e. as if the write to it at that frame had not happened."""
+
+    def __init__(self, schedule, address, frame, inc):
+        self.channels = schedule.channels
+        self.held = (np.asarray(address)[:, None], np.asarray(frame)[:, None],
+                     np.asarray(inc)[:, None] & ((1 << INC_BITS) - 1))
+
+    def accumulator(self, address, frames):
+        frames = np.asarray(frames, dtype=np.int64)
+        acc = super().accumulator(address, frames)
+        held_address, frame, inc = self.held
+        start = super().accumulator(address, frame)
+        hold = (held_address == address) & (frames > frame)
+        return np.where(hold, (start + (frames - frame) * inc) & ACC_MASK, acc)
+
+def measure(writes, commits, duty):
+    """Latency of every write from the recorded commit clocks and per-period duty."""
+    clocks = np.array([w.clock for w in writes], dtype=np.int64)
+    addresses = np.array([w.address for w in writes], dtype=np.int64)
+    values = np.array([w.value for w in writes], dtype=np.int64)
+    commits = np.asarray(commits, dtype=np.int64)
+    duty = np.asarray(duty, dtype=np.int64)
+    if len(commits) != len(writes):
+        raise ValueError(f"{len(writes)} writes but {len(commits)} register commits recorded")
+
+    frame = apply_frames(commits)
+    schedule = ChipSchedule(zip(frame.tolist(), addresses.tolist(), values.tolist()))
+    bad = np.nonzero(duty != schedule.duty_range(0, len(duty)))[0]
+    if len(bad):
+        raise ValueError(f"recorded duty differs from the model of the measured commits at period {bad[0]}")
+
+    # search from the first latch after the commit, up to the earliest period the next write can touch
+    first = commits // PWM_PERIOD + 1
+    periods = first[:, None] + np.arange(WINDOW_PERIODS)
+    limit = np.append(PERIODS_PER_FRAME * frame[1:] + 1, len(duty))
+    inside = periods < np.minimum(limit, len(duty))[:, None]
+    periods = np.where(inside, periods, 0)
+    without = HeldSchedule(schedule, addresses, frame, previous_values(addresses, values)).duty(periods)
+    changed = inside & (duty[periods] != without)
+    found = changed.any(axis=1)
+    period = periods[np.arange(len(writes)), changed.argmax(axis=1)]
+
+    # triangle out changes with the increment, sine out a frame later, both latched at phase 256
+    earliest = PERIODS_PER_FRAME * (frame + (addresses == 0)) + 1
+    sampled = clocks + ENABLE_SAMPLED
+    return Latency(addresses, commits - sampled, frame * SAMPLE_PERIOD + APPLY_PHASE - commits,
+                   period * PWM_PERIOD + 1 - sampled, period - earliest, found)
+
+def _us(clocks):
+    return clocks / CLOCK_HZ * 1e6
+
+def _stats(name, clocks):
+    clocks = np.asarray(clocks, dtype=float)
+    p50, p99 = np.percentile(clocks, [50, 99])
+    return (f"{name:26s} min {clocks.min():5.0f} p50 {p50:5.0f} p99 {p99:5.0f} max {clocks.max():5.0f} "
+            f"clk | mean {_us(clocks.mean()):6.2f} us, jitter (std) {_us(clocks.std()):6.2f} us, "
+            f"spread {_us(clocks.max() - clocks.min()):6.2f} us")
+
+def histogram(clocks, width=40):
+    """Text histogram of latencies in HIST_BIN-clock bins."""
+    clocks = np.asarray(clocks)
+    low = clocks.min() // HIST_BIN * HIST_BIN
+    counts, edges = np.histogram(clocks, np.arange(low, clocks.max() + HIST_BIN + 1, HIST_BIN))
+    scale = width / max(1, counts.max())
+    return [f"  {int(a):5d}..{int(b) - 1:5d} clk {_us(a):6.1f} us {n:5d} {'#' * round(n * scale)}"
+            for a, b, n in zip(edges[:-1], edges[1:], counts)]
+
+def report(latency):
+    """Summary lines: per-stage and end-to-end latency in clocks and us at the chip clock."""
+    n = len(latency.address)
+    lines = [f"{n} writes at random phases, clock {CLOCK_HZ} Hz"]
+    lines.append(_stats("enable fall -> commit", latency.sync))
+    lines.append(_stats("commit -> increment added", latency.wait))
+    for address, name in enumerate(REGISTER_NAMES):
+        mask = (latency.address == address) & latency.found
+        if not mask.any():
+            continue
+        lines.append(_stats(f"reg {address} ({name}) -> pwm pin", latency.total[mask]))
+        lines += histogram(latency.total[mask])
+        late = np.count_nonzero(latency.late[mask] > 0)
+        if late:
+            lines.append(f"  {late} of {np.count_nonzero(mask)} first changed a later period than the one "
+                         f"that latches the new increment (same duty there by chance)")
+    missing = np.count_nonzero(~latency.found)
+    if missing:
+        lines.append(f"{missing} writes changed no period within {WINDOW_PERIODS} periods of their commit")
+    return lines
+
+def save_record(path, writes, commits, duty):
+    with open(path, "w") as f:
+        json.dump({"writes": [list(w) for w in writes], "commits": [int(c) for c in commits],
+                   "duty": [int(d) for d in duty]}, f)
+
+def load_record(path):
+    with open(path) as f:
+        record = json.load(f)
+    return [Write(*w) for w in record["writes"]], record["commits"], record["duty"]
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "write_latency.json"
+    for line in report(measure(*load_record(path))):
+        print(line)